@@ -0,0 +1,812 @@
+"""
+# Contains the sparse citation engine used by the Model to compute direct and indirect citations
+# All the links are computed at the DOCDB family level from a single sparse adjacency matrix
+"""
+
+# Required libraries
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Loading model parameters
+import Parameters as param
+from IdIndex import IdIndex
+
+
+
+class CitationEngine:
+
+    """
+    This class builds once a family-by-family sparse adjacency matrix A from the PATSTAT citation tables
+    (A[i, j] = 1 if the family i cites the family j) and derives all the citation links from it:
+    # 1. Direct citations: patent x cites patent y
+    # 2. CC (co-citations): two patents cited together by a selected patent
+    # 3. BC (bibliographic coupling): two patents sharing a citing family
+    # 4. LC (longitudinal coupling): patent x cites a patent which cites patent y
+
+    The links are returned as integer edge arrays of shape (nb_links, 3) = (source, target, count),
+    where source and target are the positions of the patents in the list of families given to the engine
+    (i.e. the positions in Model.patent_list) and count is the number of citations, co-citing patents,
+    shared citing families or citation paths supporting the link.
+
+    The engine can be saved and loaded again (save / load), and updated with new patents and new citations
+    (update): the coupling matrices already computed are then updated incrementally, from the rows and
+    columns affected by the new citations only. snapshot(year) gives the links of the patents filed until
+    a given year, for the dynamic network.
+    """
+
+    def __init__(self, patent_families, family_index = None):
+
+        """
+        Instantiation of the engine
+        # patent_families: the docdb_family_id of each patent, in the order of the patents in the model
+        # family_index: interning table of the families (IdIndex) shared with the other stages of the model,
+        a new one by default. The dense index of a family is its row / column in the adjacency matrix.
+        """
+
+        self.patent_families = list(patent_families)
+        self.family_index = family_index if family_index is not None else IdIndex()
+        self.patent_family_codes = np.empty(0, dtype = 'int32') # dense index of the family of each patent (-1 if unknown)
+        self.citations = pd.DataFrame({'citing': [], 'cited': []}, dtype = 'int32') # family citations (dense indices)
+        self.A = None # family x family adjacency matrix (citing -> cited)
+        self.P = None # patent x family incidence matrix
+        self.D = None # patent x patent direct citations matrix
+        self.couplings = {} # coupling matrices computed so far, maintained by update: 'CC', 'BC' (upper triangle), 'LC'
+        self.edge_files = {} # couplings written on the disk (compute_cc_out_of_core), maintained by update: 'CC'
+        self.patent_years = np.full(len(self.patent_families), np.nan) # filing year of each patent (for the snapshots)
+
+
+    def fit(self, TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITES):
+
+        """
+        Building the sparse matrices from the backward citations (contained in TABLE_ALL_PATENTS_INFO)
+        and the forward citations (TABLE_FORWARD_CITES), given as DataFrames or iterables of DataFrames
+        # 1. Collecting the citing -> cited family pairs of both tables
+        # 2. Indexing all the families seen
+        # 3. Building the adjacency matrix A and the patent x family incidence matrix P
+        """
+
+        print('-> Building the sparse citation matrix (family level)')
+
+        # (1)
+        edges = self._citation_pairs(TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITES)
+
+        # (2)
+        patent_families = pd.Series([self._as_family_id(x) for x in self.patent_families], dtype = 'float64')
+        self.patent_family_codes = self.family_index.intern(patent_families)
+        citing = self.family_index.intern(edges['citing'].values)
+        cited = self.family_index.intern(edges['cited'].values)
+        self.citations = pd.DataFrame({'citing': citing, 'cited': cited})
+
+        # (3)
+        self._build_matrices()
+        self.couplings = {}
+        self.edge_files = {}
+
+        print('=> Number of families indexed:', len(self.family_index))
+        print('=> Number of family citations:', self.A.nnz)
+        return self
+
+
+    def update(self, TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITES, new_patent_families = (), new_patent_years = None):
+
+        """
+        Adding new patents (appended after the current ones) and new citations (e.g. a new filing year or a
+        new PATSTAT edition) without recomputing the couplings from scratch
+        # 1. The new families and citations are indexed, and the matrices rebuilt (A, P and D are linear in
+        the number of citations)
+        # 2. delta = D_new - D_old: the direct citations added, non zero only on the rows and columns of
+        the patents affected by the delta
+        # 3. The coupling matrices already computed are updated with products involving delta only:
+        ## CC (X'X): CC + X'.delta + delta'.D_new, with X = D_old
+        ## LC (XX): LC + X.delta + delta.D_new
+        ## BC (C'C with C = A.P'): same as CC with the matrix C
+        The CC written on the disk by compute_cc_out_of_core are updated by merging the delta of CC with the
+        edge file (see _update_edge_file)
+        """
+
+        print('-> Updating the sparse citation matrix (family level)')
+        old_D, old_C = self.D, self._citing_matrix()
+
+        # (1)
+        new_patent_families = list(new_patent_families)
+        self.patent_families += new_patent_families
+        new_codes = self.family_index.intern(pd.Series([self._as_family_id(x) for x in new_patent_families],
+                                                       dtype = 'float64'))
+        self.patent_family_codes = np.concatenate([self.patent_family_codes, new_codes]).astype('int32')
+        years = np.full(len(new_patent_families), np.nan) if new_patent_years is None else new_patent_years
+        self.patent_years = np.concatenate([self.patent_years, np.asarray(years, dtype = 'float64')])
+
+        edges = self._citation_pairs(TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITES)
+        new_citations = pd.DataFrame({'citing': self.family_index.intern(edges['citing'].values),
+                                      'cited': self.family_index.intern(edges['cited'].values)})
+        self.citations = pd.concat([self.citations, new_citations], ignore_index = True).drop_duplicates()
+        self._build_matrices()
+
+        # (2)
+        X = self._padded(old_D, self.D.shape)
+        delta = (self.D - X).tocsr()
+        delta.eliminate_zeros()
+
+        # (3)
+        if 'CC' in self.couplings or 'CC' in self.edge_files:
+            delta_CC = sparse.triu(X.T @ delta + delta.T @ self.D, k = 1).tocsr()
+            if 'CC' in self.couplings:
+                self.couplings['CC'] = self._padded(self.couplings['CC'], self.D.shape) + delta_CC
+            if 'CC' in self.edge_files:
+                self._update_edge_file(self.edge_files['CC'], delta_CC)
+        if 'LC' in self.couplings:
+            self.couplings['LC'] = self._padded(self.couplings['LC'], self.D.shape) + X @ delta + delta @ self.D
+        if 'BC' in self.couplings:
+            C = self._citing_matrix()
+            X_C = self._padded(old_C, C.shape)
+            delta_C = (C - X_C).tocsr()
+            self.couplings['BC'] = self._padded(self.couplings['BC'], self.D.shape) + \
+                sparse.triu(X_C.T @ delta_C + delta_C.T @ C, k = 1)
+
+        print('=> Number of patents:', len(self.patent_families), '- new direct citations:', delta.nnz)
+        return self
+
+
+    def set_patent_years(self, years):
+
+        """
+        Filing year of each patent (in the order of the patents), used by snapshot
+        """
+
+        self.patent_years = np.asarray(pd.to_numeric(pd.Series(years), errors = 'coerce'), dtype = 'float64')
+
+
+    def snapshot(self, year):
+
+        """
+        Links of the network restricted to the patents filed until the given year (included)
+        # The matrices maintained by the engine (D and the couplings, computed once if needed) are restricted
+        to the rows and columns of these patents: the couplings keep the counts of all the citations known
+        (the CC written on the disk are filtered by chunks of the edge file)
+        Returns {'direct citations', 'CC', 'BC', 'LC'}: edge arrays indexed on the list of patents
+        """
+
+        selected = self.patent_years <= year
+        mask = sparse.diags(selected.astype('int64'), dtype = 'int64')
+        links = {'direct citations': self._edges(mask @ self.D @ mask)}
+        if 'CC' in self.edge_files and 'CC' not in self.couplings:
+            links['CC'] = self._filter_edge_file(self.edge_files['CC'][0], selected)
+        else:
+            self.compute_cc()
+            links['CC'] = self._edges(mask @ self.couplings['CC'] @ mask)
+        self._bc_matrix()
+        links['BC'] = self._edges(mask @ self.couplings['BC'] @ mask)
+        self.compute_lc()
+        links['LC'] = self._edges(mask @ self.couplings['LC'] @ mask)
+        return links
+
+
+    def snapshots(self, years = None):
+
+        """
+        Snapshots of the network for each year (by default every filing year of the patents)
+        """
+
+        if years is None:
+            years = np.unique(self.patent_years[~np.isnan(self.patent_years)]).astype('int64').tolist()
+        return {year: self.snapshot(year) for year in years}
+
+
+    def save(self, path):
+
+        """
+        Saving the state of the engine (families, patents, citations and coupling matrices) in a .npz file
+        (the edge files of the couplings written on the disk are referenced by their path)
+        """
+
+        arrays = {'family_ids': self.family_index.ids(np.arange(len(self.family_index))),
+                  'patent_families': pd.Series([self._as_family_id(x) for x in self.patent_families],
+                                               dtype = 'float64').values,
+                  'patent_years': self.patent_years,
+                  'citing': self.citations['citing'].values,
+                  'cited': self.citations['cited'].values}
+        for name, matrix in self.couplings.items():
+            matrix = sparse.csr_matrix(matrix)
+            arrays.update({name + '_data': matrix.data, name + '_indices': matrix.indices,
+                           name + '_indptr': matrix.indptr, name + '_shape': np.array(matrix.shape)})
+        for name, (edge_path, max_pairs_in_memory, tmp_dir) in self.edge_files.items():
+            arrays[name + '_edge_file'] = np.array([os.path.abspath(edge_path), str(max_pairs_in_memory), tmp_dir or ''])
+        np.savez_compressed(path, **arrays)
+
+
+    @classmethod
+    def load(cls, path, family_index = None):
+
+        """
+        Loading an engine saved with save
+        # The families are interned in the same order, so that their dense indices are the same
+        (in family_index if given, which must then be empty or the one used when saving)
+        """
+
+        with np.load(path) as arrays:
+            family_ids = arrays['family_ids']
+            engine = cls(arrays['patent_families'].tolist(), family_index = family_index)
+            if not np.array_equal(engine.family_index.intern(family_ids), np.arange(len(family_ids))):
+                raise ValueError('The family index is not compatible with the saved engine')
+            engine.patent_family_codes = engine.family_index.lookup(arrays['patent_families'])
+            engine.patent_years = arrays['patent_years']
+            engine.citations = pd.DataFrame({'citing': arrays['citing'], 'cited': arrays['cited']})
+            engine._build_matrices()
+            for name in ['CC', 'BC', 'LC']:
+                if name + '_data' in arrays:
+                    engine.couplings[name] = sparse.csr_matrix(
+                        (arrays[name + '_data'], arrays[name + '_indices'], arrays[name + '_indptr']),
+                        shape = tuple(arrays[name + '_shape']))
+                if name + '_edge_file' in arrays:
+                    edge_path, max_pairs_in_memory, tmp_dir = arrays[name + '_edge_file'].tolist()
+                    engine.edge_files[name] = (edge_path, int(max_pairs_in_memory), tmp_dir or None)
+        return engine
+
+
+    @staticmethod
+    def _citation_pairs(TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITES):
+
+        """
+        Citing -> cited family pairs of the backward citations (contained in TABLE_ALL_PATENTS_INFO) and of
+        the forward citations (TABLE_FORWARD_CITES)
+        # Each table may also be given as an iterable of DataFrames (e.g. the partitions of a PartitionedTable):
+        the pairs are then deduplicated batch by batch, so that only one batch is in memory besides the pairs
+        """
+
+        pairs = []
+        # Backward citations of the selected families
+        for table in CitationEngine._batches(TABLE_ALL_PATENTS_INFO):
+            backward = pd.DataFrame({'citing': table[param.VAR_DOCDC_FAMILY_ID].values,
+                                     'cited': table[param.VAR_CITED_DOCDB_FAM_ID].values})
+            pairs.append(backward.dropna().astype('int64').drop_duplicates())
+        # Forward citations: (selected family, citing family, cited family) - the names of the columns
+        # are not reliable since the query returns two docdb_family_id columns
+        for table in CitationEngine._batches(TABLE_FORWARD_CITES):
+            forward = pd.DataFrame({'citing': table.iloc[:, 1].values, 'cited': table.iloc[:, 2].values})
+            pairs.append(forward.dropna().astype('int64').drop_duplicates())
+
+        if not pairs:
+            return pd.DataFrame({'citing': [], 'cited': []}, dtype = 'int64')
+        return pd.concat(pairs, ignore_index = True).drop_duplicates()
+
+
+    @staticmethod
+    def _batches(table):
+
+        """
+        A table given as a DataFrame or as an iterable of DataFrames, as an iterable of DataFrames
+        """
+
+        return [table] if isinstance(table, pd.DataFrame) else table
+
+
+    def _build_matrices(self):
+
+        """
+        Adjacency matrix A (citing family -> cited family), incidence matrix P (patent -> family) and
+        direct citations D = P.A.P', from the citations and the families of the patents
+        """
+
+        nb_families = len(self.family_index)
+        citing, cited = self.citations['citing'].values, self.citations['cited'].values
+        self.A = sparse.csr_matrix((np.ones(len(citing), dtype = 'int64'), (citing, cited)),
+                                   shape = (nb_families, nb_families))
+
+        patents = np.flatnonzero(self.patent_family_codes >= 0)
+        families = self.patent_family_codes[patents]
+        self.P = sparse.csr_matrix((np.ones(len(patents), dtype = 'int64'), (patents, families)),
+                                   shape = (len(self.patent_families), nb_families))
+
+        # The direct citations between patents are the base of most of the measures
+        self.D = (self.P @ self.A @ self.P.T).tocsr()
+
+
+    def _citing_matrix(self):
+
+        """
+        C = A.P': C[c, p] = 1 if the family c cites the (family of the) patent p
+        """
+
+        C = (self.A @ self.P.T).tocsr()
+        C.data[:] = 1 # a citing family is counted once by patent
+        return C
+
+
+    @staticmethod
+    def _padded(matrix, shape):
+
+        """
+        Copy of a sparse matrix with extra empty rows and columns (new patents)
+        """
+
+        matrix = sparse.csr_matrix(matrix, copy = True)
+        matrix.resize(shape)
+        return matrix
+
+
+    def compute_direct_citations(self):
+
+        """
+        Direct citations: hash join of the family citations with the families of the patents, on the citing
+        family then on the cited family (the produced list IS directed)
+        # Same links as P.A.P': each family citation is counted once, so count = 1 for every link
+        """
+
+        links = self._join_patents(self.citations)
+        links = links.groupby(['source', 'target'], sort = True).size().reset_index()
+        return links.values.astype('int64').reshape(-1, 3)
+
+
+    def compute_direct_citation_categories(self, citation_categories):
+
+        """
+        Origin and category of the direct citations
+        # citation_categories: table (citing family, cited family, citn_origin, citn_categ) retrieved from
+        TLS212 / TLS215 (see Parameters.sql_query_CITATION_CATEGORIES)
+        # Returns the deduplicated table (source, target, citn_origin, citn_categ), where source and target
+        are positions in the list of patents, for the links of compute_direct_citations only
+        """
+
+        columns = [param.VAR_CITN_ORIGIN, param.VAR_CITN_CATEG]
+        table = citation_categories.dropna(subset = [param.VAR_DOCDC_FAMILY_ID, param.VAR_CITN_CITED_DOCDB_FAM_ID])
+        # The families which are not in the index cannot be cited by a patent of the model (-1 is dropped by the join)
+        table = pd.DataFrame({'citing': self.family_index.lookup(table[param.VAR_DOCDC_FAMILY_ID]),
+                              'cited': self.family_index.lookup(table[param.VAR_CITN_CITED_DOCDB_FAM_ID]),
+                              param.VAR_CITN_ORIGIN: table[param.VAR_CITN_ORIGIN].values,
+                              param.VAR_CITN_CATEG: table[param.VAR_CITN_CATEG].values})
+        links = self._join_patents(table)
+        links = links[['source', 'target'] + columns].drop_duplicates()
+        return links.sort_values(['source', 'target'] + columns, kind = 'mergesort').reset_index(drop = True)
+
+
+    def _join_patents(self, citations):
+
+        """
+        Joining a table of family citations (citing, cited - dense indices) with the patents of these families
+        # 1. Hash join on the citing family: source = patent of the citing family
+        # 2. Hash join on the cited family: target = patent of the cited family
+        """
+
+        patents = np.flatnonzero(self.patent_family_codes >= 0)
+        patents = pd.DataFrame({'family': self.patent_family_codes[patents], 'patent': patents})
+        citations = citations[(citations['citing'] >= 0) & (citations['cited'] >= 0)]
+
+        # (1)
+        links = pd.merge(citations, patents.rename(columns = {'family': 'citing', 'patent': 'source'}),
+                         how = 'inner', on = 'citing')
+        # (2)
+        links = pd.merge(links, patents.rename(columns = {'family': 'cited', 'patent': 'target'}),
+                         how = 'inner', on = 'cited')
+        return links
+
+
+    def compute_cc(self):
+
+        """
+        Co-citations: A'A restricted to the citing patents of the model, i.e. D'D
+        Two patents are co-cited when at least one patent of the model cites both of them.
+        The produced list is non directed (source < target).
+        """
+
+        if 'CC' not in self.couplings:
+            self.couplings['CC'] = sparse.triu(self.D.T @ self.D, k = 1).tocsr()
+        return self._edges(self.couplings['CC'])
+
+
+    def compute_cc_out_of_core(self, path, chunk_size = 10000, max_pairs_in_memory = 20000000, tmp_dir = None):
+
+        """
+        Co-citations computed in bounded memory and written in an edge file (same links as compute_cc)
+        # 1. The citing patents (rows of D) are processed by chunks: the pairs co-cited by the patents of a
+        chunk are the upper triangle of D_chunk'.D_chunk. A chunk has at most chunk_size rows and the sum of
+        the squared number of citations of its rows (bound of the size of the product) is at most
+        max_pairs_in_memory; the rows above this bound are split by blocks of their cited patents (see _cc_pairs)
+        # 2. The pairs (key = source * nb_patents + target, count) are accumulated up to max_pairs_in_memory,
+        then aggregated, sorted and spilled in a run file on the disk
+        # 3. The sorted runs are merged by ranges of keys small enough to fit in memory (the counts of a pair
+        found in several runs are summed)
+        # 4. The links are appended to the edge file: raw int64 triples (source, target, count) sorted by
+        source and target, read back with read_edge_file
+
+        ## The peak memory depends on chunk_size and max_pairs_in_memory, not on the total number of pairs
+        """
+
+        nb_patents = self.D.shape[0]
+
+        with tempfile.TemporaryDirectory(dir = tmp_dir) as directory:
+
+            # (1)
+            runs = []
+            keys, counts, nb_pairs = [], [], 0
+            for chunk_keys, chunk_counts in self._cc_pairs(chunk_size, max_pairs_in_memory):
+
+                # (2)
+                if nb_pairs and nb_pairs + len(chunk_keys) > max_pairs_in_memory:
+                    runs.append(self._spill(directory, len(runs), keys, counts))
+                    keys, counts, nb_pairs = [], [], 0
+                keys.append(chunk_keys)
+                counts.append(chunk_counts)
+                nb_pairs += len(chunk_keys)
+            if nb_pairs:
+                runs.append(self._spill(directory, len(runs), keys, counts))
+            del keys, counts
+
+            # (3)-(4)
+            nb_links = 0
+            with open(path, 'wb') as edge_file:
+                for range_keys, range_counts in self._merge_runs(runs, max_pairs_in_memory):
+                    edges = np.column_stack([range_keys // nb_patents, range_keys % nb_patents, range_counts])
+                    edge_file.write(edges.astype('<i8').tobytes())
+                    nb_links += len(edges)
+
+        print('=> Number of co-citation links written in', path, ':', nb_links)
+        self.edge_files['CC'] = (path, max_pairs_in_memory, tmp_dir)
+        return path
+
+
+    def _cc_pairs(self, chunk_size, max_pairs):
+
+        """
+        Co-cited pairs (key = source * nb_patents + target, count) of the upper triangle of D'.D, by pieces of
+        at most max_pairs pairs
+        # 1. The rows of D are grouped in chunks whose sum of squared number of citations is at most max_pairs
+        (and with at most chunk_size rows): D_chunk'.D_chunk is built for each chunk
+        # 2. A row with more than sqrt(max_pairs) citations is processed alone, by blocks of its cited patents:
+        the pairs of two blocks are the outer product of their citations
+        """
+
+        D = self.D.tocsr()
+        D.sum_duplicates() # sorted column indices
+        nb_patents = D.shape[0]
+        costs = np.diff(D.indptr).astype('int64') ** 2
+        cumulated_costs = np.concatenate([[0], np.cumsum(costs)])
+        block_size = max(1, int(np.sqrt(max_pairs)))
+
+        start = 0
+        while start < nb_patents:
+            # (2)
+            if costs[start] > max_pairs:
+                cited = D.indices[D.indptr[start]:D.indptr[start+1]].astype('int64')
+                values = D.data[D.indptr[start]:D.indptr[start+1]].astype('int64')
+                for a in range(0, len(cited), block_size):
+                    for b in range(a, len(cited), block_size):
+                        source = np.repeat(cited[a:a + block_size], len(cited[b:b + block_size]))
+                        target = np.tile(cited[b:b + block_size], len(cited[a:a + block_size]))
+                        count = np.outer(values[a:a + block_size], values[b:b + block_size]).ravel()
+                        keep = source < target
+                        yield source[keep] * nb_patents + target[keep], count[keep]
+                start += 1
+                continue
+
+            # (1)
+            end = np.searchsorted(cumulated_costs, cumulated_costs[start] + max_pairs, side = 'right') - 1
+            end = int(min(max(end, start + 1), start + chunk_size, nb_patents))
+            block = D[start:end]
+            pairs = sparse.triu(block.T @ block, k = 1).tocoo()
+            yield pairs.row.astype('int64') * nb_patents + pairs.col, pairs.data.astype('int64')
+            start = end
+
+
+    @staticmethod
+    def read_edge_file(path):
+
+        """
+        Reading an edge file written by compute_cc_out_of_core as a (nb_links, 3) array, memory-mapped
+        (the links are loaded from the disk only when they are accessed)
+        """
+
+        if os.path.getsize(path) == 0:
+            return np.empty((0, 3), dtype = 'int64')
+        return np.memmap(path, dtype = '<i8', mode = 'r').reshape(-1, 3)
+
+
+    def _update_edge_file(self, edge_file, delta):
+
+        """
+        Adding a (sparse, upper triangle) delta to the links of an edge file written by compute_cc_out_of_core
+        # 1. The links of the file are converted by chunks into a sorted run of keys (with the new number of
+        patents), the delta is spilled as a second run
+        # 2. The two runs are merged by ranges of keys in a new file, which replaces the edge file
+        """
+
+        path, max_pairs_in_memory, tmp_dir = edge_file
+        nb_patents = self.D.shape[0]
+        edges = self.read_edge_file(path)
+
+        with tempfile.TemporaryDirectory(dir = tmp_dir) as directory:
+
+            # (1)
+            runs = []
+            if len(edges):
+                keys_path = os.path.join(directory, 'edges-keys.npy')
+                counts_path = os.path.join(directory, 'edges-counts.npy')
+                keys = np.lib.format.open_memmap(keys_path, mode = 'w+', dtype = 'int64', shape = (len(edges),))
+                counts = np.lib.format.open_memmap(counts_path, mode = 'w+', dtype = 'int64', shape = (len(edges),))
+                for start in range(0, len(edges), max_pairs_in_memory):
+                    chunk = np.asarray(edges[start:start + max_pairs_in_memory])
+                    keys[start:start + len(chunk)] = chunk[:, 0] * nb_patents + chunk[:, 1]
+                    counts[start:start + len(chunk)] = chunk[:, 2]
+                keys.flush()
+                counts.flush()
+                del keys, counts
+                runs.append((keys_path, counts_path))
+            del edges
+
+            delta = delta.tocoo()
+            runs.append(self._spill(directory, 0, [delta.row.astype('int64') * nb_patents + delta.col],
+                                    [delta.data.astype('int64')]))
+
+            # (2)
+            nb_links = 0
+            with open(path + '.tmp', 'wb') as edge_file:
+                for range_keys, range_counts in self._merge_runs(runs, max_pairs_in_memory):
+                    merged = np.column_stack([range_keys // nb_patents, range_keys % nb_patents, range_counts])
+                    edge_file.write(merged.astype('<i8').tobytes())
+                    nb_links += len(merged)
+            os.replace(path + '.tmp', path)
+
+        print('=> Number of co-citation links updated in', path, ':', nb_links)
+
+
+    def _filter_edge_file(self, path, selected):
+
+        """
+        Links of an edge file between the selected patents (boolean mask), read by chunks
+        """
+
+        edges = self.read_edge_file(path)
+        links = [np.empty((0, 3), dtype = 'int64')]
+        for start in range(0, len(edges), 1000000):
+            chunk = np.asarray(edges[start:start + 1000000])
+            links.append(chunk[selected[chunk[:, 0]] & selected[chunk[:, 1]]])
+        return np.concatenate(links)
+
+
+    @staticmethod
+    def _aggregate(keys, counts):
+
+        """
+        Summing the counts of the same keys: returns the sorted unique keys and their counts
+        """
+
+        keys, inverse = np.unique(keys, return_inverse = True)
+        return keys, np.bincount(inverse, weights = counts, minlength = len(keys)).astype('int64')
+
+
+    def _spill(self, directory, number, keys, counts):
+
+        """
+        Writing a sorted run of aggregated pairs on the disk
+        """
+
+        keys, counts = self._aggregate(np.concatenate(keys), np.concatenate(counts))
+        keys_path = os.path.join(directory, 'run-{:05d}-keys.npy'.format(number))
+        counts_path = os.path.join(directory, 'run-{:05d}-counts.npy'.format(number))
+        np.save(keys_path, keys)
+        np.save(counts_path, counts)
+        return keys_path, counts_path
+
+
+    def _merge_runs(self, runs, max_pairs_in_memory):
+
+        """
+        Merging sorted runs by ranges of keys
+        # The bounds of the ranges are taken from a sample of the keys of each run (one key every stride
+        keys), so that each range holds about max_pairs_in_memory / 2 pairs at most
+        # Yields the aggregated (keys, counts) of each range, in increasing order of keys
+        """
+
+        runs = [(np.load(keys_path, mmap_mode = 'r'), np.load(counts_path, mmap_mode = 'r'))
+                for keys_path, counts_path in runs]
+        runs = [(keys, counts) for keys, counts in runs if len(keys)]
+        if not runs:
+            return
+
+        stride = max(1, int(max_pairs_in_memory) // (4 * len(runs)))
+        samples = np.unique(np.concatenate([np.asarray(keys[::stride]) for keys, _ in runs]))
+        bounds = samples[::2 * len(runs)].tolist() + [None]
+
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            range_keys, range_counts = [], []
+            for keys, counts in runs:
+                a = np.searchsorted(keys, low, side = 'left')
+                b = len(keys) if high is None else np.searchsorted(keys, high, side = 'left')
+                range_keys.append(np.asarray(keys[a:b]))
+                range_counts.append(np.asarray(counts[a:b]))
+            yield self._aggregate(np.concatenate(range_keys), np.concatenate(range_counts))
+
+
+    def compute_bc(self):
+
+        """
+        Bibliographic coupling: C'C with C = A.P' (the family c cites the patent p)
+        As in the original implementation, two patents are coupled when they share at least one citing family
+        (forward citations), whether this family belongs to the model or not.
+        The produced list is non directed (source < target).
+        """
+
+        return self._edges(self._bc_matrix()[0])
+
+
+    def compute_bc_strength(self):
+
+        """
+        Bibliographic coupling with its strength, in the same pass as compute_bc (same links)
+        # shared: number of citing families shared by the two patents
+        # jaccard: shared / (n_source + n_target - shared)
+        # salton: shared / sqrt(n_source * n_target) (cosine)
+        where n_p is the number of citing families of the patent p
+        Returns a table (source, target, shared, jaccard, salton) sorted by source and target
+        """
+
+        coupling, nb_references = self._bc_matrix()
+        return self._bc_strength_table(self._edges(coupling), nb_references)
+
+
+    def bc_strength_from_family_counts(self, family_counts, nb_citing_families):
+
+        """
+        Same table as compute_bc_strength, from the counts computed by the database
+        # family_counts: (family_a, family_b, nb) shared citing families (see Parameters.sql_query_BC_COUNTS)
+        # nb_citing_families: (family, nb) number of citing families of each family
+        (see Parameters.sql_query_NB_CITING_FAMILIES)
+        """
+
+        edges = self.links_from_family_counts(family_counts)
+        codes = self.family_index.lookup(nb_citing_families['family'])
+        nb_by_family = np.zeros(len(self.family_index), dtype = 'int64')
+        nb_by_family[codes[codes >= 0]] = np.asarray(nb_citing_families['nb'], dtype = 'int64')[codes >= 0]
+        nb_references = np.where(self.patent_family_codes >= 0, nb_by_family[self.patent_family_codes], 0)
+        return self._bc_strength_table(edges, nb_references)
+
+
+    @staticmethod
+    def _bc_strength_table(edges, nb_references):
+
+        """
+        Table (source, target, shared, jaccard, salton) of BC links, from the number of citing families of each patent
+        """
+
+        source, target, shared = edges[:, 0], edges[:, 1], edges[:, 2]
+        n_source, n_target = nb_references[source], nb_references[target]
+        return pd.DataFrame({'source': source,
+                             'target': target,
+                             'shared': shared,
+                             'jaccard': shared / (n_source + n_target - shared),
+                             'salton': shared / np.sqrt(n_source * n_target)})
+
+
+    def _bc_matrix(self):
+
+        """
+        Coupling matrix of the BC (upper triangle) and number of citing families of each patent
+        # C in CSR format (one row by citing family) is an inverted index: citing family -> patents it cites.
+        The product C'C only generates the pairs of patents found in the same row, i.e. the pairs which
+        actually share a citing family, instead of enumerating all the pairs of patents.
+        """
+
+        C = self._citing_matrix()
+        nb_references = np.asarray(C.sum(axis = 0)).ravel().astype('int64')
+        if 'BC' not in self.couplings:
+            self.couplings['BC'] = sparse.triu(C.T.tocsr() @ C, k = 1).tocsr()
+        return self.couplings['BC'], nb_references
+
+
+    def compute_lc(self):
+
+        """
+        Longitudinal coupling: A² restricted to the patents of the model, i.e. D.D
+        A cites a patent that cites B. The produced list IS directed.
+        """
+
+        if 'LC' not in self.couplings:
+            self.couplings['LC'] = (self.D @ self.D).tocsr()
+        return self._edges(self.couplings['LC'])
+
+
+    def compute_lc_parallel(self, nb_processes = None, nb_partitions = None, tmp_dir = None):
+
+        """
+        Longitudinal coupling computed by a pool of processes (same links as compute_lc)
+        # 1. The direct citation matrix D is written once on the disk in CSR format (indptr, indices, data)
+        # 2. The source patents are split in contiguous partitions (several by process, to balance the load)
+        # 3. Each worker memory-maps the CSR arrays (read-only, shared through the page cache instead of being
+        copied in each process) and computes the two-hop paths D[partition].D of its partition
+        # 4. The edge arrays of the partitions are concatenated in order (they are already sorted by source)
+        """
+
+        nb_processes = nb_processes or os.cpu_count() or 1
+        nb_partitions = nb_partitions or 4 * nb_processes
+        nb_patents = self.D.shape[0]
+        D = self.D.tocsr()
+        D.sort_indices()
+
+        with tempfile.TemporaryDirectory(dir = tmp_dir) as directory:
+
+            # (1)
+            paths = {}
+            for name in ['indptr', 'indices', 'data']:
+                paths[name] = os.path.join(directory, name + '.npy')
+                np.save(paths[name], getattr(D, name))
+
+            # (2)
+            bounds = np.linspace(0, nb_patents, nb_partitions + 1).astype('int64')
+            partitions = [(start, end) for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()) if end > start]
+
+            # (3)
+            with ProcessPoolExecutor(max_workers = nb_processes) as executor:
+                futures = [executor.submit(_lc_partition, paths, D.shape, start, end) for start, end in partitions]
+                results = [future.result() for future in futures]
+
+        # (4)
+        edges = np.concatenate(results) if results else np.empty((0, 3), dtype = 'int64')
+        # Kept as the LC matrix (maintained by update, as the one of compute_lc)
+        self.couplings['LC'] = sparse.csr_matrix((edges[:, 2], (edges[:, 0], edges[:, 1])), shape = D.shape)
+        return edges
+
+
+    def links_from_family_counts(self, family_counts):
+
+        """
+        Converting family-level counts (family_a, family_b, nb) computed by the database into an edge array
+        (source, target, count) indexed on the list of patents, as the one of compute_cc / compute_bc
+        # Every pair of patents of the two families gets the count of the families (non directed, source < target)
+        """
+
+        if len(family_counts) == 0:
+            return np.empty((0, 3), dtype = 'int64')
+        pairs = pd.DataFrame({'citing': self.family_index.lookup(family_counts['family_a']),
+                              'cited': self.family_index.lookup(family_counts['family_b']),
+                              'count': np.asarray(family_counts['nb'], dtype = 'int64')})
+        links = self._join_patents(pairs)
+        source = np.minimum(links['source'].values, links['target'].values)
+        target = np.maximum(links['source'].values, links['target'].values)
+        edges = sparse.coo_matrix((links['count'].values, (source, target)),
+                                  shape = (len(self.patent_families), len(self.patent_families)))
+        return self._edges(sparse.triu(edges, k = 1))
+
+
+    @staticmethod
+    def _edges(matrix):
+
+        """
+        Converting a sparse matrix in an edge array (source, target, count) sorted by source and target
+        """
+
+        matrix = sparse.coo_matrix(matrix)
+        matrix.sum_duplicates()
+        keep = matrix.data != 0
+        edges = np.column_stack([matrix.row[keep], matrix.col[keep], matrix.data[keep]]).astype('int64')
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        return edges[order]
+
+
+    @staticmethod
+    def _as_family_id(value):
+
+        """
+        The family ids stored in the patent attributes may be NaN or lists (if the data is incomplete)
+        """
+
+        if isinstance(value, list):
+            return np.nan
+        return value
+
+
+
+def _lc_partition(paths, shape, start, end):
+
+    """
+    Worker of CitationEngine.compute_lc_parallel: two-hop paths (source, target, number of paths) of the
+    source patents start...end-1, from the memory-mapped CSR arrays of D
+    """
+
+    indptr, indices, data = [np.load(paths[name], mmap_mode = 'r') for name in ['indptr', 'indices', 'data']]
+    D = sparse.csr_matrix((data, indices, indptr), shape = shape, copy = False)
+    edges = CitationEngine._edges(D[start:end] @ D)
+    edges[:, 0] += start
+    return edges
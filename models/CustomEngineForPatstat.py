@@ -4,16 +4,24 @@
 """
 
 # Required libraries
+import os
+import numpy as np
 import pandas as pd
 import sqlalchemy
 from sqlalchemy import create_engine
+import io
 import tempfile
-import pandas.core.common as com
-from pandas.io.sql import SQLTable, pandasSQL_builder
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 
 # Loading model parameters
 import Parameters as param
+from read_sql_arrow import read_sql_arrow
+from QueryCache import QueryCache
+from PartitionedTable import PartitionedTable
 
 
 
@@ -25,13 +33,66 @@ class CustomEngineForPATSTAT:
     This class define an engine able to query PATSTAT and retrive the data via SQLalchemy
     """
     
-    def __init__(self, engine):
+    def __init__(self,
+                 engine,
+                 breakthrough_selection_in_sql = False,
+                 step_1_mode = 'sequential',
+                 step_2_concurrent = False,
+                 step_2_batch_size = None,
+                 step_2_directory = None,
+                 citation_categories = False,
+                 coupling_in_sql = False,
+                 max_connections = 4,
+                 arrow_reader = False,
+                 cache_dir = None,
+                 cache_max_size = 20e9,
+                 patstat_edition = None):
         
         """
         Instantiation of the model
+        # breakthrough_selection_in_sql: if True, the selection of the breakthrough patents (earliest patent
+        by family, top X% by year) is done in PostgreSQL and only the selected patents are retrieved
+        # step_1_mode: how the technology classes are queried in step 1
+        ## 'sequential': one query by technology class, one after the other
+        ## 'concurrent': one query by technology class, run concurrently over at most max_connections connections
+        ## 'fused': a single query for all the technology classes (cpc_class_symbol LIKE ANY (ARRAY[...]))
+        # step_2_concurrent: if True, the independent queries of step 2 are run concurrently (see _Run_Engine_step_2)
+        # step_2_batch_size: if given, step 2 is run by batches of patent ids and its results are written in
+        Parquet partitions in step_2_directory (a temporary folder by default) instead of being kept in
+        memory (see _Run_Engine_step_2_streaming)
+        # citation_categories: if True, step 2 also retrieves the origin and category of the citations of the
+        selected families (TLS212 / TLS215, see Parameters.sql_query_CITATION_CATEGORIES)
+        # coupling_in_sql: if True, the co-citations and bibliographic coupling are counted by the database
+        (see _Run_Engine_couplings) instead of being computed from the citation tables
+        # max_connections: maximum number of connections used at the same time by the engine
+        # arrow_reader: if True, the results of the queries are streamed into typed Arrow batches
+        (see read_sql_arrow) instead of being written in a CSV file and parsed again by pandas
+        # cache_dir: if given, the results of the queries are cached in this folder (see QueryCache), at most
+        cache_max_size bytes. The cache is specific to the PATSTAT edition (by default the name of the database)
         """
         
+        if step_1_mode not in ['sequential', 'concurrent', 'fused']:
+            raise ValueError('Unknown step_1_mode: ' + str(step_1_mode))
+        
         self.engine = engine
+        self.breakthrough_selection_in_sql = breakthrough_selection_in_sql
+        self.step_1_mode = step_1_mode
+        self.max_connections = max_connections
+        self.arrow_reader = arrow_reader
+        self.cache = None
+        if cache_dir is not None:
+            if patstat_edition is None:
+                patstat_edition = getattr(getattr(engine, 'url', None), 'database', '')
+            self.cache = QueryCache(cache_dir, max_size = cache_max_size, patstat_edition = patstat_edition)
+        self.step_2_concurrent = step_2_concurrent
+        self.step_2_batch_size = step_2_batch_size
+        self.step_2_directory = step_2_directory
+        self.citation_categories = citation_categories
+        self.coupling_in_sql = coupling_in_sql
+        # Connections pinned for each run of step 2 (they hold its temporary tables): one by thread
+        self._sessions = {} # run id -> {thread id: (connection, names of the temporary tables created in the session)}
+        self._sessions_lock = threading.Lock()
+        self.timings = {} # duration (in seconds) of the last queries run, by query name
         print('---------------------------------------')
         print('CustomEngineForPATSTAT instanciated.')
         print('---------------------------------------')
@@ -48,166 +109,456 @@ class CustomEngineForPATSTAT:
         # 5. Number of patent citations at the DOCDB family level
         """
         
-        # Unpacking parameters
-        eng = self.engine
+        print('-> Retrieving the patent ids corresponding to the technology classes', technology_classes_list,
+          'filled between',start_date ,'and', end_date, '(' + self.step_1_mode + ')')
+        
+        # A single query for all the technology classes
+        if self.step_1_mode == 'fused':
+            queries = {'all classes': self._primary_info_query(technology_classes_list, start_date, end_date)}
+        # One query by technology class
+        else:
+            queries = {technology_class: param.sql_query_PATENT_PRIMARY_INFO.format(technology_class, start_date, end_date)
+                       for technology_class in technology_classes_list}
         
-        TABLE_PRIMARY_INFO = pd.DataFrame()
-        for technology_class in technology_classes_list:
-            print('-> Retrieving the patent ids corresponding to the technology class', technology_class,
-          'filled between',start_date ,'and', end_date )
-            t = self.read_sql_tmpfile(param.sql_query_PATENT_PRIMARY_INFO.format(technology_class, start_date, end_date), eng)
-            TABLE_PRIMARY_INFO = pd.concat([TABLE_PRIMARY_INFO, t])
+        tables = self.read_sql_queries(queries, concurrent = self.step_1_mode == 'concurrent')
+        
+        # The tables are concatenated only once
+        TABLE_PRIMARY_INFO = pd.concat([tables[name] for name in queries]) if tables else pd.DataFrame()
         
         return TABLE_PRIMARY_INFO
         
     
+    def _Run_Engine_step_1_breakthrough(self, technology_classes_list, start_date, end_date, percentage_top_patents):
+        
+        """
+        Same as _Run_Engine_step_1 followed by Model._select_breakthrough_patents, but the selection is done
+        in PostgreSQL with window functions:
+        # 1. Earliest patent for each patent family (ROW_NUMBER over the earliest filing date)
+        # 2. Top X% most cited patents by year (ROW_NUMBER over the family citations, rounded up)
+        """
+        
+        print('-> Selecting the breakthrough patents corresponding to the technology classes', technology_classes_list,
+          'filled between',start_date ,'and', end_date, '(in PostgreSQL)')
+        primary_info = self._primary_info_query(technology_classes_list, start_date, end_date)
+        query = param.sql_query_BREAKTHROUGH_PATENTS.format(primary_info, float(percentage_top_patents))
+        
+        return self.read_sql_cached(query)
+        
+    
+    def _Run_Engine_step_1_families(self, technology_classes_list, start_date, end_date):
+        
+        """
+        Families of all the patents of the technology classes (the ones of _Run_Engine_step_1, without the
+        selection of the breakthrough patents), e.g. to count the couplings of the whole CPC subtree
+        """
+        
+        print('-> Retrieving the families of the patents corresponding to the technology classes',
+              technology_classes_list, 'filled between', start_date, 'and', end_date)
+        primary_info = self._primary_info_query(technology_classes_list, start_date, end_date)
+        query = param.sql_query_PRIMARY_INFO_FAMILY_IDS.format(primary_info)
+        
+        return self.read_sql_cached(query)
+        
+    
+    def _primary_info_query(self, technology_classes_list, start_date, end_date):
+        
+        """
+        Query retrieving the primary information of all the technology classes at once
+        # In the 'fused' mode, a single scan with cpc_class_symbol LIKE ANY (ARRAY[...])
+        # Otherwise, the UNION ALL of the queries of each technology class
+        """
+        
+        if self.step_1_mode == 'fused':
+            prefixes = ', '.join("'{}%%'".format(technology_class) for technology_class in technology_classes_list)
+            return param.sql_query_PATENT_PRIMARY_INFO_ALL_CLASSES.format(prefixes, start_date, end_date)
+        
+        return '\n UNION ALL \n'.join(
+            '(' + param.sql_query_PATENT_PRIMARY_INFO.format(technology_class, start_date, end_date) + ')'
+            for technology_class in technology_classes_list)
+        
+    
     def _Run_Engine_step_2(self,
-                           list_patent_ids, 
+                           list_patent_ids,
                            technology_classes_list,
                            start_date,
                            end_date):
         
         """
         Running the engine to retrive all necessary data from the PATSTAT Postgress database
+        # With the step_2_batch_size option, the data is retrieved by batches of patents and the tables
+        returned are PartitionedTable (on disk) instead of DataFrames
+        """
+        
+        if self.step_2_batch_size is not None:
+            return self._Run_Engine_step_2_streaming(list_patent_ids)
+        return self._Run_Engine_step_2_batch(list_patent_ids)
+    
+    
+    def _Run_Engine_step_2_batch(self, list_patent_ids):
+        
+        """
+        Retrieving all the data of the given patents at once
+        
+        The queries form a small dependency graph:
+        # - the queries (2)-(4) only need the temporary table of the patent ids
+        # - the queries (6)-(8) need the temporary table of the families, known once (2) is done
+        With the step_2_concurrent option, the queries are run as soon as their inputs are available, over at
+        most max_connections connections (each connection creates its own copy of the temporary tables).
+        Otherwise they are run one after the other on a single connection.
+        
+        Each run has its own id: its temporary tables are named after it and live in the sessions pinned for
+        the run, so that several fits can run at the same time on the same PATSTAT server (even with the same
+        engine) without overwriting the ids of each other.
         """
         
-        # Unpacking parameters
-        eng = self.engine
         # Local variables
-        temp_SQL_table_1 = 'temporary_table_patent_ids'
-        temp_SQL_table_2 = 'docdb_family_ids'
-        
-        
-        # (1) 
-        print('-> Creating a temporary table in the SQL database contaning the patent ids')
-        #t = tuple(TABLE_PATENT_IDS[param.VAR_APPLN_ID].unique().tolist())
-        t = tuple(list_patent_ids)
-        df = pd.DataFrame(t)
-        df.columns = [param.VAR_APPLN_ID]
-        self.create_temporary_table(df = df,
-                       temporary_table_name = temp_SQL_table_1,
-                       key = param.VAR_APPLN_ID,
-                       engine = eng)
-        
-        # (2)
-        print('-> Retrieving general information about the selected patents')
-        TABLE_MAIN_PATENT_INFOS = self.read_sql_tmpfile(param.sql_query_PATENT_MAIN_INFO, eng)
-        
-        # (3)
-        print('-> Retrieving CPC technology classes of the selected patents')
-        TABLE_CPC = self.read_sql_tmpfile(param.sql_query_CPC_INFO, eng)
-        
-        # (4)
-        print('-> Retrieving information about the patentees (individuals) of the selected patents')
-        TABLE_PATENTEES_INFO = self.read_sql_tmpfile(param.sql_query_PATENTEES_INFO, eng)
-        
-        # (5)
-        print('-> Creating a temporary table in the SQL database containing the docdb_family ids')
-        df = TABLE_MAIN_PATENT_INFOS[[param.VAR_DOCDC_FAMILY_ID]]
-        df.drop_duplicates(inplace = True)
-        self.create_temporary_table(df = df,
-                       temporary_table_name = temp_SQL_table_2,
-                       key = param.VAR_DOCDC_FAMILY_ID,
-                       engine = eng)
-        
-        
-        # (6)
-        print('-> Retrieving information about backward citations of the selected families')
-        TABLE_DOCBD_backwards_citations = self.read_sql_tmpfile(param.sql_query_DOCBD_backwards_citations, eng)
-        
-        # (7)
-        print('-> Retrieving information about forward citations of the selected families')
-        TABLE_FORWARD_CITATIONS = self.read_sql_tmpfile(param.sql_query_FORWARD_CITATIONS, eng)
-        
-        
-        # Regrouping a bit the tables to simplify the output
-        TABLE_ALL_PATENTS_INFO = TABLE_MAIN_PATENT_INFOS.append([TABLE_CPC, TABLE_PATENTEES_INFO])
-        TABLE_ALL_PATENTS_INFO = pd.merge(TABLE_ALL_PATENTS_INFO,
-                                          TABLE_DOCBD_backwards_citations,
-                                          how = 'left',
-                                          left_on = param.VAR_DOCDC_FAMILY_ID,
-                                          right_on = param.VAR_DOCDC_FAMILY_ID)
+        temp_SQL_table_1 = param.TEMP_TABLE_PATENT_IDS
+        temp_SQL_table_2 = param.TEMP_TABLE_FAMILY_IDS
+        max_workers = self.max_connections if self.step_2_concurrent else 1
+        # The temporary tables are created in the sessions pinned for this run, only when a query is actually
+        # sent to the database (they are not needed when the results are in the local cache)
+        run_id = uuid.uuid4().hex[:12]
+        
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers = max_workers) as executor:
+                
+                # (1) 
+                print('-> Preparing the temporary table contaning the patent ids')
+                df = pd.DataFrame({param.VAR_APPLN_ID: list(list_patent_ids)})
+                patent_ids_table = {temp_SQL_table_1: (df, param.VAR_APPLN_ID)}
+            
+                # (2)-(4)
+                # Each relation is retrieved as a narrow table keyed by appln_id
+                print('-> Retrieving the', ', '.join(param.sql_queries_PATENT_INFO), 'of the selected patents')
+                futures = {name: executor.submit(self._read_sql_timed, name, query, patent_ids_table, run_id)
+                           for name, query in param.sql_queries_PATENT_INFO.items()}
+                TABLE_MAIN_PATENT_INFOS = futures['main information'].result()
+            
+                # (5)
+                print('-> Preparing the temporary table containing the docdb_family ids')
+                df = TABLE_MAIN_PATENT_INFOS[[param.VAR_DOCDC_FAMILY_ID]].drop_duplicates()
+                family_ids_table = {temp_SQL_table_2: (df, param.VAR_DOCDC_FAMILY_ID)}
+            
+                # (6)-(7)
+                print('-> Retrieving information about backward and forward citations of the selected families')
+                family_queries = {'backward citations': param.sql_query_DOCBD_backwards_citations}
+                # (8)
+                if self.citation_categories:
+                    family_queries['citation categories'] = param.sql_query_CITATION_CATEGORIES
+                family_futures = {name: executor.submit(self._read_sql_timed, name, query, family_ids_table, run_id)
+                                  for name, query in family_queries.items()}
+                forward = executor.submit(self._read_sql_timed, 'forward citations',
+                                          param.sql_query_FORWARD_CITATIONS, family_ids_table, run_id)
+                
+                TABLES_PATENT_INFO = {name: future.result() for name, future in futures.items()}
+                TABLES_FAMILY_INFO = {name: future.result() for name, future in family_futures.items()}
+                TABLE_FORWARD_CITATIONS = forward.result()
+        finally:
+            # The temporary tables disappear with the sessions
+            self.close_sessions(run_id)
+        print('=> Total time:', round(time.perf_counter() - start, 1), 's')
+        
+        # Regrouping the tables in long format: the rows of each table are stacked (with their own columns
+        # only), so that the size of the result is the sum of the sizes of the tables, not their product
+        # The tables of the families (backward citations...) are keyed by appln_id through the family of each patent
+        patent_families = TABLE_MAIN_PATENT_INFOS[[param.VAR_APPLN_ID, param.VAR_DOCDC_FAMILY_ID]]
+        TABLES_FAMILY_INFO = [pd.merge(patent_families, table, how = 'inner', on = param.VAR_DOCDC_FAMILY_ID)
+                              for table in TABLES_FAMILY_INFO.values()]
+        TABLE_ALL_PATENTS_INFO = pd.concat(list(TABLES_PATENT_INFO.values()) + TABLES_FAMILY_INFO,
+                                           ignore_index = True, sort = False)
     
         return TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITATIONS
+    
+    
+    def _Run_Engine_step_2_streaming(self, list_patent_ids):
+        
+        """
+        Retrieving the data of the patents by batches of step_2_batch_size patents, so that the memory used
+        depends on the size of the batches and not on the number of patents
+        # 1. The patent ids are split in batches of fixed size
+        # 2. Each batch is retrieved as in _Run_Engine_step_2_batch (with its own temporary tables)
+        # 3. The forward citations of the families already retrieved with a previous batch are dropped
+        (the patents of a family can be in several batches)
+        # 4. The tables of the batch are appended to the Parquet partitions and released
+        
+        ## The tables are returned as PartitionedTable, read lazily by the Model
+        """
+        
+        # Local variables
+        batch_size = int(self.step_2_batch_size)
+        directory = self.step_2_directory or tempfile.mkdtemp(prefix = 'patstat_step_2_')
+        TABLE_ALL_PATENTS_INFO = PartitionedTable(os.path.join(directory, 'all_patents_info'))
+        TABLE_FORWARD_CITATIONS = PartitionedTable(os.path.join(directory, 'forward_citations'))
+        if TABLE_ALL_PATENTS_INFO.paths or TABLE_FORWARD_CITATIONS.paths:
+            raise ValueError('The folder ' + directory + ' already contains the results of a previous run')
+        
+        # (1)
+        patent_ids = pd.unique(pd.Series(list(list_patent_ids)).dropna())
+        nb_batches = -(-len(patent_ids) // batch_size)
+        retrieved_families = np.empty(0, dtype = 'int64')
+        
+        for i, start in enumerate(range(0, len(patent_ids), batch_size)):
+            
+            # (2)
+            print('-> Batch', i + 1, '/', nb_batches)
+            all_patents_info, forward_citations = self._Run_Engine_step_2_batch(patent_ids[start:start + batch_size])
             
+            # (3)
+            # (selected family, citing family, cited family) - the column names of this table are not reliable
+            selected_families = pd.to_numeric(forward_citations.iloc[:, 0])
+            forward_citations = forward_citations[~selected_families.isin(retrieved_families).values]
+            families = pd.to_numeric(all_patents_info[param.VAR_DOCDC_FAMILY_ID]).dropna().astype('int64')
+            retrieved_families = np.union1d(retrieved_families, families.values)
+            
+            # (4)
+            TABLE_ALL_PATENTS_INFO.append(all_patents_info)
+            TABLE_FORWARD_CITATIONS.append(forward_citations)
+            del all_patents_info, forward_citations
+        
+        print('=> Step 2 results written in', directory)
+        return TABLE_ALL_PATENTS_INFO, TABLE_FORWARD_CITATIONS
             
             
+    def _Run_Engine_couplings(self, list_family_ids):
+        
+        """
+        Counting the co-citations (CC) and the bibliographic coupling (BC) of a set of families in PostgreSQL,
+        with self-joins of TLS228_DOCDB_FAM_CITN restricted to the families of a temporary table
+        # Only the aggregated rows (family_a, family_b, nb) with family_a < family_b are transferred
+        # The set of families can be larger than the breakthrough patents (e.g. all the families of a CPC subtree)
+        Returns {'CC': table, 'BC': table, 'NB_CITING': table (family, nb) of the number of citing families}
+        """
+        
+        print('-> Counting the co-citations and the bibliographic coupling of', len(list_family_ids),
+              'families (in PostgreSQL)')
+        run_id = uuid.uuid4().hex[:12]
+        df = pd.DataFrame({param.VAR_DOCDC_FAMILY_ID: list(list_family_ids)}).dropna().drop_duplicates()
+        family_ids_table = {param.TEMP_TABLE_FAMILY_IDS: (df, param.VAR_DOCDC_FAMILY_ID)}
+        max_workers = self.max_connections if self.step_2_concurrent else 1
+        
+        try:
+            with ThreadPoolExecutor(max_workers = max_workers) as executor:
+                futures = {name: executor.submit(self._read_sql_timed, name, query, family_ids_table, run_id)
+                           for name, query in param.sql_queries_COUPLING_COUNTS.items()}
+                tables = {name: future.result() for name, future in futures.items()}
+        finally:
+            self.close_sessions(run_id)
+        
+        return tables
     
-    def create_temporary_table(self, df, temporary_table_name, key, engine):
+    
+    def create_temporary_table(self, df, temporary_table_name, key, engine, run_id = None):
         
         """
-        Snippet to create a temporary table in the SQL database
-        Inpired from https://stackoverflow.com/questions/30867390/python-pandas-to-sql-how-to-create-a-table-with-a-primary-key
+        Bulk loading of ids in a temporary table of the SQL database
+        # 1. The table is created as a real TEMPORARY table of the session pinned for the run (and thread),
+        so that the following queries (run on the same connection) see it and it disappears with the session
+        # 2. The ids are streamed with COPY FROM STDIN
+        # 3. The primary key is added after the loading, and the table is analysed for the query planner
         """
-        # Local variables
-        eng = self.engine
-
-        with eng.connect() as conn, conn.begin():
-            pandas_engine = pandasSQL_builder(conn)
-
-            # creating a table
-            table = TemporaryTable(temporary_table_name, pandas_engine, frame=df, if_exists="replace")
-            table.create()
-
-            # dumping to the existing table
-            df.to_sql(temporary_table_name, conn, index = False, if_exists="replace")
-
-        # Simply add the primary key after uploading the table with pandas.
-        with eng.connect() as con:
-            con.execute('ALTER TABLE ' + temporary_table_name  + ' ADD PRIMARY KEY ('+key+');')
+        
+        # Unpacking parameters
+        conn, _ = self._session(engine, run_id)
+        ids = pd.unique(pd.Series(df[key]).dropna().astype('int64'))
+        
+        try:
+            cur = conn.cursor()
             
+            # (1)
+            cur.execute('DROP TABLE IF EXISTS pg_temp.' + temporary_table_name)
+            cur.execute('CREATE TEMPORARY TABLE ' + temporary_table_name + ' (' + key + ' BIGINT NOT NULL)')
             
+            # (2)
+            data = io.StringIO('\n'.join(map(str, ids.tolist())))
+            cur.copy_expert('COPY ' + temporary_table_name + ' (' + key + ') FROM STDIN', data)
             
-    def read_sql_tmpfile(self, query, db_engine):
+            # (3)
+            cur.execute('ALTER TABLE ' + temporary_table_name  + ' ADD PRIMARY KEY ('+key+')')
+            cur.execute('ANALYZE ' + temporary_table_name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        print('=>', len(ids), 'ids loaded in', temporary_table_name)
+        
+        
+    def _session(self, engine = None, run_id = None):
+        
+        """
+        Returns the session (connection, names of its temporary tables) pinned for the run in the current
+        thread (opened at the first call)
+        """
+        
+        thread_id = threading.get_ident()
+        with self._sessions_lock:
+            sessions = self._sessions.setdefault(run_id, {})
+            if thread_id not in sessions:
+                sessions[thread_id] = ((engine or self.engine).raw_connection(), set())
+            return sessions[thread_id]
+    
+    
+    def close_sessions(self, run_id = None):
+        
+        """
+        Drops the temporary tables of the connections pinned for the run and gives them back to the pool
+        ## Every connection is closed even if some of them fail, the first error is raised at the end
+        """
+        
+        with self._sessions_lock:
+            sessions = self._sessions.pop(run_id, {})
+        errors = []
+        for conn, _ in sessions.values():
+            try:
+                cur = conn.cursor()
+                cur.execute('DISCARD TEMP')
+                conn.commit()
+            except Exception as e:
+                print('=> Could not drop the temporary tables of a session:', repr(e))
+                errors.append(e)
+            try:
+                conn.close()
+            except Exception as e:
+                print('=> Could not close a session:', repr(e))
+                errors.append(e)
+        if errors:
+            raise errors[0]
+    
+    
+    @staticmethod
+    def temporary_table_name(name, run_id = None):
+        
+        """
+        Name of a temporary table in the database: the name used in the queries followed by the run id
+        """
+        
+        return name if run_id is None else 'tmp_{}_{}'.format(name, run_id)
+    
+    
+    def read_sql_cached(self, query, temporary_tables = None, run_id = None):
+        
+        """
+        Returns the result of a query from the local cache if possible, from the database otherwise
+        # temporary_tables: {table name: (dataframe, key column)} of the temporary tables used by the query.
+        They are part of the cache key and are created in the database only if the query has to be run.
+        # The query refers to the temporary tables with fields ({patent_ids}...): they are replaced by the
+        names of the tables of the run just before running the query, so that the cache key does not
+        depend on the run
+        """
+        
+        temporary_tables = temporary_tables or {}
+        
+        if self.cache is not None:
+            key = self.cache.key(query, temporary_tables)
+            df = self.cache.get(key)
+            if df is not None:
+                print('=> Result retrieved from the local cache')
+                return df
+        
+        connection = None
+        if temporary_tables:
+            connection, created = self._session(self.engine, run_id)
+            names = {name: self.temporary_table_name(name, run_id) for name in temporary_tables}
+            for name, (df, key_column) in temporary_tables.items():
+                if names[name] not in created:
+                    print('-> Creating the temporary table', names[name], 'in the SQL database')
+                    self.create_temporary_table(df = df,
+                                                temporary_table_name = names[name],
+                                                key = key_column,
+                                                engine = self.engine,
+                                                run_id = run_id)
+                    created.add(names[name])
+            query = query.format(**names)
+        
+        df = self.read_sql_tmpfile(query, self.engine, connection = connection)
+        
+        if self.cache is not None:
+            self.cache.put(key, df)
+        return df
+    
+    
+    def invalidate_cache(self, query = None, temporary_tables = None):
+        
+        """
+        Removes the cached result of a query (with the same temporary tables), or all the cached results
+        if no query is given
+        """
+        
+        if self.cache is None:
+            return
+        if query is None:
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate(self.cache.key(query, temporary_tables))
+            
+            
+    def read_sql_queries(self, queries, concurrent = False):
+        
+        """
+        Running several queries {name: query} and returning the tables {name: table}
+        # If concurrent, the queries are run at the same time over at most max_connections connections
+        # The duration of each query is printed and stored in self.timings
+        """
+        
+        def run(name):
+            return self._read_sql_timed(name, queries[name])
+        
+        start = time.perf_counter()
+        if concurrent and len(queries) > 1:
+            with ThreadPoolExecutor(max_workers = self.max_connections) as executor:
+                tables = dict(zip(queries, executor.map(run, queries)))
+        else:
+            tables = {name: run(name) for name in queries}
+        print('=> Total time:', round(time.perf_counter() - start, 1), 's')
+        
+        return tables
+            
+            
+    def _read_sql_timed(self, name, query, temporary_tables = None, run_id = None):
+        
+        """
+        read_sql_cached, printing the duration of the query and storing it in self.timings
+        """
+        
+        start = time.perf_counter()
+        table = self.read_sql_cached(query, temporary_tables, run_id)
+        self.timings[name] = time.perf_counter() - start
+        print('=>', name, ':', len(table), 'rows retrieved in', round(self.timings[name], 1), 's')
+        return table
+            
+            
+    def read_sql_tmpfile(self, query, db_engine, parquet_path = None, connection = None):
         
         """
         Snippet to speed up large SQL queries by loading them in a temporary file
+        # The query runs on the given connection (e.g. the one holding the temporary tables), which is left open
+        # With the arrow_reader option, the data is read with read_sql_arrow instead (and can be spilled
+        to a Parquet file at parquet_path)
         """
         
+        session = connection
+        
+        if self.arrow_reader:
+            return read_sql_arrow(query, db_engine, parquet_path = parquet_path, connection = session)
+        
         with tempfile.TemporaryFile() as tmpfile:
             copy_sql = "COPY ({query}) TO STDOUT WITH CSV {head}".format(
                query=query, head="HEADER"
             )
-            conn = db_engine.raw_connection()
-            cur = conn.cursor()
-            cur.copy_expert(copy_sql, tmpfile)
+            conn = session if session is not None else db_engine.raw_connection()
+            try:
+                cur = conn.cursor()
+                cur.copy_expert(copy_sql, tmpfile)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                if conn is not session:
+                    conn.close()
             tmpfile.seek(0)
             df = pd.read_csv(tmpfile, low_memory=False)
+            if parquet_path is not None:
+                df.to_parquet(parquet_path)
             return df
-        
-        
-        
-class TemporaryTable(SQLTable):
-    
-    """
-    Code snippet taken from https://gist.github.com/alecxe/44682f79b18f0c82a99c
-    """
-    
-    """Overriding the _create_table_setup() method trying to make the table created temporary."""
-    
-    def _create_table_setup(self):
-        from sqlalchemy import Table, Column, PrimaryKeyConstraint
-
-        column_names_and_types = \
-            self._get_column_names_and_types(self._sqlalchemy_type)
-
-        columns = [Column(name, typ, index=is_index)
-                   for name, typ, is_index in column_names_and_types]
-
-        if self.keys is not None:
-            if not com.is_list_like(self.keys):
-                keys = [self.keys]
-            else:
-                keys = self.keys
-            pkc = PrimaryKeyConstraint(*keys, name=self.name + '_pk')
-            columns.append(pkc)
-
-        schema = self.schema or self.pd_sql.meta.schema
-
-        # At this point, attach to new metadata, only attach to self.meta
-        # once table is created.
-        from sqlalchemy.schema import MetaData
-        meta = MetaData(self.pd_sql, schema=schema)
-
-        #                                                                FIX HERE v
-        return Table(self.name, meta, *columns, schema=schema, prefixes=['TEMPORARY'])
\ No newline at end of file
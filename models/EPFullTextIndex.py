@@ -0,0 +1,222 @@
+"""
+# Contains a byte-offset index over the EP full-text database
+# The files are scanned once; afterwards the rows of given publication numbers are read directly
+# at their position in the files instead of parsing whole buckets with pandas
+"""
+
+# Required libraries
+import os
+import glob
+import json
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Loading model parameters
+import Parameters as param
+
+
+# One record by row of the EP files, sorted by (publication number, kind, language, text type)
+INDEX_DTYPE = np.dtype([('publication_number', '<i4'),
+                        ('publication_kind', 'u1'),
+                        ('language_text_component', 'u1'),
+                        ('text_type', 'u1'),
+                        ('file', '<u2'),
+                        ('offset', '<i8'),
+                        ('length', '<i8')])
+
+# Columns of the index stored as codes (the values are kept in the vocabularies of the index)
+CODED_COLUMNS = ['publication_kind', 'language_text_component', 'text_type']
+
+
+
+class EPFullTextIndex:
+
+    """
+    Index of the rows of the EP full-text files:
+    # 1. For each row: (publication_number, publication_kind, language_text_component, text_type) and the
+    position of the row (file, byte offset, length)
+    # 2. The records are sorted by publication number and stored in a .npy file, memory-mapped when loaded
+    (the kinds, languages and text types are stored as one-byte codes, see vocabularies)
+    # 3. A lookup is a binary search in the records, followed by a seek and a read of each row found
+
+    Usage:
+    index = EPFullTextIndex.build(directory) # once
+    index = EPFullTextIndex.load(directory)
+    df = index.read(publication_numbers, text_types = ['CLAIM'], languages = ['en'])
+    """
+
+    def __init__(self, records, files, vocabularies):
+
+        """
+        Instantiation of the index (see build and load)
+        """
+
+        self.records = records
+        self.files = files
+        self.vocabularies = vocabularies # column -> list of the values (the code of a value is its position)
+
+
+    def __len__(self):
+        return len(self.records)
+
+
+    @classmethod
+    def build(cls, directory, files = None, nb_processes = 1):
+
+        """
+        Scanning the EP files (by default the ones of Parameters.EP_FULL_TEXT_FILES) and saving the index
+        in the directory (index.npy and index.json)
+        # The files are scanned in parallel if nb_processes > 1
+        """
+
+        files = sorted(glob.glob(param.EP_FULL_TEXT_FILES)) if files is None else list(files)
+        files = [os.path.abspath(f) for f in files]
+        if len(files) > np.iinfo(INDEX_DTYPE['file']).max:
+            raise ValueError('Too many files for the index')
+
+        # Scanning the files
+        if nb_processes > 1:
+            with ProcessPoolExecutor(max_workers = nb_processes) as executor:
+                results = list(executor.map(_scan_file, files))
+        else:
+            results = [_scan_file(f) for f in files]
+
+        # Merging the records of the files, with the codes of a single vocabulary
+        vocabularies = {col: [] for col in CODED_COLUMNS}
+        parts = []
+        for number, (columns, file_vocabularies) in enumerate(results):
+            part = np.empty(len(columns['offset']), dtype = INDEX_DTYPE)
+            part['publication_number'] = columns['publication_number']
+            part['file'] = number
+            part['offset'] = columns['offset']
+            part['length'] = columns['length']
+            for col in CODED_COLUMNS:
+                codes = np.array([cls._code(vocabularies[col], value) for value in file_vocabularies[col]],
+                                 dtype = 'int64')
+                part[col] = codes[np.asarray(columns[col], dtype = 'int64')] if len(codes) else 0
+            parts.append(part)
+            print('=>', files[number], ':', len(part), 'rows indexed')
+
+        records = np.concatenate(parts) if parts else np.empty(0, dtype = INDEX_DTYPE)
+        records.sort(order = ['publication_number'] + CODED_COLUMNS + ['file', 'offset'], kind = 'mergesort')
+
+        # Saving the index
+        os.makedirs(directory, exist_ok = True)
+        np.save(os.path.join(directory, 'index.npy'), records)
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({'files': files, 'vocabularies': vocabularies}, f)
+        print('=> Index of', len(records), 'rows saved in', directory)
+
+        return cls.load(directory)
+
+
+    @classmethod
+    def load(cls, directory):
+
+        """
+        Loading an index saved by build (the records are memory-mapped)
+        """
+
+        records = np.load(os.path.join(directory, 'index.npy'), mmap_mode = 'r')
+        with open(os.path.join(directory, 'index.json')) as f:
+            meta = json.load(f)
+        return cls(records, meta['files'], meta['vocabularies'])
+
+
+    def lookup(self, publication_numbers, text_types = None, languages = None, kinds = None):
+
+        """
+        Returns the records of the given publication numbers, optionally restricted to some text types
+        (e.g. ['CLAIM']), languages (e.g. ['en', 'de', 'fr']) and publication kinds
+        """
+
+        numbers = pd.to_numeric(pd.Series(list(publication_numbers), dtype = object), errors = 'coerce').dropna()
+        numbers = np.unique(numbers.astype('int64').values)
+        pubs = self.records['publication_number']
+
+        # Binary search of the range of records of each publication number
+        start = np.searchsorted(pubs, numbers, side = 'left')
+        end = np.searchsorted(pubs, numbers, side = 'right')
+        sizes = end - start
+        positions = np.repeat(start - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        records = self.records[positions]
+
+        # Filters on the coded columns
+        for col, values in [('text_type', text_types), ('language_text_component', languages),
+                            ('publication_kind', kinds)]:
+            if values is not None:
+                codes = [i for i, value in enumerate(self.vocabularies[col]) if value in set(values)]
+                records = records[np.isin(records[col], codes)]
+        return records
+
+
+    def read(self, publication_numbers, text_types = None, languages = None, kinds = None):
+
+        """
+        Reading the rows of the given publication numbers from the EP files
+        (columns of Parameters.EP_FULL_TEXT_COLUMNS, as retrieve_ep_full_text)
+        # The rows of each file are read in order of their offsets (one seek and one read by row)
+        """
+
+        records = self.lookup(publication_numbers, text_types, languages, kinds)
+        records = records[np.lexsort((records['offset'], records['file']))]
+        rows = []
+        for number in np.unique(records['file']).tolist():
+            selected = records[records['file'] == number]
+            with open(self.files[number], 'rb') as f:
+                for offset, length in zip(selected['offset'].tolist(), selected['length'].tolist()):
+                    f.seek(offset)
+                    line = f.read(length).decode('utf-8').rstrip('\r\n')
+                    rows.append(line.split(param.EP_FULL_TEXT_SEP, len(param.EP_FULL_TEXT_COLUMNS) - 1))
+
+        df = pd.DataFrame(rows, columns = param.EP_FULL_TEXT_COLUMNS)
+        df['publication_number'] = df['publication_number'].astype('int64')
+        return df
+
+
+    @staticmethod
+    def _code(vocabulary, value):
+
+        """
+        Code of a value in a vocabulary (added if it is not in the vocabulary yet)
+        """
+
+        if value not in vocabulary:
+            if len(vocabulary) > np.iinfo('u1').max:
+                raise ValueError('Too many distinct values for a one-byte code: ' + value)
+            vocabulary.append(value)
+        return vocabulary.index(value)
+
+
+
+def _scan_file(path):
+
+    """
+    Scanning an EP file: returns the columns of the records of its rows (kinds, languages and text types
+    as codes of the vocabularies of the file) and the vocabularies
+    # The lines which are not data rows (header...) are skipped
+    """
+
+    columns = {'publication_number': array('i'), 'offset': array('q'), 'length': array('q')}
+    columns.update({col: array('B') for col in CODED_COLUMNS})
+    vocabularies = {col: {} for col in CODED_COLUMNS}
+    sep = param.EP_FULL_TEXT_SEP.encode('utf-8')
+
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            fields = line.split(sep, 6)
+            if len(fields) == 7 and fields[0] == b'EP' and fields[1].isdigit():
+                columns['publication_number'].append(int(fields[1]))
+                columns['offset'].append(offset)
+                columns['length'].append(len(line))
+                for col, value in zip(CODED_COLUMNS, [fields[2], fields[4], fields[5]]):
+                    codes = vocabularies[col]
+                    columns[col].append(codes.setdefault(value.decode('utf-8'), len(codes)))
+            offset += len(line)
+
+    return ({name: np.frombuffer(values, dtype = values.typecode) if len(values) else np.empty(0, 'int64')
+             for name, values in columns.items()},
+            {col: list(codes) for col, codes in vocabularies.items()})
@@ -0,0 +1,203 @@
+"""
+# Contains a columnar copy of the EP full-text database (Parquet files)
+# The raw tab-separated files are converted once; afterwards only the partitions and the row groups
+# matching a query (text types, languages, publication numbers) are read
+"""
+
+# Required libraries
+import os
+import csv
+import glob
+import numpy as np
+import pandas as pd
+
+# pyarrow is needed to write and read the store
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# Loading model parameters
+import Parameters as param
+
+
+# Columns used to partition the store (one folder by value, e.g. text_type=CLAIM/language_text_component=en)
+PARTITION_COLUMNS = ['text_type', 'language_text_component']
+
+# File written at the end of a conversion: a store without it is incomplete (interrupted conversion)
+SUCCESS_MARKER = '_SUCCESS'
+
+
+
+class EPFullTextStore:
+
+    """
+    EP full-text database stored as Parquet files:
+    # 1. Partitioned by text type and language (hive folders), one file by bucket of the raw data
+    (EP00.parquet, EP01.parquet...: the buckets split the publication numbers by their first two digits)
+    # 2. The rows of each file are sorted by publication number and written in row groups with statistics
+    (min/max of the publication numbers), the text is compressed
+    # 3. A query reads only the partitions of the text types / languages asked, the files of the buckets
+    of the publication numbers asked, the row groups whose statistics match and the columns asked
+
+    Usage:
+    store = EPFullTextStore.convert(directory) # once
+    store = EPFullTextStore(directory) # if EPFullTextStore.is_complete(directory)
+    df = store.read(publication_numbers, text_types = ['CLAIM'], languages = ['en'])
+    """
+
+    def __init__(self, directory):
+
+        """
+        Instantiation of the store from a folder written by convert
+        ## Raises a ValueError if the conversion has not been completed (see is_complete)
+        """
+
+        if pq is None:
+            raise ImportError('pyarrow is required by EPFullTextStore')
+        if not self.is_complete(directory):
+            raise ValueError('Incomplete EP full-text store (the conversion has not been completed): ' + directory)
+        self.directory = os.path.expanduser(directory)
+        self.paths = sorted(glob.glob(os.path.join(self.directory, '*', '*', '*.parquet')))
+
+
+    @classmethod
+    def convert(cls, directory, files = None, row_group_size = 10000, compression = 'zstd', chunk_size = 100000):
+
+        """
+        Converting the EP files (by default the ones of Parameters.EP_FULL_TEXT_FILES) into the store
+        # 1. Each file is read by chunks, the rows are split by partition
+        (the EP files have no header: the first line is already a row, any other line is dropped)
+        # 2. The rows of each partition are sorted by publication number and written in a file named after
+        the bucket (only one bucket is held in memory at a time)
+        # 3. The marker file _SUCCESS is written once all the files have been converted
+        """
+
+        if pq is None:
+            raise ImportError('pyarrow is required by EPFullTextStore')
+        files = sorted(glob.glob(param.EP_FULL_TEXT_FILES)) if files is None else sorted(files)
+        directory = os.path.expanduser(directory)
+        os.makedirs(directory, exist_ok = True)
+        marker = os.path.join(directory, SUCCESS_MARKER)
+        if os.path.exists(marker):
+            os.remove(marker)
+
+        for file in files:
+            print('-> Converting', file)
+            bucket = os.path.splitext(os.path.basename(file))[0]
+
+            # (1)
+            partitions = {}
+            reader = pd.read_csv(file, sep = param.EP_FULL_TEXT_SEP, header = None, names = param.EP_FULL_TEXT_COLUMNS,
+                                 dtype = str, quoting = csv.QUOTE_NONE, chunksize = chunk_size)
+            for chunk in reader:
+                chunk = chunk[(chunk['publication_authority'] == 'EP')
+                              & chunk['publication_number'].str.isdigit().fillna(False)]
+                for key, rows in chunk.groupby(PARTITION_COLUMNS, sort = False):
+                    partitions.setdefault(key, []).append(rows.drop(columns = PARTITION_COLUMNS))
+
+            # (2)
+            for key, chunks in partitions.items():
+                df = pd.concat(chunks, ignore_index = True)
+                df['publication_number'] = df['publication_number'].astype('int32')
+                df = df.sort_values('publication_number', kind = 'mergesort', ignore_index = True)
+                folder = os.path.join(directory, *['{}={}'.format(col, value) for col, value in zip(PARTITION_COLUMNS, key)])
+                os.makedirs(folder, exist_ok = True)
+                path = os.path.join(folder, bucket + '.parquet')
+                pq.write_table(pa.Table.from_pandas(df, preserve_index = False), path + '.tmp',
+                               row_group_size = row_group_size, compression = compression,
+                               use_dictionary = ['publication_authority', 'publication_kind', 'publication_date'],
+                               write_statistics = True)
+                os.replace(path + '.tmp', path)
+            print('=>', bucket, ':', len(partitions), 'partitions written')
+
+        # (3)
+        with open(marker, 'w') as f:
+            f.write('\n'.join(files) + '\n')
+        return cls(directory)
+
+
+    @staticmethod
+    def is_complete(directory):
+
+        """
+        True if a conversion has been completed in the folder (marker file _SUCCESS)
+        """
+
+        return os.path.exists(os.path.join(os.path.expanduser(directory), SUCCESS_MARKER))
+
+
+    def partitions(self):
+
+        """
+        Values of the partition columns available in the store, e.g. [('CLAIM', 'en'), ('CLAIM', 'de')...]
+        """
+
+        folders = {tuple(path.split(os.sep)[-3:-1]) for path in self.paths}
+        return sorted(tuple(part.split('=', 1)[1] for part in folder) for folder in folders)
+
+
+    def read(self, publication_numbers = None, text_types = None, languages = None, columns = None):
+
+        """
+        Reading the rows of the given publication numbers (all if None), optionally restricted to some
+        text types (e.g. ['CLAIM']) and languages (e.g. ['en', 'de', 'fr'])
+        Returns a DataFrame with the columns asked (by default those of Parameters.EP_FULL_TEXT_COLUMNS)
+        """
+
+        columns = param.EP_FULL_TEXT_COLUMNS if columns is None else list(columns)
+        paths = self._select_paths(publication_numbers, text_types, languages)
+        if not paths:
+            return pd.DataFrame({col: pd.Series(dtype = 'int64' if col == 'publication_number' else object)
+                                 for col in columns})
+
+        dataset = ds.dataset(paths, format = 'parquet', partitioning = 'hive', partition_base_dir = self.directory)
+
+        # The row groups are skipped with their statistics (range of the publication numbers), then
+        # the rows are filtered
+        condition = None
+        if publication_numbers is not None:
+            numbers = self._as_numbers(publication_numbers)
+            number = ds.field('publication_number')
+            condition = (number >= int(numbers.min())) & (number <= int(numbers.max())) \
+                        & number.isin(pa.array(numbers, type = pa.int32()))
+
+        df = dataset.to_table(columns = columns, filter = condition).to_pandas()
+        if 'publication_number' in df:
+            df['publication_number'] = df['publication_number'].astype('int64')
+        return df
+
+
+    def _select_paths(self, publication_numbers, text_types, languages):
+
+        """
+        Files of the store which may contain rows of the query (partitions and buckets)
+        """
+
+        selected = []
+        buckets = None
+        if publication_numbers is not None:
+            buckets = {'EP' + str(number).zfill(7)[:2] for number in self._as_numbers(publication_numbers).tolist()}
+        for path in self.paths:
+            text_type, language = [part.split('=', 1)[1] for part in path.split(os.sep)[-3:-1]]
+            if text_types is not None and text_type not in text_types:
+                continue
+            if languages is not None and language not in languages:
+                continue
+            if buckets is not None and os.path.splitext(os.path.basename(path))[0][:4] not in buckets:
+                continue
+            selected.append(path)
+        return selected
+
+
+    @staticmethod
+    def _as_numbers(publication_numbers):
+
+        """
+        Publication numbers as a sorted array of unique int32 (the invalid ones are dropped)
+        """
+
+        numbers = pd.to_numeric(pd.Series(list(publication_numbers), dtype = object), errors = 'coerce').dropna()
+        return np.unique(numbers.astype('int32').values)
@@ -0,0 +1,96 @@
+"""
+# Contains the interning table of the PATSTAT ids (docdb_family_id, appln_id...) used during a fit
+# Every id seen is given a dense int32 index, so that the stages of the Model exchange NumPy arrays
+# of small integers instead of raw ids or Patent objects
+"""
+
+# Required libraries
+import numpy as np
+import pandas as pd
+
+
+
+class IdIndex:
+
+    """
+    Interning table of ids:
+    # 1. The ids are numbered in order of appearance: 0, 1, 2...
+    # 2. intern() numbers the new ids and returns the indices of all the ids given
+    # 3. lookup() returns the indices without adding anything (-1 for the unknown and missing ids)
+    # 4. ids() translates indices back to ids (a simple array access)
+    """
+
+    def __init__(self, ids = None):
+
+        """
+        Instantiation of the table, with some ids already interned if given
+        """
+
+        self._ids = np.empty(0, dtype = 'int64') # index -> id
+        self._index = pd.Index(self._ids) # id -> index
+        if ids is not None:
+            self.intern(ids)
+
+
+    def __len__(self):
+        return len(self._ids)
+
+
+    def __contains__(self, value):
+        return self.lookup([value])[0] >= 0
+
+
+    def intern(self, values):
+
+        """
+        Returns the indices of the ids (int32), numbering the ids seen for the first time
+        (missing ids - NaN, None, pd.NA - get -1)
+        """
+
+        values, missing = self._as_ids(values)
+        codes = self._index.get_indexer(values)
+        new = (codes < 0) & ~missing
+        if new.any():
+            self._ids = np.concatenate([self._ids, pd.unique(values[new])])
+            self._index = pd.Index(self._ids)
+            codes = self._index.get_indexer(values)
+        codes[missing] = -1
+        return codes.astype('int32')
+
+
+    def lookup(self, values):
+
+        """
+        Returns the indices of the ids (int32), -1 for the ids which have not been interned
+        """
+
+        values, missing = self._as_ids(values)
+        codes = self._index.get_indexer(values)
+        codes[missing] = -1
+        return codes.astype('int32')
+
+
+    def ids(self, codes):
+
+        """
+        Translates indices back to ids (int64)
+        """
+
+        codes = np.asarray(codes)
+        if len(codes) and (codes.min() < 0 or codes.max() >= len(self._ids)):
+            raise IndexError('Unknown index in the interning table')
+        return self._ids[codes]
+
+
+    @staticmethod
+    def _as_ids(values):
+
+        """
+        Ids as an int64 array and mask of the missing ids (the ids may be given as floats, nullable integers...)
+        """
+
+        values = pd.Series(values) if not isinstance(values, pd.Series) else values
+        missing = values.isna().values
+        ids = np.zeros(len(values), dtype = 'int64')
+        ids[~missing] = np.asarray(values[~missing], dtype = 'int64')
+        return ids, missing
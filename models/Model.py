@@ -1,4 +1,5 @@
 # Standard libraries
+import os
 import pandas as pd
 import numpy as np
 import networkx as nx
@@ -7,9 +8,14 @@ import math
 # Custom modules
 import Parameters as param
 from Patent import *
+from PatentStore import *
 #from StaticNetworkState import *
 #from Community import *
 from CustomEngineForPatstat import *
+from CitationEngine import *
+from PartitionedTable import *
+from normalize_dtypes import normalize_patstat_dtypes
+from IdIndex import *
 
 
 
@@ -21,32 +27,68 @@ class Model:
                  technology_classes,
                  start_date,
                  end_date,
-                 percentage_top_patents):
+                 percentage_top_patents,
+                 single_pass_assignment = True,
+                 compact_dtypes = True,
+                 out_of_core_dir = None,
+                 nb_processes = 1,
+                 coupling_scope = 'breakthrough'):
         """
         Initialisation of the model:
         # 1. Parameters set when instantiating the model
+        ## single_pass_assignment: if True, the PATSTAT data is assigned to the patents by grouping the tables
+        once by appln_id / docdb_family_id instead of filtering them for each patent
+        ## compact_dtypes: if True, the tables retrieved from PATSTAT are converted to memory-compact types
+        (nullable integers, categoricals, dates - see normalize_patstat_dtypes) before any other stage
+        ## out_of_core_dir: if given, the co-citations are computed in bounded memory and written in an edge
+        file in this folder (see CitationEngine.compute_cc_out_of_core); self.CC is then memory-mapped
+        ## nb_processes: if greater than 1, the longitudinal coupling is computed by a pool of processes
+        (see CitationEngine.compute_lc_parallel)
+        ## coupling_scope: families over which the database counts the CC and BC (coupling_in_sql option of
+        the engine, see _compute_indirect_patent_citations)
+        ### 'breakthrough': the families of the patents of the model
+        ### 'technology_classes': all the families of the technology classes (before the selection of the
+        breakthrough patents), the counts of all these families being kept in self.family_couplings
         # 2. Parameters determined after fitting the model
         # 3. The data retrieved from Patstat is stored in 3 Pandas dataframes
+        (TABLE_ALL_PATENTS_INFO and TABLE_FORWARD_CITES are PartitionedTable read lazily from the disk
+        when the engine retrieves the data by batches)
         """
         
         print('----------------------------')
         print('Initialisation of the model.')
         print('----------------------------')
         
+        if coupling_scope not in ['breakthrough', 'technology_classes']:
+            raise ValueError('Unknown coupling_scope: ' + str(coupling_scope))
+        
         # (1) 
         self.technology_classes = technology_classes
         self.start_date = start_date
         self.end_date = end_date
         self.percentage_top_patents = percentage_top_patents
+        self.single_pass_assignment = single_pass_assignment
+        self.compact_dtypes = compact_dtypes
+        self.out_of_core_dir = out_of_core_dir
+        self.nb_processes = nb_processes
+        self.coupling_scope = coupling_scope
         self.custom_engine_for_PATSTAT = custom_engine_for_PATSTAT
         
         # (2) 
-        self.patent_list = []
+        self.patent_store = None # columnar storage of the patent attributes
+        self.patent_list = [] # Patent objects (views on the patent store)
         self.patent_ids = []
-        self.direct_citations = [] # contain the direct citations (family level)
-        self.CC = [] # cocitation
-        self.BC = [] # bibliographic coupling
-        self.LC = [] # longitudinal coupling
+        self.family_index = IdIndex() # dense int32 index of every docdb family seen, shared by all the stages
+        self.patent_families = np.empty(0, dtype = 'int32') # dense index of the family of each patent (-1 if unknown)
+        self.citation_engine = None # sparse citation engine (family level)
+        self.direct_citations = np.empty((0, 3), dtype = 'int64') # contain the direct citations (family level)
+        self.direct_citation_categories = pd.DataFrame() # origin and category of the direct citations (if retrieved)
+        self.CC = np.empty((0, 3), dtype = 'int64') # cocitation
+        self.BC = np.empty((0, 3), dtype = 'int64') # bibliographic coupling
+        self.BC_strength = pd.DataFrame() # strength of the bibliographic coupling (shared, jaccard, salton)
+        self.LC = np.empty((0, 3), dtype = 'int64') # longitudinal coupling
+        self.landscape_family_ids = [] # families of all the patents of the technology classes (coupling_scope)
+        self.family_couplings = {} # CC, BC and NB_CITING counts of the families, as computed by the database
         self.associated_dynamic_graph = nx.DiGraph() # Directed graph
         self.list_network_states = []
         self.list_communities = []
@@ -93,12 +135,31 @@ class Model:
         print('-> Retriving primary data about the patents linked to the selected technologies')
         
         # Querying the PATSTAT database with the custom engine
-        query = self.custom_engine_for_PATSTAT._Run_Engine_step_1(self.technology_classes,
-                                                                  self.start_date,
-                                                                  self.end_date)
+        # (the selection of the breakthrough patents can be done directly by the database)
+        if self.custom_engine_for_PATSTAT.breakthrough_selection_in_sql:
+            query = self.custom_engine_for_PATSTAT._Run_Engine_step_1_breakthrough(self.technology_classes,
+                                                                                   self.start_date,
+                                                                                   self.end_date,
+                                                                                   self.percentage_top_patents)
+        else:
+            query = self.custom_engine_for_PATSTAT._Run_Engine_step_1(self.technology_classes,
+                                                                      self.start_date,
+                                                                      self.end_date)
         # Assigning the result table to the model
+        if self.compact_dtypes:
+            query = normalize_patstat_dtypes(query, name = 'TABLE_PRIMARY_INFO')
         self.TABLE_PRIMARY_INFO = query
         
+        # Families of the whole technology classes, kept before the selection of the breakthrough patents
+        if self.coupling_scope == 'technology_classes':
+            if self.custom_engine_for_PATSTAT.breakthrough_selection_in_sql:
+                families = self.custom_engine_for_PATSTAT._Run_Engine_step_1_families(self.technology_classes,
+                                                                                      self.start_date,
+                                                                                      self.end_date)
+            else:
+                families = self.TABLE_PRIMARY_INFO
+            self.landscape_family_ids = families[param.VAR_DOCDC_FAMILY_ID].dropna().unique().tolist()
+        
     
     def _compute_new_variables(self):
         """
@@ -112,7 +173,6 @@ class Model:
         print('-> Computing new variables')
         
         # Unpacking some variables for clarity
-        df = self.TABLE_ALL_PATENTS_INFO
         citations_by_year = param.NEW_VAR_NB_CITING_DOCDB_FAM_BY_YEAR
         citations_docdb_fam = param.VAR_NB_CITING_DOCDB_FAM
         year = param.VAR_APPLN_FILLING_YEAR
@@ -121,10 +181,15 @@ class Model:
         # Computing the new variable
         ## Number of patent family citations received by year
         print('-> Adding the number of patent family citations received by year')
-        df[citations_by_year] = df[citations_docdb_fam]/(ref_year-df[year]) 
+        def add_citations_by_year(df):
+            df[citations_by_year] = df[citations_docdb_fam]/(ref_year-df[year]) 
+            return df
         
-        # Updating the table
-        self.TABLE_ALL_PATENTS_INFO = df
+        # Updating the table (partition by partition if it is on disk)
+        if isinstance(self.TABLE_ALL_PATENTS_INFO, PartitionedTable):
+            self.TABLE_ALL_PATENTS_INFO.transform(add_citations_by_year)
+        else:
+            self.TABLE_ALL_PATENTS_INFO = add_citations_by_year(self.TABLE_ALL_PATENTS_INFO)
     
     
     def _select_breakthrough_patents(self):
@@ -142,7 +207,15 @@ class Model:
         belonging to the same family.
         ## CAREFUL: because of rounding up, breakthrough patents in low patenting years will be overrepresented
         in proportion (10% of 1 patents round up = 1 patent selected)
+        ## The ties are broken by appln_id (then cpc_class_symbol) so that the selection is deterministic and
+        identical to the one done in PostgreSQL (see CustomEngineForPATSTAT._Run_Engine_step_1_breakthrough)
         """
+        # The selection has already been done by the database
+        if self.custom_engine_for_PATSTAT.breakthrough_selection_in_sql:
+            self.patent_ids = self.TABLE_PRIMARY_INFO[param.VAR_APPLN_ID].unique().tolist()
+            print('=> Number of breakthrough patents selected (in PostgreSQL):', len(self.patent_ids))
+            return
+        
         # Printing info
         print('=> Number of patents linked to selected technologies:',
               len(self.TABLE_PRIMARY_INFO[param.VAR_APPLN_ID].unique().tolist()))
@@ -155,15 +228,17 @@ class Model:
         
         # (1)
         # Sorting the table by earliest filling date
-        df.sort_values(by = param.VAR_EARLIEST_FILLING_DATE, inplace = True)
+        df.sort_values(by = [param.VAR_EARLIEST_FILLING_DATE, param.VAR_APPLN_ID, param.VAR_CPC_CLASS_SYMBOL],
+                       kind = 'mergesort', inplace = True)
         # Keeping only the oldest patent by family
         df.drop_duplicates(subset = [param.VAR_DOCDC_FAMILY_ID], keep = 'first', inplace = True)
         
         # (2)
         filtered_df = pd.DataFrame()
-        for year in df[param.VAR_EARLIEST_FILING_YEAR].unique().tolist():
+        for year in df[param.VAR_EARLIEST_FILING_YEAR].dropna().unique().tolist():
             df_year = df[df[param.VAR_EARLIEST_FILING_YEAR] == year]
-            df_year.sort_values(by = param.VAR_NB_CITING_DOCDB_FAM, ascending = False, inplace = True)
+            df_year.sort_values(by = [param.VAR_NB_CITING_DOCDB_FAM, param.VAR_APPLN_ID], ascending = [False, True],
+                                kind = 'mergesort', inplace = True)
             nb_top_patent_given_year = int(math.ceil(X*len(df_year))) # Needs rounding up
             df_year = df_year.head(nb_top_patent_given_year)
             filtered_df = pd.concat([filtered_df, df_year])
@@ -180,6 +255,8 @@ class Model:
         """
         Once the primary selection of breakthrough data has been done, we retrieve more 
         information about these patents.
+        # TABLE_ALL_PATENTS_INFO is in long format: each row comes from one PATSTAT relation (main information,
+        titles, abstracts, IPC, NACE2, CPC, patentees, backward citations) and only has its columns filled
         """
     
         print('-> Retrieving PATSTAT data using the CustomEngineForPatstat')
@@ -188,17 +265,15 @@ class Model:
                                                                  start_date = self.start_date,
                                                                  end_date = self.end_date) # random table names
         
-        print('-> Removing duplicated columns (if any)')  
+        # Memory-compact types (partition by partition if the tables are on disk)
+        if self.compact_dtypes:
+            if isinstance(a, PartitionedTable):
+                a.transform(lambda df: normalize_patstat_dtypes(df, name = 'TABLE_ALL_PATENTS_INFO (partition)'))
+                b.transform(lambda df: normalize_patstat_dtypes(df, name = 'TABLE_FORWARD_CITES (partition)'))
+            else:
+                a = normalize_patstat_dtypes(a, name = 'TABLE_ALL_PATENTS_INFO')
+                b = normalize_patstat_dtypes(b, name = 'TABLE_FORWARD_CITES')
         
-        def snippet_remove_duplicated_cols(df):
-            df = df.loc[:,~df.columns.duplicated()]
-            cols = [x for x in list(df) if '.' not in x]
-            df = df[cols]
-            return df
-            
-        a = snippet_remove_duplicated_cols(a)
-        #b = snippet_remove_duplicated_cols(b)
-
         # Update the tables
         self.TABLE_ALL_PATENTS_INFO = a
         self.TABLE_FORWARD_CITES = b
@@ -211,173 +286,94 @@ class Model:
     def _compute_direct_patent_citations(self):
         """
         Computing direct backwards citations (at the level of the family level)
+        # 1. Building the sparse citation matrix once with the CitationEngine
+        # 2. Direct citations: edge array (citing patent, cited patent, count), indexed on the patent list
+        # 3. Origin and category of each direct citation (if they have been retrieved by the engine)
         """
         
-        print('-> Computing direct citations (at the family level)')
-            
-        # (1) If a patent cites only one family
-        list1 = [(x,y) for x in self.patent_list for y in self.patent_list if y.patent_attributes[param.VAR_DOCDC_FAMILY_ID] == x.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]]
-        # (2) If the patent cites several families (then stored as list)
-        list2 = [(x,y) for x in self.patent_list for y in self.patent_list if type(x.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]) ==list if y.patent_attributes[param.VAR_DOCDC_FAMILY_ID] in x.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]]
+        # (1)
+        patent_families = self.patent_store.column(param.VAR_DOCDC_FAMILY_ID)
+        self.citation_engine = CitationEngine(patent_families, family_index = self.family_index)
+        # (the tables on disk are given partition by partition)
+        self.citation_engine.fit(self._partitions(self.TABLE_ALL_PATENTS_INFO,
+                                                  [param.VAR_DOCDC_FAMILY_ID, param.VAR_CITED_DOCDB_FAM_ID]),
+                                 self._partitions(self.TABLE_FORWARD_CITES))
+        self.patent_families = self.citation_engine.patent_family_codes
+        # Filing years of the patents, for the snapshots of the network (CitationEngine.snapshot)
+        if param.VAR_EARLIEST_FILING_YEAR in self.patent_store.scalar_columns:
+            self.citation_engine.set_patent_years(self.patent_store.column(param.VAR_EARLIEST_FILING_YEAR))
         
-        # Concatenating the two lists to have the direct citations
-        self.direct_citations = list1 + list2
+        # (2)
+        print('-> Computing direct citations (at the family level)')
+        self.direct_citations = self.citation_engine.compute_direct_citations()
+        
+        # (3)
+        if param.VAR_CITN_ORIGIN in self.TABLE_ALL_PATENTS_INFO.columns:
+            print('-> Adding the origin and category of the direct citations')
+            columns = [param.VAR_DOCDC_FAMILY_ID, param.VAR_CITN_CITED_DOCDB_FAM_ID,
+                       param.VAR_CITN_ORIGIN, param.VAR_CITN_CATEG]
+            categories = [self.citation_engine.compute_direct_citation_categories(table)
+                          for table in self._partitions(self.TABLE_ALL_PATENTS_INFO, columns)]
+            categories = pd.concat(categories, ignore_index = True).drop_duplicates()
+            self.direct_citation_categories = categories.sort_values(list(categories.columns), kind = 'mergesort') \
+                                                        .reset_index(drop = True)
             
     
     def _compute_indirect_patent_citations(self):
         """
         Computing indirect backwards citations (at the level of the family level)
-        # 1. CC (co-citations)
-        # 2. BC (bibliographic coupling) 
-        # 3. LC (longitudinal coupling)
+        # 1. CC (co-citations) - non directed, count = number of co-citing patents
+        # 2. BC (bibliographic coupling) - non directed, count = number of shared citing families
+        (with its normalised strengths in self.BC_strength)
+        # 3. LC (longitudinal coupling) - directed, count = number of citation paths
+        
+        The links are stored as edge arrays (source, target, count) indexed on self.patent_list
+        With the coupling_in_sql option of the engine, the CC and BC are counted by PostgreSQL, over the families
+        of the patents of the model (as in the citation matrix: the co-citing patents are patents of the model,
+        the citing families of the BC are any family), and the BC strengths are computed from these counts
+        ## With coupling_scope = 'technology_classes', the counts cover all the families of the technology classes:
+        the co-citing families of the CC are then any family of the technology classes. The family-level counts
+        are kept in self.family_couplings, the links between the patents of the model are taken from them.
         """
         
-        def _compute_cc(patent_list):
-            """
-            # (1) Co-citation is defined as the frequency with which two documents are cited together
-            by other documents. If at least one other document cites two documents in common these documents
-            are said to be co-cited.
-            # The produced list is non directed.
-            
-            ## Too slow...
-            """
-            print('-> Computing co-citations (cc)')
-            
-            # Definiton of variables
-            CC = []
-            
-            a = patent_list
-            all_patent_pairs = [(a[p1], a[p2]) for p1 in range(len(a)) for p2 in range(p1+1,len(a))]
-            
-            # Definition of the search algorithm
-            for patent in patent_list:
-                a = patent.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]
-                if type(a)==list:
-                    if len(a)>1:
-                        all_cited_patent_pairs = [(a[p1], a[p2]) for p1 in range(len(a)) for p2 in range(p1+1,len(a))]
-                        for pair in all_cited_patent_pairs:
-                            CC.append(pair)
-                        
-                        # Computing CC by looping over all pairs of patents
-                        #for patent_1, patent_2 in all_patent_pairs:
-                        #    if (patent_1.patent_attributes[param.VAR_DOCDC_FAMILY_ID],
-                        #        patent_2.patent_attributes[param.VAR_DOCDC_FAMILY_ID]) in all_cited_patent_pairs:
-                         #       CC.append((patent_1, patent_2))
-                    
-            
-            
-                            
-            
-                            
-            #CC2 = []
-            #for pair in CC:
-            #    patent1 = [patent for patent in self.patent_list if patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] == pair[0]]
-             #   patent2 = [patent for patent in self.patent_list if patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] == pair[1]]
-              #  if len(patent1)>0:
-              #      patent1 = patent1[0]
-              #  else: patent1=np.nan
-
-               # if len(patent2)>0:
-                #    patent2 = patent2[0]
-                #else: patent2=np.nan
-                #pair = (patent1, patent2)
-                #CC2.append(pair)
-
-                #CC = [pair for pair in CC2 if (pair[0]==pair[0]) & (pair[1] == pair[1])]
-                            
-                
-            # Removing duplicated items in the list
-            pairs = list(set(CC)) 
-            
-            CC = []
-            for pair in pairs:
-                patent1 = [patent for patent in self.patent_list if patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] == pair[0]]
-                patent2 = [patent for patent in self.patent_list if patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] == pair[1]]
-
-                if len(patent1)>0:
-                    patent1 = patent1[0]
-                else: patent1=np.nan
-
-                if len(patent2)>0:
-                    patent2 = patent2[0]
-                else: patent2=np.nan
-
-                pair = (patent1, patent2)
-                CC.append(pair)
-
-                CC = [pair for pair in CC if (pair[0]==pair[0]) & (pair[1] == pair[1])]
-                    
-            return CC
-        
-        
-        def _compute_bc(patent_list):
-            """
-            # (2) Bibliographic coupling occurs when two works reference a common third work in their bibliographies
-            # The produced list is non directed.
-            
-            # Can be optimised
-            """
-            print('-> Computing bibliographic coupling (bc)')
-            
-            # Definition of variables
-            BC = []
-            a = patent_list
-            all_patent_pairs = [(a[p1], a[p2]) for p1 in range(len(a)) for p2 in range(p1+1,len(a))]
-
-            # Computing BC by looping over all pairs of patents
-            for patent_1, patent_2 in all_patent_pairs:
-                list_citing_1 = patent_1.patent_attributes[param.NEW_VAR_CITING_DOCDB_FAM_IDS]
-                list_citing_2 = patent_2.patent_attributes[param.NEW_VAR_CITING_DOCDB_FAM_IDS]
-                common_elements = [x for x in list_citing_1 if x in list_citing_2]
-                if len(common_elements)>0:
-                    BC.append((patent_1, patent_2))
-            
-            # Removing duplicated items in the list
-            BC = list(set(BC)) 
-            return BC
+        # (1)-(2) counted by the database (the LC are still computed from the citation matrix)
+        sql = self.custom_engine_for_PATSTAT is not None and self.custom_engine_for_PATSTAT.coupling_in_sql
+        if sql:
+            if self.coupling_scope == 'technology_classes':
+                families = self.landscape_family_ids
+            else:
+                families = self.patent_store.column(param.VAR_DOCDC_FAMILY_ID)
+            counts = self.custom_engine_for_PATSTAT._Run_Engine_couplings(families)
+            self.family_couplings = counts
         
+        # (1)
+        print('-> Computing co-citations (cc)')
+        if sql:
+            self.CC = self.citation_engine.links_from_family_counts(counts['CC'])
+        elif self.out_of_core_dir is not None:
+            os.makedirs(self.out_of_core_dir, exist_ok = True)
+            path = self.citation_engine.compute_cc_out_of_core(os.path.join(self.out_of_core_dir, 'CC.edges'),
+                                                               tmp_dir = self.out_of_core_dir)
+            self.CC = self.citation_engine.read_edge_file(path)
+        else:
+            self.CC = self.citation_engine.compute_cc()
         
-        def _compute_lc(patent_list):
-            """
-            # (3) LC (longitudinal coupling). A cites a document that cites B.
-            # The produced list IS directed.
-            
-            # Can be optimised
-            """
-            print('-> Computing longitudinal coupling (lc)')
-            
-            LC = []
-            
-            # Identifying all patents cited by a given patent A
-            for patent_A in patent_list:
-                cited_fam = patent_A.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]
-                if type(cited_fam)==float:
-                        cited_fam = []
-                        cited_fam.append(patent_A.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID])
-                cited_patents = [patent for patent in patent_list if \
-                                 patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] in cited_fam]
-                
-                # Identifying all patents cited by a patent cited by patent A
-                for cited_patent in cited_patents:
-                    cited_fam = cited_patent.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID]
-                    if type(cited_fam)==float:
-                        cited_fam = []
-                        cited_fam.append(cited_patent.patent_attributes[param.VAR_CITED_DOCDB_FAM_ID])
-                    cited_cited_patents = [patent for patent in patent_list if \
-                                 patent.patent_attributes[param.VAR_DOCDC_FAMILY_ID] in cited_fam]
-                    
-                    # Adding the pairs in the LC list
-                    for patent_B in cited_cited_patents:
-                        LC.append((patent_A, patent_B))
-                    
-            # Removing duplicated items in the LC list
-            LC = list(set(LC)) 
-            return LC
-                
-        # Computing the measures defined
-        self.CC = _compute_cc(patent_list = self.patent_list)
-        self.BC = _compute_bc(patent_list = self.patent_list)
-        self.LC = _compute_lc(patent_list = self.patent_list)
+        # (2)
+        print('-> Computing bibliographic coupling (bc)')
+        if sql:
+            self.BC_strength = self.citation_engine.bc_strength_from_family_counts(counts['BC'], counts['NB_CITING'])
+            self.BC = self.BC_strength[['source', 'target', 'shared']].values.astype('int64').reshape(-1, 3)
+        else:
+            self.BC_strength = self.citation_engine.compute_bc_strength()
+            self.BC = self.BC_strength[['source', 'target', 'shared']].values.astype('int64').reshape(-1, 3)
+        
+        # (3)
+        print('-> Computing longitudinal coupling (lc)')
+        if self.nb_processes > 1:
+            self.LC = self.citation_engine.compute_lc_parallel(nb_processes = self.nb_processes,
+                                                               tmp_dir = self.out_of_core_dir)
+        else:
+            self.LC = self.citation_engine.compute_lc()
     
     
     def filter_patent_list(self):
@@ -386,13 +382,11 @@ class Model:
     
     def _create_patent_objects(self):
         """
-        Create a Patent object for each patent id and store them in a list
+        Create the columnar store of the patents and a Patent object (view on the store) for each patent id
         """
         print('Creation of the patent Python objects')
-        self.patent_list = []
-        for patent_id in list(self.patent_ids):
-            a = Patent(patent_id) # updated
-            self.patent_list.append(a) # updated
+        self.patent_store = PatentStore(self.patent_ids)
+        self.patent_list = self.patent_store.patents()
             
             
     def _assign_data_to_patent_obj(self):
@@ -401,10 +395,49 @@ class Model:
         we assign the data to the Patent objects
         """
         
+        if self.single_pass_assignment:
+            self._assign_data_to_patent_obj_single_pass()
+        else:
+            self._assign_data_to_patent_obj_per_patent()
+            
+            
+    def _assign_data_to_patent_obj_single_pass(self):
+        """
+        Same output as _assign_data_to_patent_obj_per_patent, but the tables are grouped once
+        (by appln_id for the main table, by docdb_family_id for the forward citations) and the
+        attributes of all the patents are filled in one sweep, directly in the columns of the patent store.
+        # 1. Assigning the data contained in the main table to the patents
+        # 2. Assigning forward citations to the patents
+        """
+        
         # Unpacking some variables
         df_all = self.TABLE_ALL_PATENTS_INFO
         df_fwd = self.TABLE_FORWARD_CITES
         
+        # (1)
+        print('Giving the attributes to the patents (single pass)')
+        # (partition by partition if the table is on disk, so that only one partition is in memory at a time)
+        self.patent_store.load_table(table = self._partitions(df_all), key = param.VAR_APPLN_ID)
+        
+        # (2)
+        print('Assigning forward citations to the patents (single pass)')
+        # (selected family, citing family) - the column names of this table are not reliable
+        self.patent_store.load_multi_valued_batches(name = param.NEW_VAR_CITING_DOCDB_FAM_IDS,
+                                                    batches = ((df.iloc[:, 0].values, df.iloc[:, 1].values)
+                                                               for df in self._partitions(df_fwd)),
+                                                    on = param.VAR_DOCDC_FAMILY_ID)
+        print('=> Memory used by the patent store:', round(self.patent_store.memory_usage()/1e6, 1), 'MB')
+            
+    
+    def _assign_data_to_patent_obj_per_patent(self):
+        """
+        Original implementation: the tables are filtered for each patent
+        """
+        
+        # Unpacking some variables
+        df_all = self._read_table(self.TABLE_ALL_PATENTS_INFO)
+        df_fwd = self._read_table(self.TABLE_FORWARD_CITES)
+        
         # (1) Assigning the data contained in the main table to the patent
         print('Giving the attributes to the patents')
         i = 1
@@ -435,6 +468,39 @@ class Model:
             j+=1
             
     
+    def links_to_ids(self, links):
+        """
+        Translating an edge array (source, target, count) indexed on self.patent_list into
+        (source appln_id, target appln_id, count)
+        """
+        links = np.asarray(links, dtype = 'int64').reshape(-1, 3)
+        return np.column_stack([self.patent_store.index.ids(links[:, 0]),
+                                self.patent_store.index.ids(links[:, 1]),
+                                links[:, 2]])
+    
+    
+    @staticmethod
+    def _read_table(table, columns = None):
+        """
+        Returns a table retrieved from PATSTAT as a DataFrame (only the given columns if any),
+        whether it is in memory or in Parquet partitions
+        """
+        if isinstance(table, PartitionedTable):
+            return table.read(columns)
+        return table if columns is None else table[columns]
+    
+    
+    @staticmethod
+    def _partitions(table, columns = None):
+        """
+        Returns a table retrieved from PATSTAT as an iterable of DataFrames (only the given columns if any):
+        the partitions of a PartitionedTable, or the DataFrame itself
+        """
+        if isinstance(table, PartitionedTable):
+            return table.partitions(columns)
+        return [table if columns is None else table[columns]]
+    
+    
     def snippet_store_patent_attributes(self, table):
         """
         Code snippet to dynamically store attributes 
@@ -445,7 +511,7 @@ class Model:
         for col in list(table):
             key = col
             value = table[col].unique().tolist()#[0]
-            value = [x for x in value if (x == x)!=False]  # new line
+            value = [x for x in value if pd.notna(x)]  # new line (also works with the nullable types)
             if len(value) == 1:
                 value = value[0]
             a[key] = value
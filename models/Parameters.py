@@ -13,6 +13,29 @@ VAR_APPLN_FILLING_YEAR = 'appln_filing_year'
 VAR_NB_CITING_DOCDB_FAM = 'nb_citing_docdb_fam'
 VAR_EARLIEST_FILLING_DATE = 'earliest_filing_date'
 VAR_EARLIEST_FILING_YEAR = 'earliest_filing_year'
+VAR_CPC_CLASS_SYMBOL = 'cpc_class_symbol'
+VAR_CITN_ORIGIN = 'citn_origin'
+VAR_CITN_CATEG = 'citn_categ'
+VAR_CITN_CITED_DOCDB_FAM_ID = 'citn_cited_docdb_family_id'
+
+# Types of the PATSTAT columns (used by the typed readers, see read_sql_arrow: the columns not listed are read as strings)
+## family_a, family_b, family and nb are the columns of the coupling counts (see sql_queries_COUPLING_COUNTS)
+PATSTAT_INTEGER_COLUMNS = ['appln_id', 'docdb_family_id', 'cited_docdb_family_id', 'inpadoc_family_id',
+                           'earliest_filing_year', 'appln_filing_year', 'earliest_publn_year', 'earliest_pat_publn_id',
+                           'nb_citing_docdb_fam', 'docdb_family_size', 'nb_applicants', 'nb_inventors',
+                           'person_id', 'applt_seq_nr', 'invt_seq_nr', 'doc_std_name_id', 'psn_id', 'psn_level',
+                           'han_id', 'han_harmonized', 'pat_publn_id', 'cited_pat_publn_id', 'citn_id',
+                           'cited_appln_id', 'internat_appln_id', 'citn_replenished', 'citn_cited_docdb_family_id',
+                           'family_a', 'family_b', 'family', 'nb']
+PATSTAT_CATEGORICAL_COLUMNS = ['cpc_class_symbol', 'cpc_value', 'cpc_version', 'cpc_gener_auth', 'cpc_position',
+                               'ipc_class_symbol', 'ipc_class_level', 'ipc_version', 'ipc_value', 'ipc_gener_auth',
+                               'ipc_position', 'nace2_code', 'appln_auth', 'appln_kind', 'receiving_office',
+                               'ipr_type', 'granted', 'int_phase', 'reg_phase', 'nat_phase', 'person_ctry_code',
+                               'psn_sector', 'appln_title_lg', 'appln_abstract_lg', 'citn_origin', 'citn_categ',
+                               'citn_gener_auth', 'publn_auth', 'publn_kind', 'publn_lg']
+PATSTAT_DATE_COLUMNS = ['earliest_filing_date', 'appln_filing_date', 'earliest_publn_date', 'publn_date']
+PATSTAT_FLOAT_COLUMNS = ['weight']
+PATSTAT_DATE_SENTINEL = '9999-12-31' # date used by PATSTAT when the date is unknown
 
 # Computed variables
 NEW_VAR_CITING_DOCDB_FAM_IDS = 'citing_docdb_families_ids'
@@ -38,44 +61,220 @@ sql_query_PATENT_PRIMARY_INFO = """
             """
 
 
+# Same as sql_query_PATENT_PRIMARY_INFO for several technology classes at once
+# .format("'H01M%%', 'Y02E%%'", start_date, end_date)
+## An application matching several classes through the same CPC symbol is returned only once
+sql_query_PATENT_PRIMARY_INFO_ALL_CLASSES = """
+            SELECT tls201_appln.appln_id, tls201_appln.DOCDB_FAMILY_ID,tls201_appln.EARLIEST_FILING_DATE, tls201_appln.EARLIEST_FILING_YEAR, tls201_appln.NB_CITING_DOCDB_FAM, cpc_class_symbol
+            FROM tls201_appln JOIN tls224_appln_cpc ON tls201_appln.appln_id = tls224_appln_cpc.appln_id
+            WHERE cpc_class_symbol like ANY (ARRAY[{}])
+            AND appln_filing_year between {} and {}
+            ORDER BY tls201_appln.appln_id
+            """
+
+
+# Selection of the breakthrough patents done in PostgreSQL (same rules as Model._select_breakthrough_patents)
+# .format(primary_info, percentage_top_patents) where primary_info is the query retrieving the primary
+# information of all the technology classes (see CustomEngineForPATSTAT._primary_info_query)
+## The percentage is cast to double precision so that the rounding up is the same as math.ceil in Python
+## (e.g. 0.07*100 = 7.000000000000001 -> 8 patents, while the numeric type of PostgreSQL would give 7)
+sql_query_BREAKTHROUGH_PATENTS = """
+            WITH primary_info AS (
+                {}
+            ),
+            earliest_by_family AS (
+                SELECT primary_info.*,
+                ROW_NUMBER() OVER (PARTITION BY docdb_family_id
+                                   ORDER BY earliest_filing_date, appln_id, cpc_class_symbol) AS rank_in_family
+                FROM primary_info
+            ),
+            ranked_by_year AS (
+                SELECT earliest_by_family.*,
+                ROW_NUMBER() OVER (PARTITION BY earliest_filing_year
+                                   ORDER BY nb_citing_docdb_fam DESC NULLS LAST, appln_id) AS rank_in_year,
+                COUNT(*) OVER (PARTITION BY earliest_filing_year) AS nb_patents_in_year
+                FROM earliest_by_family
+                WHERE rank_in_family = 1
+                AND earliest_filing_year IS NOT NULL
+            )
+            SELECT appln_id, docdb_family_id, earliest_filing_date, earliest_filing_year, nb_citing_docdb_fam, cpc_class_symbol
+            FROM ranked_by_year
+            WHERE rank_in_year <= CEIL(CAST({!r} AS double precision) * nb_patents_in_year)
+            ORDER BY earliest_filing_year, rank_in_year
+            """
+
+
+# Step 2: each one-to-many relation is retrieved as its own narrow table keyed by appln_id (long format),
+# with only the columns needed, instead of a single chain of LEFT JOINs multiplying the rows
+# (e.g. titles x abstracts x IPC codes x NACE2 codes)
+# The temporary tables are named after the run which creates them (see CustomEngineForPATSTAT.read_sql_cached):
+# the queries refer to them with the fields {patent_ids} and {family_ids}
+TEMP_TABLE_PATENT_IDS = 'patent_ids'
+TEMP_TABLE_FAMILY_IDS = 'family_ids'
+
 sql_query_PATENT_MAIN_INFO = """
-            SELECT * 
-            FROM temporary_table_patent_ids
-            LEFT JOIN tls201_appln ON temporary_table_patent_ids.appln_id = tls201_appln.appln_id
-            LEFT JOIN TLS202_APPLN_TITLE ON temporary_table_patent_ids.appln_id = TLS202_APPLN_TITLE.appln_id
-            LEFT JOIN TLS203_APPLN_ABSTR ON temporary_table_patent_ids.appln_id = TLS203_APPLN_ABSTR.appln_id
-            LEFT JOIN TLS209_APPLN_IPC ON temporary_table_patent_ids.appln_id = TLS209_APPLN_IPC.appln_id
-            LEFT JOIN TLS229_APPLN_NACE2 ON temporary_table_patent_ids.appln_id = TLS229_APPLN_NACE2.appln_id
+            SELECT tls201_appln.appln_id, tls201_appln.docdb_family_id, tls201_appln.inpadoc_family_id,
+            tls201_appln.appln_auth, tls201_appln.appln_nr, tls201_appln.appln_kind, tls201_appln.appln_filing_date,
+            tls201_appln.appln_filing_year, tls201_appln.earliest_filing_date, tls201_appln.earliest_filing_year,
+            tls201_appln.earliest_publn_date, tls201_appln.earliest_publn_year, tls201_appln.granted,
+            tls201_appln.docdb_family_size, tls201_appln.nb_citing_docdb_fam, tls201_appln.nb_applicants,
+            tls201_appln.nb_inventors
+            FROM {patent_ids}
+            JOIN tls201_appln ON {patent_ids}.appln_id = tls201_appln.appln_id
+            """
+
+
+sql_query_TITLE_INFO = """
+            SELECT TLS202_APPLN_TITLE.appln_id, appln_title_lg, appln_title
+            FROM {patent_ids}
+            JOIN TLS202_APPLN_TITLE ON {patent_ids}.appln_id = TLS202_APPLN_TITLE.appln_id
+            """
+
+
+sql_query_ABSTRACT_INFO = """
+            SELECT TLS203_APPLN_ABSTR.appln_id, appln_abstract_lg, appln_abstract
+            FROM {patent_ids}
+            JOIN TLS203_APPLN_ABSTR ON {patent_ids}.appln_id = TLS203_APPLN_ABSTR.appln_id
+            """
+
+
+sql_query_IPC_INFO = """
+            SELECT TLS209_APPLN_IPC.appln_id, ipc_class_symbol, ipc_class_level, ipc_position
+            FROM {patent_ids}
+            JOIN TLS209_APPLN_IPC ON {patent_ids}.appln_id = TLS209_APPLN_IPC.appln_id
+            """
+
+
+sql_query_NACE2_INFO = """
+            SELECT TLS229_APPLN_NACE2.appln_id, nace2_code, weight
+            FROM {patent_ids}
+            JOIN TLS229_APPLN_NACE2 ON {patent_ids}.appln_id = TLS229_APPLN_NACE2.appln_id
             """
 
 
 sql_query_CPC_INFO = """
-            SELECT * 
-            FROM temporary_table_patent_ids
-            LEFT JOIN TLS224_APPLN_CPC ON temporary_table_patent_ids.appln_id = TLS224_APPLN_CPC.appln_id 
+            SELECT TLS224_APPLN_CPC.appln_id, cpc_class_symbol, cpc_value, cpc_position
+            FROM {patent_ids}
+            JOIN TLS224_APPLN_CPC ON {patent_ids}.appln_id = TLS224_APPLN_CPC.appln_id
             """
 
 
+# TLS226_PERSON_ORIG is not joined anymore: it multiplies the rows by the number of original spellings of
+# each person, and the harmonised information needed is already in TLS206_PERSON
 sql_query_PATENTEES_INFO = """
-            SELECT * 
-            FROM temporary_table_patent_ids
-            LEFT JOIN TLS207_PERS_APPLN ON temporary_table_patent_ids.appln_id = TLS207_PERS_APPLN.appln_id
-            LEFT JOIN TLS206_PERSON ON TLS207_PERS_APPLN.PERSON_ID = TLS206_PERSON.PERSON_ID
-            LEFT JOIN TLS226_PERSON_ORIG ON TLS206_PERSON.PERSON_ID = TLS226_PERSON_ORIG.PERSON_ID
-            --LEFT JOIN TLS228_DOCDB_FAM_CITN ON tls201_appln.DOCDB_FAMILY_ID = TLS228_DOCDB_FAM_CITN.DOCDB_FAMILY_ID
+            SELECT TLS207_PERS_APPLN.appln_id, TLS207_PERS_APPLN.person_id, applt_seq_nr, invt_seq_nr,
+            person_name, person_ctry_code, doc_std_name_id, psn_id, psn_name, psn_sector, han_id
+            FROM {patent_ids}
+            JOIN TLS207_PERS_APPLN ON {patent_ids}.appln_id = TLS207_PERS_APPLN.appln_id
+            JOIN TLS206_PERSON ON TLS207_PERS_APPLN.person_id = TLS206_PERSON.person_id
             """
 
 
 sql_query_DOCBD_backwards_citations = """
-            SELECT * 
-            FROM docdb_family_ids
-            LEFT JOIN TLS228_DOCDB_FAM_CITN ON docdb_family_ids.docdb_family_id = TLS228_DOCDB_FAM_CITN.docdb_family_id
+            SELECT TLS228_DOCDB_FAM_CITN.docdb_family_id, TLS228_DOCDB_FAM_CITN.cited_docdb_family_id
+            FROM {family_ids}
+            JOIN TLS228_DOCDB_FAM_CITN ON {family_ids}.docdb_family_id = TLS228_DOCDB_FAM_CITN.docdb_family_id
+            """
+
+
+# Origin (applicant, examiner, search report...) and category (X, Y, A...) of the citations of the selected
+# families: TLS228 only has the family pairs, so the publication citations of TLS212 (and their categories
+# in TLS215) are aggregated at the family level. The cited family has its own column name, so that these
+# rows do not add citations to the ones of TLS228.
+sql_query_CITATION_CATEGORIES = """
+            SELECT DISTINCT citing_appln.docdb_family_id,
+            cited_appln.docdb_family_id AS citn_cited_docdb_family_id,
+            TLS212_CITATION.citn_origin, TLS215_CITN_CATEG.citn_categ
+            FROM {family_ids}
+            JOIN tls201_appln citing_appln ON {family_ids}.docdb_family_id = citing_appln.docdb_family_id
+            JOIN TLS211_PAT_PUBLN citing_publn ON citing_appln.appln_id = citing_publn.appln_id
+            JOIN TLS212_CITATION ON citing_publn.pat_publn_id = TLS212_CITATION.pat_publn_id
+            LEFT JOIN TLS211_PAT_PUBLN cited_publn ON TLS212_CITATION.cited_pat_publn_id = cited_publn.pat_publn_id
+                AND TLS212_CITATION.cited_pat_publn_id <> 0
+            JOIN tls201_appln cited_appln
+                ON COALESCE(cited_publn.appln_id, NULLIF(TLS212_CITATION.cited_appln_id, 0)) = cited_appln.appln_id
+            LEFT JOIN TLS215_CITN_CATEG ON TLS212_CITATION.pat_publn_id = TLS215_CITN_CATEG.pat_publn_id
+                AND TLS212_CITATION.citn_replenished = TLS215_CITN_CATEG.citn_replenished
+                AND TLS212_CITATION.citn_id = TLS215_CITN_CATEG.citn_id
+            WHERE citing_appln.docdb_family_id <> cited_appln.docdb_family_id
             """
 
 
+# Narrow tables retrieved for the patent ids (name: query), the main information first
+sql_queries_PATENT_INFO = {'main information': sql_query_PATENT_MAIN_INFO,
+                           'titles': sql_query_TITLE_INFO,
+                           'abstracts': sql_query_ABSTRACT_INFO,
+                           'IPC technology classes': sql_query_IPC_INFO,
+                           'NACE2 industries': sql_query_NACE2_INFO,
+                           'CPC technology classes': sql_query_CPC_INFO,
+                           'patentees (individuals)': sql_query_PATENTEES_INFO}
+
+
 sql_query_FORWARD_CITATIONS = """
-            SELECT docdb_family_ids.DOCDB_FAMILY_ID, TLS228_DOCDB_FAM_CITN.DOCDB_FAMILY_ID,
+            SELECT {family_ids}.DOCDB_FAMILY_ID, TLS228_DOCDB_FAM_CITN.DOCDB_FAMILY_ID,
             TLS228_DOCDB_FAM_CITN.CITED_DOCDB_FAMILY_ID
-            FROM docdb_family_ids JOIN TLS228_DOCDB_FAM_CITN 
-            ON docdb_family_ids.DOCDB_FAMILY_ID = TLS228_DOCDB_FAM_CITN.CITED_DOCDB_FAMILY_ID
-            """
\ No newline at end of file
+            FROM {family_ids} JOIN TLS228_DOCDB_FAM_CITN 
+            ON {family_ids}.DOCDB_FAMILY_ID = TLS228_DOCDB_FAM_CITN.CITED_DOCDB_FAMILY_ID
+            """
+
+
+# Couplings computed by the database (see CustomEngineForPATSTAT._Run_Engine_couplings): self-joins of
+# TLS228_DOCDB_FAM_CITN restricted to the families of the temporary table, only the aggregated counts
+# (family_a < family_b) are returned
+# CC: number of families of the table citing both family_a and family_b
+sql_query_CC_COUNTS = """
+            SELECT c1.cited_docdb_family_id AS family_a, c2.cited_docdb_family_id AS family_b, COUNT(*) AS nb
+            FROM {family_ids} citing
+            JOIN TLS228_DOCDB_FAM_CITN c1 ON citing.docdb_family_id = c1.docdb_family_id
+            JOIN {family_ids} fa ON c1.cited_docdb_family_id = fa.docdb_family_id
+            JOIN TLS228_DOCDB_FAM_CITN c2 ON c1.docdb_family_id = c2.docdb_family_id
+                AND c1.cited_docdb_family_id < c2.cited_docdb_family_id
+            JOIN {family_ids} fb ON c2.cited_docdb_family_id = fb.docdb_family_id
+            GROUP BY c1.cited_docdb_family_id, c2.cited_docdb_family_id
+            """
+
+# BC: number of families (of the table or not) citing both family_a and family_b, as in CitationEngine.compute_bc
+sql_query_BC_COUNTS = """
+            SELECT c1.cited_docdb_family_id AS family_a, c2.cited_docdb_family_id AS family_b, COUNT(*) AS nb
+            FROM {family_ids} fa
+            JOIN TLS228_DOCDB_FAM_CITN c1 ON fa.docdb_family_id = c1.cited_docdb_family_id
+            JOIN TLS228_DOCDB_FAM_CITN c2 ON c1.docdb_family_id = c2.docdb_family_id
+                AND c1.cited_docdb_family_id < c2.cited_docdb_family_id
+            JOIN {family_ids} fb ON c2.cited_docdb_family_id = fb.docdb_family_id
+            GROUP BY c1.cited_docdb_family_id, c2.cited_docdb_family_id
+            """
+
+# Number of families citing each family of the table (denominators of the BC strengths, see CitationEngine.compute_bc_strength)
+sql_query_NB_CITING_FAMILIES = """
+            SELECT fa.docdb_family_id AS family, COUNT(DISTINCT c.docdb_family_id) AS nb
+            FROM {family_ids} fa
+            JOIN TLS228_DOCDB_FAM_CITN c ON fa.docdb_family_id = c.cited_docdb_family_id
+            GROUP BY fa.docdb_family_id
+            """
+
+# Families of all the patents of the technology classes (before the selection of the breakthrough patents)
+# .format(primary_info) where primary_info is the query retrieving the primary information of all the
+# technology classes (see CustomEngineForPATSTAT._primary_info_query)
+sql_query_PRIMARY_INFO_FAMILY_IDS = """
+            SELECT DISTINCT primary_info.docdb_family_id
+            FROM (
+                {}
+            ) primary_info
+            WHERE primary_info.docdb_family_id IS NOT NULL
+            """
+
+sql_queries_COUPLING_COUNTS = {'CC': sql_query_CC_COUNTS,
+                               'BC': sql_query_BC_COUNTS,
+                               'NB_CITING': sql_query_NB_CITING_FAMILIES}
+
+
+# EP full-text database: tab-separated files, one by bucket of publication numbers (EP00*.txt, EP01*.txt...)
+EP_FULL_TEXT_FILES = '../data/ep_full_text_database/2020_edition/EP*.txt'
+EP_FULL_TEXT_SEP = '\t'
+EP_FULL_TEXT_COLUMNS = ['publication_authority', # will always have the value "EP"
+                        'publication_number', # a seven-digit number
+                        'publication_kind',
+                        'publication_date', # in format YYYY-MM-DD
+                        'language_text_component', # de, en, fr; xx means unknown
+                        'text_type', # TITLE, ABSTR, DESCR, CLAIM, AMEND, ACSTM, SREPT, PDFEP
+                        'text'] # with XML tags where appropriate
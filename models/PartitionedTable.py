@@ -0,0 +1,142 @@
+"""
+# Contains an on-disk table stored as Parquet partitions, read lazily
+# Used to retrieve the PATSTAT data by batches without holding the whole tables in memory
+"""
+
+# Required libraries
+import os
+import glob
+import uuid
+import pandas as pd
+
+# pyarrow is only needed to read the columns of the partitions without loading them
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+
+class PartitionedTable:
+
+    """
+    Table made of Parquet files (one by batch) in a folder:
+    # 1. The batches are appended one after the other (part-00000.parquet, part-00001.parquet...)
+    # 2. Nothing is kept in memory but the names of the columns of each partition
+    # 3. The table is read partition by partition, or at once with only the columns needed
+    (columns missing in a partition are filled with NaN)
+    """
+
+    def __init__(self, directory):
+
+        """
+        Instantiation of the table (the partitions already in the folder are kept)
+        """
+
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok = True)
+        self.paths = sorted(glob.glob(os.path.join(self.directory, 'part-*.parquet')))
+        self._columns = [self._read_columns(path) for path in self.paths]
+
+
+    def __len__(self):
+
+        """
+        Number of rows of the table
+        """
+
+        if pq is not None:
+            return sum(pq.ParquetFile(path).metadata.num_rows for path in self.paths)
+        return sum(len(pd.read_parquet(path, columns = names[:1])) for path, names in zip(self.paths, self._columns))
+
+
+    @property
+    def columns(self):
+
+        """
+        Names of the columns of the table (union of the columns of the partitions, in order of appearance)
+        """
+
+        columns = []
+        for names in self._columns:
+            columns += [name for name in names if name not in columns]
+        return columns
+
+
+    def append(self, df):
+
+        """
+        Writing a batch as a new partition
+        """
+
+        path = os.path.join(self.directory, 'part-{:05d}.parquet'.format(len(self.paths)))
+        self._write(df, path)
+        self.paths.append(path)
+        self._columns.append(list(df.columns))
+
+
+    def partitions(self, columns = None):
+
+        """
+        Iterating over the partitions (as DataFrames), with only the given columns if any
+        """
+
+        for path, names in zip(self.paths, self._columns):
+            if columns is None:
+                yield pd.read_parquet(path)
+            else:
+                df = pd.read_parquet(path, columns = [name for name in columns if name in names])
+                yield df.reindex(columns = columns)
+
+
+    def read(self, columns = None):
+
+        """
+        Reading the table in a single DataFrame, with only the given columns if any
+        """
+
+        columns = self.columns if columns is None else list(columns)
+        tables = list(self.partitions(columns))
+        if not tables:
+            return pd.DataFrame(columns = columns)
+        return pd.concat(tables, ignore_index = True, sort = False)
+
+
+    def transform(self, function):
+
+        """
+        Applying a function (DataFrame -> DataFrame) to each partition, the result replacing the partition
+        """
+
+        for i, path in enumerate(self.paths):
+            df = function(pd.read_parquet(path))
+            self._write(df, path)
+            self._columns[i] = list(df.columns)
+
+
+    @staticmethod
+    def _write(df, path):
+
+        """
+        Writing a partition in a temporary file first, so that a partition is never partially written
+        """
+
+        tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            df.to_parquet(tmp_path, index = False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+    @staticmethod
+    def _read_columns(path):
+
+        """
+        Names of the columns of a partition
+        """
+
+        if pq is not None:
+            return [name for name in pq.read_schema(path).names if not name.startswith('__index_level_')]
+        return list(pd.read_parquet(path).columns)
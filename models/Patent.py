@@ -1,19 +1,156 @@
-import Parameters as param
+from collections.abc import MutableMapping
 
 
 class Patent:
-    
-    
-    def __init__(self, appln_id):
-        
+
+    """
+    Lightweight view on a row of a PatentStore
+    # The attributes are not stored in the object itself but in the columns of the store
+    # Patent(appln_id) still works on its own: a PatentStore of a single patent is then created
+    # The measures over time (centrality_over_time...) are mappings on the store as well:
+    patent.centrality_over_time[index] = value is stored, and assigning a dictionary replaces the values
+    """
+
+    __slots__ = ('store', 'row', 'appln_id')
+
+    def __init__(self, appln_id, store = None, row = 0):
+
+        if store is None:
+            from PatentStore import PatentStore
+            store = PatentStore([appln_id])
+
         # Parameters set when instantiating the patent
-        self.patent_attributes = {}
-        self.patent_attributes.update({param.VAR_APPLN_ID :  appln_id})
+        self.store = store
+        self.row = row
         self.appln_id = appln_id # As a shortcut we  store the main patent key as an attribute
-        
-        # Parameters determined after fitting the Model
-        self.patent_text = ''
-        self.smallest_index = () # = static network index corresponding to the earliest_date in which the patent appears 
-        self.centrality_over_time = {} # = {(index1, centr1), (index2, centr2), etc.}
-        self.betweeness_over_time = {}
-        self.community_over_time = {}
\ No newline at end of file
+
+
+    # Parameters determined after fitting the Model
+
+    @property
+    def patent_attributes(self):
+        return PatentAttributes(self.store, self.row)
+
+    @property
+    def patent_text(self):
+        return self.store.get('patent_text', self.row, default = '')
+
+    @patent_text.setter
+    def patent_text(self, value):
+        self.store.set('patent_text', self.row, value)
+
+    @property
+    def smallest_index(self):
+        # = static network index corresponding to the earliest_date in which the patent appears
+        return self.store.get('smallest_index', self.row, default = ())
+
+    @smallest_index.setter
+    def smallest_index(self, value):
+        self.store.set('smallest_index', self.row, value)
+
+    @property
+    def centrality_over_time(self):
+        # = {(index1, centr1), (index2, centr2), etc.}
+        return OverTimeValues(self.store, 'centrality', self.row)
+
+    @centrality_over_time.setter
+    def centrality_over_time(self, values):
+        self._set_over_time('centrality', values)
+
+    @property
+    def betweeness_over_time(self):
+        return OverTimeValues(self.store, 'betweeness', self.row)
+
+    @betweeness_over_time.setter
+    def betweeness_over_time(self, values):
+        self._set_over_time('betweeness', values)
+
+    @property
+    def community_over_time(self):
+        return OverTimeValues(self.store, 'community', self.row)
+
+    @community_over_time.setter
+    def community_over_time(self, values):
+        self._set_over_time('community', values)
+
+    def _set_over_time(self, measure, values):
+        values = dict(values)
+        over_time = OverTimeValues(self.store, measure, self.row)
+        over_time.clear()
+        over_time.update(values)
+
+    def __eq__(self, other):
+        return isinstance(other, Patent) and self.store is other.store and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self.store), self.row))
+
+    def __repr__(self):
+        return 'Patent({})'.format(self.appln_id)
+
+
+class PatentAttributes(MutableMapping):
+
+    """
+    Dictionary-like access to the attributes of a patent stored in a PatentStore
+    # Same format as the original patent_attributes dictionary: a scalar for a single value,
+    a list for several values, [] if the patent has no value
+    """
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, name):
+        return self.store.get(name, self.row)
+
+    def __setitem__(self, name, value):
+        self.store.set(name, self.row, value)
+
+    def __delitem__(self, name):
+        self.store.unset(name, self.row)
+
+    def __iter__(self):
+        return iter([name for name in self.store.names() if self.store.has(name, self.row)])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+
+class OverTimeValues(MutableMapping):
+
+    """
+    Dictionary-like access to a network measure of a patent over time {network index: value},
+    stored in the arrays of a PatentStore (one array by network state)
+    """
+
+    __slots__ = ('store', 'measure', 'row')
+
+    def __init__(self, store, measure, row):
+        self.store = store
+        self.measure = measure
+        self.row = row
+
+    def __getitem__(self, network_index):
+        return self.store.get_over_time(self.measure, network_index, self.row)
+
+    def __setitem__(self, network_index, value):
+        self.store.set_over_time_value(self.measure, network_index, self.row, value)
+
+    def __delitem__(self, network_index):
+        self.store.unset_over_time(self.measure, network_index, self.row)
+
+    def __iter__(self):
+        return iter(self.store.over_time_indices(self.measure, self.row))
+
+    def __len__(self):
+        return len(self.store.over_time_indices(self.measure, self.row))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
\ No newline at end of file
@@ -0,0 +1,412 @@
+"""
+# Contains the columnar storage of the patents of the Model
+# The attributes of all the patents are stored as arrays (one row by patent) instead of one dictionary by patent
+"""
+
+# Required libraries
+import numpy as np
+import pandas as pd
+
+# Custom modules
+import Parameters as param
+from Patent import Patent
+from IdIndex import IdIndex
+
+
+# Marks the rows of an object column which have not been set
+_MISSING = object()
+
+# Network measures tracked over time (see Patent.centrality_over_time etc.)
+OVER_TIME_MEASURES = ['centrality', 'betweeness', 'community']
+
+
+class PatentStore:
+
+    """
+    Struct-of-arrays storage of the patents:
+    # 1. Each patent has a dense row id (its position in the store, and in Model.patent_list)
+    # 2. Scalar attributes are stored as typed NumPy arrays (strings as categoricals) with a mask of the
+    rows where the attribute is available
+    # 3. Multi-valued attributes (cited families, citing families, CPC codes...) are stored in CSR format:
+    the values of the row r are values[offsets[r]:offsets[r+1]]
+    # 4. Attributes set from Python (e.g. the full text) are stored in object arrays
+    # 5. The network measures over time are stored as one array by network state (set for all the patents
+    at once with set_over_time, or patent by patent with set_over_time_value)
+
+    The Patent objects are lightweight views (store, row) on this storage, which give back the attributes
+    in the original format (see PatentAttributes).
+    """
+
+    def __init__(self, appln_ids):
+
+        """
+        Instantiation of the store with the ids of the patents
+        """
+
+        self.appln_ids = np.asarray(appln_ids, dtype = 'int64')
+        if len(pd.unique(self.appln_ids)) != len(self.appln_ids):
+            raise ValueError('The patent ids of a PatentStore must be unique')
+        self.index = IdIndex(self.appln_ids) # appln_id <-> row
+        self.scalar_columns = {} # name -> (values, available)
+        self.multi_columns = {} # name -> (offsets, values, as_list)
+        self.object_columns = {} # name -> object array
+        self.over_time = {measure: {} for measure in OVER_TIME_MEASURES} # measure -> {network index: values}
+
+
+    def __len__(self):
+        return len(self.appln_ids)
+
+
+    def patents(self):
+
+        """
+        Returns the list of the Patent views, in the order of the rows
+        """
+
+        return [Patent(appln_id, store = self, row = row) for row, appln_id in enumerate(self.appln_ids.tolist())]
+
+
+    def rows(self, appln_ids):
+
+        """
+        Returns the rows of the given patent ids (-1 if the patent is not in the store)
+        """
+
+        return self.index.lookup(appln_ids)
+
+
+    def load_table(self, table, key = param.VAR_APPLN_ID):
+
+        """
+        Storing all the columns of a PATSTAT table (several rows by patent) in one pass
+        # 1. Mapping each row of the table to the row of its patent
+        # 2. For each column, removing the NaN and the duplicated values (the order of appearance is kept)
+        # 3. Columns with at most one value by patent are stored as scalar columns, the other in CSR format
+        (with the rule of the original snippet_store_patent_attributes: a single value is given as a scalar)
+
+        The table may also be given as an iterable of DataFrames (e.g. the partitions of a PartitionedTable):
+        (1) and (2) are then done batch by batch, so that only one batch and the values kept are in memory
+        """
+
+        values_by_column = {}
+        for batch in self._batches(table):
+            # (1)
+            rows = self.rows(batch[key].values)
+            keep = rows >= 0
+            rows = rows[keep]
+
+            # (2)
+            for col in list(batch):
+                if col == key:
+                    continue
+                values = pd.DataFrame({'row': rows, 'value': batch[col].values[keep]})
+                values_by_column.setdefault(col, []).append(values.dropna().drop_duplicates())
+
+        for col, batches in values_by_column.items():
+            # (the empty batches are only kept for the type of the column)
+            batches = [values for values in batches if len(values)] or batches[:1]
+            values = pd.concat(batches, ignore_index = True).drop_duplicates()
+            values = values.iloc[np.argsort(values['row'].values, kind = 'mergesort')]
+            counts = np.bincount(values['row'].values, minlength = len(self))
+
+            # (3)
+            if len(counts) == 0 or counts.max() <= 1:
+                self._set_scalar_column(col, values['row'].values, values['value'])
+            else:
+                self._set_multi_column(col, counts, values['value'], as_list = False)
+
+
+    def load_multi_valued(self, name, keys, values, on = param.VAR_DOCDC_FAMILY_ID):
+
+        """
+        Storing a multi-valued attribute given as (key, value) pairs, where the key is matched with the
+        attribute 'on' of the patents (e.g. the citing families of each docdb family)
+        The values are always given back as lists.
+        """
+
+        self.load_multi_valued_batches(name, [(keys, values)], on = on)
+
+
+    def load_multi_valued_batches(self, name, batches, on = param.VAR_DOCDC_FAMILY_ID):
+
+        """
+        Same as load_multi_valued, with the (keys, values) pairs given by batches (e.g. one batch by partition
+        of a PartitionedTable): each batch is matched with the patents and deduplicated on its own
+        """
+
+        # The keys are matched as int64 (they may come as floats, nullable or 32-bit integers)
+        patents = pd.DataFrame({'key': self.column(on), 'row': np.arange(len(self))}).dropna()
+        patents = patents.astype({'key': 'int64'})
+        matched = []
+        for keys, values in batches:
+            pairs = pd.DataFrame({'key': pd.Series(keys), 'value': pd.Series(values)}).dropna(subset = ['key'])
+            pairs = pairs.astype({'key': 'int64'}).drop_duplicates()
+            pairs = pd.merge(patents, pairs, how = 'inner', on = 'key')[['row', 'value']]
+            if len(pairs):
+                matched.append(pairs)
+
+        pairs = pd.concat(matched, ignore_index = True).drop_duplicates() if matched else \
+                pd.DataFrame({'row': np.empty(0, dtype = 'int64'), 'value': []})
+        pairs = pairs.iloc[np.argsort(pairs['row'].values, kind = 'mergesort')]
+        counts = np.bincount(pairs['row'].values, minlength = len(self))
+        self._set_multi_column(name, counts, pairs['value'], as_list = True)
+
+
+    def column(self, name, fill_value = np.nan):
+
+        """
+        Returns a scalar attribute as a dense array (fill_value where the attribute is not available)
+        """
+
+        if name == param.VAR_APPLN_ID:
+            return self.appln_ids
+        if name in self.object_columns:
+            values = self.object_columns[name].copy()
+            values[np.array([x is _MISSING for x in values], dtype = bool)] = fill_value
+            return values
+        values, available = self.scalar_columns[name]
+        values = np.asarray(values)
+        if available.all():
+            return values
+        if values.dtype.kind in 'iub' and isinstance(fill_value, float):
+            values = values.astype('float64')
+        else:
+            values = values.copy()
+        values[~available] = fill_value
+        return values
+
+
+    def multi_column(self, name):
+
+        """
+        Returns a multi-valued attribute in CSR format (offsets, values)
+        """
+
+        offsets, values, _ = self.multi_columns[name]
+        return offsets, values
+
+
+    def names(self):
+
+        """
+        Names of all the attributes available
+        """
+
+        names = [param.VAR_APPLN_ID] + list(self.scalar_columns) + list(self.multi_columns)
+        return names + [name for name in self.object_columns if name not in names]
+
+
+    def get(self, name, row, default = _MISSING):
+
+        """
+        Returns the attribute of a patent in the original format:
+        # scalar if the patent has a single value, list if it has several, [] if none
+        """
+
+        if name in self.object_columns:
+            value = self.object_columns[name][row]
+            if value is not _MISSING:
+                return value
+        if name == param.VAR_APPLN_ID:
+            return self.appln_ids[row].item()
+        if name in self.scalar_columns:
+            values, available = self.scalar_columns[name]
+            return self._to_python(values[row]) if available[row] else []
+        if name in self.multi_columns:
+            offsets, values, as_list = self.multi_columns[name]
+            value = values[offsets[row]:offsets[row+1]].tolist()
+            if len(value) == 1 and not as_list:
+                return value[0]
+            return value
+        if default is _MISSING:
+            raise KeyError(name)
+        return default
+
+
+    def set(self, name, row, value):
+
+        """
+        Setting the attribute of a single patent (stored in an object column)
+        """
+
+        if name not in self.object_columns:
+            self.object_columns[name] = np.full(len(self), _MISSING, dtype = object)
+        self.object_columns[name][row] = value
+
+
+    def unset(self, name, row):
+
+        """
+        Removing an attribute set with PatentStore.set
+        """
+
+        if name not in self.object_columns or self.object_columns[name][row] is _MISSING:
+            raise KeyError(name)
+        self.object_columns[name][row] = _MISSING
+
+
+    def has(self, name, row):
+
+        """
+        True if the attribute exists for the patent
+        """
+
+        if name in self.object_columns and self.object_columns[name][row] is not _MISSING:
+            return True
+        return name == param.VAR_APPLN_ID or name in self.scalar_columns or name in self.multi_columns
+
+
+    def set_over_time(self, measure, network_index, values):
+
+        """
+        Storing a network measure of all the patents for a given network state
+        """
+
+        self.over_time[measure][network_index] = np.asarray(values)
+
+
+    def get_over_time(self, measure, network_index, row):
+
+        """
+        Returns the network measure of a patent for a given network state (KeyError if it has not been set)
+        """
+
+        values = self.over_time[measure].get(network_index)
+        if values is None or values[row] is _MISSING:
+            raise KeyError(network_index)
+        return self._to_python(values[row])
+
+
+    def set_over_time_value(self, measure, network_index, row, value):
+
+        """
+        Storing the network measure of a single patent for a given network state
+        # The values of the other patents are missing until they are set
+        # The array of the state becomes an object array if the value does not fit its type
+        """
+
+        values = self.over_time[measure].get(network_index)
+        if values is None:
+            values = np.full(len(self), _MISSING, dtype = object)
+        elif values.dtype != object and not np.can_cast(np.asarray(value).dtype, values.dtype, casting = 'same_kind'):
+            values = values.astype(object)
+        values[row] = value
+        self.over_time[measure][network_index] = values
+
+
+    def unset_over_time(self, measure, network_index, row):
+
+        """
+        Removing the network measure of a patent for a given network state
+        """
+
+        values = self.over_time[measure].get(network_index)
+        if values is None or values[row] is _MISSING:
+            raise KeyError(network_index)
+        if values.dtype != object:
+            values = values.astype(object)
+        values[row] = _MISSING
+        self.over_time[measure][network_index] = values
+
+
+    def over_time_indices(self, measure, row):
+
+        """
+        Network states for which the measure of a patent is available
+        """
+
+        return [index for index, values in self.over_time[measure].items() if values[row] is not _MISSING]
+
+
+    def memory_usage(self):
+
+        """
+        Memory used by the arrays of the store (in bytes, object columns excluded)
+        """
+
+        def nbytes(values):
+            if isinstance(values, pd.Categorical):
+                return values.codes.nbytes + values.categories.memory_usage(deep = True)
+            return values.nbytes
+
+        total = self.appln_ids.nbytes
+        total += sum(nbytes(values) + available.nbytes for values, available in self.scalar_columns.values())
+        total += sum(offsets.nbytes + nbytes(values) for offsets, values, _ in self.multi_columns.values())
+        total += sum(values.nbytes for measure in self.over_time.values() for values in measure.values())
+        return total
+
+
+    def _set_scalar_column(self, name, rows, values):
+
+        """
+        Scalar column: typed array of one value by patent and mask of the available values
+        """
+
+        available = np.zeros(len(self), dtype = bool)
+        available[rows] = True
+        values = self._typed(values)
+        if isinstance(values, pd.Categorical):
+            codes = np.full(len(self), -1, dtype = values.codes.dtype)
+            codes[rows] = values.codes
+            column = pd.Categorical.from_codes(codes, categories = values.categories)
+        else:
+            column = np.zeros(len(self), dtype = values.dtype)
+            column[rows] = values
+        self.scalar_columns[name] = (column, available)
+        self.multi_columns.pop(name, None)
+
+
+    def _set_multi_column(self, name, counts, values, as_list):
+
+        """
+        Multi-valued column in CSR format (the values must be sorted by row)
+        """
+
+        offsets = np.zeros(len(self) + 1, dtype = 'int64')
+        np.cumsum(counts, out = offsets[1:])
+        self.multi_columns[name] = (offsets, self._typed(values), as_list)
+        self.scalar_columns.pop(name, None)
+
+
+    @staticmethod
+    def _typed(values):
+
+        """
+        Numbers are kept in NumPy arrays, everything else is stored as a categorical
+        ## Strings may come as object or as the string dtype of pandas (default for text from pandas 3):
+        both are stored as categoricals, so that no extension dtype reaches the NumPy arrays of the store
+        """
+
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values.values
+        if pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+            return pd.Categorical(values)
+        # Nullable integers are stored as plain NumPy integers (as floats if some values are missing)
+        if hasattr(values.dtype, 'numpy_dtype'):
+            if values.isna().any():
+                return values.to_numpy(dtype = 'float64', na_value = np.nan)
+            return values.to_numpy(dtype = values.dtype.numpy_dtype)
+        return values.to_numpy()
+
+
+    @staticmethod
+    def _batches(table):
+
+        """
+        A table given as a DataFrame or as an iterable of DataFrames, as an iterable of DataFrames
+        """
+
+        return [table] if isinstance(table, pd.DataFrame) else table
+
+
+    @staticmethod
+    def _to_python(value):
+
+        """
+        NumPy scalars are given back as Python objects (as with .tolist()), dates as Timestamps
+        """
+
+        if isinstance(value, np.datetime64):
+            return pd.Timestamp(value)
+        return value.item() if isinstance(value, np.generic) else value
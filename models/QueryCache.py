@@ -0,0 +1,153 @@
+"""
+# Contains a persistent local cache of the results of the PATSTAT queries
+# The results are stored as Parquet files, named after a hash of everything that determines them
+"""
+
+# Required libraries
+import os
+import glob
+import hashlib
+import uuid
+import numpy as np
+import pandas as pd
+
+
+
+class QueryCache:
+
+    """
+    Content-addressed cache of query results:
+    # 1. The key of a result is the SHA-256 of the PATSTAT edition, the rendered SQL and the content of the
+    temporary tables used by the query (sorted ids, so that the order of the ids does not matter)
+    # 2. Each result is stored in <directory>/<key>.parquet
+    # 3. The last access of an entry is the modification time of its file: when the cache exceeds max_size
+    (in bytes), the least recently used entries are removed
+    """
+
+    def __init__(self, directory, max_size = 20e9, patstat_edition = ''):
+
+        """
+        Instantiation of the cache
+        """
+
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        self.patstat_edition = str(patstat_edition)
+        os.makedirs(self.directory, exist_ok = True)
+
+
+    def key(self, query, temporary_tables = None):
+
+        """
+        Key of the result of a query
+        # temporary_tables: {table name: (dataframe, key column)} of the temporary tables used by the query
+        """
+
+        h = hashlib.sha256()
+        h.update(self.patstat_edition.encode('utf-8'))
+        h.update(b'\0')
+        h.update(query.encode('utf-8'))
+        for name in sorted(temporary_tables or {}):
+            df, key = temporary_tables[name]
+            ids = np.sort(pd.unique(np.asarray(pd.Series(df[key]).dropna(), dtype = 'int64')))
+            h.update(b'\0' + name.encode('utf-8') + b'\0')
+            h.update(ids.tobytes())
+        return h.hexdigest()
+
+
+    def get(self, key):
+
+        """
+        Returns the cached result (or None) and marks the entry as recently used
+        """
+
+        path = self._path(key)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+        return df
+
+
+    def put(self, key, df):
+
+        """
+        Stores a result (written in a temporary file first, so that concurrent readers never see
+        a partial file), then evicts the least recently used entries if needed
+        """
+
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print('=> The result could not be cached:', e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+
+    def invalidate(self, key = None):
+
+        """
+        Removes the entry of the given key, or all the entries if no key is given
+        """
+
+        paths = [self._path(key)] if key is not None else self._entries()
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+    def size(self):
+
+        """
+        Total size of the cache (in bytes)
+        """
+
+        return sum(self._stat(path)[1] for path in self._entries())
+
+
+    def _evict(self):
+
+        """
+        Removes the least recently used entries until the cache is smaller than max_size
+        """
+
+        entries = sorted((self._stat(path) + (path,) for path in self._entries()))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+    def _entries(self):
+        return glob.glob(os.path.join(self.directory, '*.parquet'))
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.parquet')
+
+
+    @staticmethod
+    def _stat(path):
+
+        """
+        (last access, size) of an entry - (0, 0) if it has been removed in the meantime
+        """
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_mtime, stat.st_size)
@@ -0,0 +1,108 @@
+"""
+Benchmark of the assignment of the PATSTAT data to the Patent objects (Model._assign_data_to_patent_obj)
+# Compares the original per-patent filtering with the single-pass (group-by) assignment on synthetic tables
+# Usage (from the models folder): python benchmark_assign_data_to_patent_obj.py [nb_patents ...]
+
+## The per-patent implementation is far too slow to be run on 100k patents: it is timed on a sample of
+the patents (the full tables are kept, so that the cost of each filtering is the real one) and the
+total time is extrapolated linearly.
+"""
+
+# Required libraries
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Custom modules
+import Parameters as param
+from Model import *
+
+
+# Benchmark parameters
+NB_PATENTS = [10000, 100000]
+ROWS_BY_PATENT = 8 # CPC, IPC, patentees and backward citations produce several rows by patent
+FWD_CITES_BY_FAMILY = 5
+SAMPLE_SIZE_PER_PATENT = 500
+
+
+def make_tables(nb_patents, seed = 0):
+    """
+    Synthetic TABLE_ALL_PATENTS_INFO and TABLE_FORWARD_CITES with the structure of the PATSTAT tables
+    """
+    rng = np.random.RandomState(seed)
+    appln_ids = np.arange(1, nb_patents + 1) * 10
+    family_ids = appln_ids + 7
+
+    nb_rows = nb_patents * ROWS_BY_PATENT
+    rows = np.repeat(np.arange(nb_patents), ROWS_BY_PATENT)
+    df_all = pd.DataFrame({
+        param.VAR_APPLN_ID: appln_ids[rows],
+        param.VAR_DOCDC_FAMILY_ID: family_ids[rows],
+        param.VAR_APPLN_FILLING_YEAR: 1990 + rows % 25,
+        param.VAR_NB_CITING_DOCDB_FAM: rows % 40,
+        'cpc_class_symbol': np.array(['H01M  10/052', 'H01M   4/13', 'Y02E  60/10', 'B60L  50/64'])[rng.randint(0, 4, nb_rows)],
+        'person_ctry_code': np.array(['DE', 'FR', 'US', 'JP', 'KR', np.nan], dtype = object)[rng.randint(0, 6, nb_rows)],
+        param.VAR_CITED_DOCDB_FAM_ID: np.where(rng.rand(nb_rows) < 0.2, np.nan, family_ids[rng.randint(0, nb_patents, nb_rows)]),
+    })
+
+    fwd_rows = np.repeat(np.arange(nb_patents), FWD_CITES_BY_FAMILY)
+    df_fwd = pd.DataFrame({
+        'A': family_ids[fwd_rows],
+        'B': rng.randint(1, 10 * nb_patents, len(fwd_rows)),
+        'C': family_ids[fwd_rows],
+    })
+    return df_all, df_fwd
+
+
+def make_model(df_all, df_fwd, single_pass_assignment):
+    """
+    Model with the tables already retrieved and the patent objects created
+    """
+    model = Model(None, [], None, None, None, single_pass_assignment = single_pass_assignment)
+    model.TABLE_ALL_PATENTS_INFO = df_all
+    model.TABLE_FORWARD_CITES = df_fwd.copy()
+    model.patent_ids = df_all[param.VAR_APPLN_ID].unique().tolist()
+    model._create_patent_objects()
+    return model
+
+
+def run(nb_patents):
+    """
+    Times both implementations and checks that they assign the same attributes
+    """
+    df_all, df_fwd = make_tables(nb_patents)
+
+    # Single pass
+    model = make_model(df_all, df_fwd, single_pass_assignment = True)
+    start = time.perf_counter()
+    model._assign_data_to_patent_obj()
+    time_single_pass = time.perf_counter() - start
+
+    # Per patent, on a sample of the patents
+    reference = make_model(df_all, df_fwd, single_pass_assignment = False)
+    sample = min(SAMPLE_SIZE_PER_PATENT, nb_patents)
+    reference.patent_list = reference.patent_list[:sample]
+    start = time.perf_counter()
+    reference._assign_data_to_patent_obj()
+    time_per_patent = (time.perf_counter() - start) * nb_patents / sample
+
+    # Checking the results on the sample
+    for a, b in zip(reference.patent_list, model.patent_list):
+        assert a.patent_attributes == b.patent_attributes, a.appln_id
+
+    return time_per_patent, time_single_pass
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or NB_PATENTS
+    results = []
+    for nb_patents in sizes:
+        time_per_patent, time_single_pass = run(nb_patents)
+        results.append((nb_patents, time_per_patent, time_single_pass, time_per_patent / time_single_pass))
+
+    print('---------------------------------------')
+    print('{:>12} {:>20} {:>18} {:>10}'.format('nb_patents', 'per patent (s)*', 'single pass (s)', 'speedup'))
+    for nb_patents, time_per_patent, time_single_pass, speedup in results:
+        print('{:>12} {:>20.1f} {:>18.2f} {:>9.0f}x'.format(nb_patents, time_per_patent, time_single_pass, speedup))
+    print('* extrapolated from', SAMPLE_SIZE_PER_PATENT, 'patents')
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+import Parameters as param
+
+
+INT32_MIN, INT32_MAX = np.iinfo('int32').min, np.iinfo('int32').max
+
+
+def normalize_patstat_dtypes(df, name = None, verbose = True):
+
+    """
+    Memory-compact types for a table retrieved from PATSTAT, driven by the column lists of Parameters
+    # 1. Integer columns (ids, years, counts): nullable integers (the NaN do not turn them into floats),
+    Int32 when all the values fit in 32 bits, Int64 otherwise
+    # 2. Categorical columns (codes, authorities, countries...): categoricals instead of Python strings
+    # 3. Date columns: parsed once as datetime64, the unknown dates of PATSTAT (9999-12-31) as NaT
+    The other columns are kept as they are. Duplicated columns named by pandas (e.g. docdb_family_id.1)
+    get the type of the original column.
+
+    ## A column which cannot be converted (unexpected values) is left unchanged
+    """
+
+    integer_columns = set(param.PATSTAT_INTEGER_COLUMNS)
+    categorical_columns = set(param.PATSTAT_CATEGORICAL_COLUMNS)
+    date_columns = set(param.PATSTAT_DATE_COLUMNS)
+
+    before = memory_usage(df)
+    columns = {}
+    for i, col in enumerate(df.columns):
+        values = df.iloc[:, i]
+        base_name = str(col).split('.')[0]
+        try:
+            # (1)
+            if base_name in integer_columns:
+                values = _compact_integers(values)
+            # (2)
+            elif base_name in categorical_columns:
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype('category')
+            # (3)
+            elif base_name in date_columns:
+                values = values.where(values.astype(str) != param.PATSTAT_DATE_SENTINEL)
+                if not pd.api.types.is_datetime64_any_dtype(values.dtype):
+                    values = pd.to_datetime(values)
+        except (TypeError, ValueError):
+            pass
+        columns[i] = values
+
+    # Built by position, so that duplicated column names are kept
+    result = pd.concat(columns, axis = 1) if columns else df.copy()
+    result.columns = df.columns
+
+    if verbose:
+        print('=> Memory used by the table' + (' ' + name if name else '') + ':',
+              round(before/1e6, 1), 'MB ->', round(memory_usage(result)/1e6, 1), 'MB')
+    return result
+
+
+def memory_usage(df):
+
+    """
+    Memory used by a DataFrame (in bytes, content of the Python objects included)
+    """
+
+    return int(df.memory_usage(deep = True).sum())
+
+
+def _compact_integers(values):
+
+    """
+    Nullable integers of the smallest type (Int32 or Int64) able to hold the values
+    """
+
+    values = pd.to_numeric(values)
+    if pd.api.types.is_float_dtype(values.dtype):
+        not_null = values.dropna()
+        if not (not_null == np.floor(not_null)).all():
+            raise ValueError('Non integer values')
+    if values.isna().all():
+        return values.astype('Int32')
+    if INT32_MIN <= values.min() and values.max() <= INT32_MAX:
+        return values.astype('Int32')
+    return values.astype('Int64')
@@ -0,0 +1,151 @@
+import os
+import csv
+import datetime
+import threading
+import pandas as pd
+
+import Parameters as param
+
+# pyarrow is only needed by the typed reader
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+def patstat_column_types():
+    """
+    Arrow types of the known PATSTAT columns (see the column lists in Parameters)
+    """
+    types = {}
+    types.update({col: pa.int64() for col in param.PATSTAT_INTEGER_COLUMNS})
+    types.update({col: pa.dictionary(pa.int32(), pa.string()) for col in param.PATSTAT_CATEGORICAL_COLUMNS})
+    types.update({col: pa.date32() for col in param.PATSTAT_DATE_COLUMNS})
+    types.update({col: pa.float64() for col in param.PATSTAT_FLOAT_COLUMNS})
+    return types
+
+
+def read_sql_arrow(query, db_engine, parquet_path = None, column_types = None, block_size = 1 << 24, connection = None):
+
+    """
+    Typed alternative to read_sql_tmpfile: the output of COPY is streamed through a pipe into Arrow record
+    batches, without going through a temporary file nor pandas.read_csv
+    # 1. COPY runs in a thread and writes the CSV into the pipe
+    # 2. The header is read to name the columns as pandas.read_csv would (duplicated names get a '.1' suffix)
+    # 3. The rows are converted batch by batch with an explicit schema for the known PATSTAT columns
+    (int64 ids, dictionary-encoded codes, dates, float64 weights), the other columns being read as strings
+    (a type inferred by Arrow from the first block could be contradicted by a later block, e.g. appln_nr)
+    # 4. If parquet_path is given, each batch is also written in a Parquet file
+    # 5. The batches are converted once into a DataFrame (nullable integers, categoricals, datetime64)
+    (the unknown dates of PATSTAT - Parameters.PATSTAT_DATE_SENTINEL - become NaT)
+
+    ## The raw connection is closed whatever happens, unless an open connection is given (e.g. the one
+    holding the temporary tables), in which case it is left open
+    """
+
+    if pa is None:
+        raise ImportError('pyarrow is required by read_sql_arrow (pip install pyarrow)')
+
+    column_types = patstat_column_types() if column_types is None else column_types
+    copy_sql = "COPY ({query}) TO STDOUT WITH CSV {head}".format(query=query, head="HEADER")
+
+    conn = connection if connection is not None else db_engine.raw_connection()
+    read_fd, write_fd = os.pipe()
+    pipe_out = os.fdopen(read_fd, 'rb')
+    pipe_in = os.fdopen(write_fd, 'wb')
+    errors = []
+
+    # (1)
+    def copy():
+        try:
+            cur = conn.cursor()
+            cur.copy_expert(copy_sql, pipe_in)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            errors.append(e)
+        finally:
+            try:
+                pipe_in.close()
+            except OSError:
+                pass
+
+    thread = threading.Thread(target = copy, daemon = True)
+    thread.start()
+
+    writer = None
+    try:
+        # (2)
+        header = pipe_out.readline().decode('utf-8')
+        names = _mangle_duplicated_names(next(csv.reader([header]))) if header else []
+
+        # (3)
+        # (a result without rows is not read: pyarrow does not accept an empty CSV)
+        batches = []
+        if names and pipe_out.peek(1):
+            stream = pa_csv.open_csv(
+                pipe_out,
+                read_options = pa_csv.ReadOptions(column_names = names, block_size = block_size),
+                parse_options = pa_csv.ParseOptions(newlines_in_values = True),
+                convert_options = pa_csv.ConvertOptions(
+                    column_types = {name: column_types.get(name.split('.')[0], pa.string()) for name in names},
+                    strings_can_be_null = True,
+                    quoted_strings_can_be_null = False))
+            for batch in stream:
+                # (4)
+                if parquet_path is not None:
+                    if writer is None:
+                        writer = pq.ParquetWriter(parquet_path, batch.schema)
+                    writer.write_batch(batch)
+                batches.append(batch)
+
+        # Waiting for the end of COPY before using the data
+        thread.join()
+        if errors:
+            raise errors[0]
+
+        # (5)
+        if not batches:
+            return pd.DataFrame(columns = names)
+        table = _mask_date_sentinels(pa.Table.from_batches(batches))
+        return table.to_pandas(types_mapper = {pa.int64(): pd.Int64Dtype()}.get, date_as_object = False)
+
+    finally:
+        if writer is not None:
+            writer.close()
+        pipe_out.close()
+        thread.join()
+        if connection is None:
+            conn.close()
+
+
+def _mask_date_sentinels(table):
+    """
+    Nulls instead of the unknown dates of PATSTAT (Parameters.PATSTAT_DATE_SENTINEL), as normalize_patstat_dtypes
+    """
+    sentinel = pa.scalar(datetime.date.fromisoformat(param.PATSTAT_DATE_SENTINEL), type = pa.date32())
+    for i, field in enumerate(table.schema):
+        if pa.types.is_date32(field.type):
+            column = table.column(i)
+            column = pc.if_else(pc.equal(column, sentinel), pa.scalar(None, type = pa.date32()), column)
+            table = table.set_column(i, field, column)
+    return table
+
+
+def _mangle_duplicated_names(names):
+    """
+    Same naming of the duplicated columns as pandas.read_csv: a, a.1, a.2...
+    """
+    seen = {}
+    mangled = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            mangled.append('{}.{}'.format(name, seen[name]))
+        else:
+            seen[name] = 0
+            mangled.append(name)
+    return mangled
@@ -11,8 +11,11 @@ def read_sql_tmpfile(query, db_engine):
     with tempfile.TemporaryFile() as tmpfile:
         copy_sql = "COPY ({query}) TO STDOUT WITH CSV {head}".format(query=query, head="HEADER")
         conn = db_engine.raw_connection()
-        cur = conn.cursor()
-        cur.copy_expert(copy_sql, tmpfile)
+        try:
+            cur = conn.cursor()
+            cur.copy_expert(copy_sql, tmpfile)
+        finally:
+            conn.close()
         tmpfile.seek(0)
         df = pd.read_csv(tmpfile, low_memory=False)
         return df
\ No newline at end of file
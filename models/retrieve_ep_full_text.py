@@ -0,0 +1,73 @@
+import os
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+import Parameters as param
+
+
+def retrieve_ep_full_text(publication_numbers, files = None, text_types = None, languages = None, nb_processes = None):
+
+    """
+    Retrieving the rows of the EP full-text database of some publication numbers, without an index
+    (see EPFullTextIndex otherwise)
+    # 1. Only the bucket files of the publication numbers are scanned (EP<first two digits>*.txt)
+    # 2. The files are scanned in parallel by a pool of processes
+    # 3. Each file is streamed line by line: the publication number is checked against a hash set before
+    the rest of the line is split, and the text types / languages are filtered (e.g. ['CLAIM'], ['en', 'de', 'fr'])
+    Only the matching rows are kept, so that the memory used does not depend on the size of the buckets.
+
+    Returns a DataFrame with the columns of Parameters.EP_FULL_TEXT_COLUMNS (as EPFullTextIndex.read)
+    """
+
+    numbers = pd.to_numeric(pd.Series(list(publication_numbers), dtype = object), errors = 'coerce').dropna()
+    numbers = frozenset(numbers.astype('int64').tolist())
+    files = sorted(glob.glob(param.EP_FULL_TEXT_FILES)) if files is None else list(files)
+
+    # (1)
+    buckets = {str(number).zfill(7)[:2] for number in numbers}
+    files = [f for f in files if os.path.basename(f)[2:4] in buckets]
+    text_types = frozenset(text_types) if text_types is not None else None
+    languages = frozenset(languages) if languages is not None else None
+
+    # (2)
+    tasks = [(f, numbers, text_types, languages) for f in files]
+    if nb_processes == 1 or len(files) <= 1:
+        results = [_filter_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers = nb_processes) as executor:
+            results = list(executor.map(_filter_file, tasks))
+
+    rows = [row for result in results for row in result]
+    df = pd.DataFrame(rows, columns = param.EP_FULL_TEXT_COLUMNS)
+    df['publication_number'] = df['publication_number'].astype('int64')
+    return df
+
+
+def _filter_file(task):
+
+    """
+    (3) Rows of a file matching the publication numbers, text types and languages
+    """
+
+    path, numbers, text_types, languages = task
+    sep = param.EP_FULL_TEXT_SEP
+    nb_columns = len(param.EP_FULL_TEXT_COLUMNS)
+
+    rows = []
+    print('Retrieving data from ', path)
+    with open(path, encoding = 'utf-8') as f:
+        for line in f:
+            # Only the publication number is split out of the line first
+            head = line.split(sep, 2)
+            if len(head) < 3 or head[0] != 'EP' or not head[1].isdigit() or int(head[1]) not in numbers:
+                continue
+            row = line.rstrip('\r\n').split(sep, nb_columns - 1)
+            if len(row) != nb_columns:
+                continue
+            if text_types is not None and row[5] not in text_types:
+                continue
+            if languages is not None and row[4] not in languages:
+                continue
+            rows.append(row)
+    return rows
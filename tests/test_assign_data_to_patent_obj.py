@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for the assignment of the PATSTAT data to the patents of the `models` package."""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from benchmark_assign_data_to_patent_obj import make_tables, make_model
+
+
+class TestAssignDataToPatentObj(unittest.TestCase):
+    """Tests for `Model._assign_data_to_patent_obj`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.df_all, self.df_fwd = make_tables(300)
+
+    def assign(self, single_pass_assignment, patent_ids = None):
+        model = make_model(self.df_all, self.df_fwd, single_pass_assignment)
+        if patent_ids is not None:
+            model.patent_ids = patent_ids
+            model._create_patent_objects()
+        model._assign_data_to_patent_obj()
+        return model
+
+    def test_000_single_pass_same_as_per_patent(self):
+        """Same attributes (scalars, lists, forward citations) with both implementations"""
+        reference = self.assign(single_pass_assignment = False)
+        model = self.assign(single_pass_assignment = True)
+        self.assertEqual(len(model.patent_list), 300)
+        for a, b in zip(reference.patent_list, model.patent_list):
+            self.assertEqual(dict(a.patent_attributes), dict(b.patent_attributes))
+        self.assertIsInstance(model.patent_list[0].patent_attributes[param.NEW_VAR_CITING_DOCDB_FAM_IDS], list)
+
+    def test_001_patents_without_data(self):
+        """A patent absent from the tables gets no value ([] as with the per-patent filtering)"""
+        patent_ids = self.df_all[param.VAR_APPLN_ID].unique().tolist()[:20] + [999999]
+        model = self.assign(single_pass_assignment = True, patent_ids = patent_ids)
+        attributes = model.patent_list[-1].patent_attributes
+        self.assertEqual(attributes[param.VAR_APPLN_ID], 999999)
+        for name in [param.VAR_DOCDC_FAMILY_ID, 'cpc_class_symbol', param.NEW_VAR_CITING_DOCDB_FAM_IDS]:
+            self.assertEqual(attributes[name], [])
+        reference = self.assign(single_pass_assignment = False, patent_ids = patent_ids[:-1])
+        for a, b in zip(reference.patent_list, model.patent_list):
+            self.assertEqual(dict(a.patent_attributes), dict(b.patent_attributes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""Tests for the selection of the breakthrough patents of the `models` package."""
+
+
+import os
+import sys
+import sqlite3
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from CustomEngineForPatstat import CustomEngineForPATSTAT
+from Model import Model
+
+
+def read_sql(query, connection):
+    """Result of a query with the column names in lower case (as returned by PostgreSQL)"""
+    df = pd.read_sql(query, connection)
+    df.columns = df.columns.str.lower()
+    return df
+
+
+def make_database(nb_patents = 400, seed = 0):
+    """In-memory SQL database with the columns of tls201_appln and tls224_appln_cpc used by step 1
+    (families of several patents, ties on the number of citations, patents with several matching CPC codes)"""
+    random = np.random.RandomState(seed)
+    appln_ids = random.permutation(np.arange(1, nb_patents + 1) * 10)
+    years = random.randint(2000, 2006, nb_patents)
+    years[:100] = 2010 # 100 families in 2010: 7% of 100 patents = 7.000000000000001 -> 8 patents
+    tls201 = pd.DataFrame({'appln_id': appln_ids,
+                           'docdb_family_id': random.randint(0, nb_patents // 2, nb_patents) + 10**6,
+                           'earliest_filing_date': ['{}-{:02d}-{:02d}'.format(year, month, day) for year, month, day
+                                                    in zip(years, random.randint(1, 13, nb_patents),
+                                                           random.randint(1, 29, nb_patents))],
+                           'earliest_filing_year': years.astype(float),
+                           'nb_citing_docdb_fam': random.randint(0, 6, nb_patents).astype(float),
+                           'appln_filing_year': years})
+    tls201.loc[:99, 'docdb_family_id'] = np.arange(100) + 2 * 10**6
+    missing_years = np.concatenate([np.zeros(100, dtype = bool), random.rand(nb_patents - 100) < 0.05])
+    tls201.loc[missing_years, 'earliest_filing_year'] = np.nan
+    tls201.loc[random.rand(nb_patents) < 0.05, 'nb_citing_docdb_fam'] = np.nan
+    cpc = np.array(['Y02E  10/72', 'Y02E  10/74', 'F03D   1/06'])
+    tls224 = pd.DataFrame({'appln_id': np.concatenate([np.repeat(appln_ids, 2), appln_ids[:100]]),
+                           'cpc_class_symbol': np.concatenate([cpc[random.randint(0, 3, 2 * nb_patents)],
+                                                               cpc[:1].repeat(100)])}).drop_duplicates()
+
+    connection = sqlite3.connect(':memory:')
+    tls201.to_sql('tls201_appln', connection, index = False)
+    tls224.to_sql('tls224_appln_cpc', connection, index = False)
+    return connection
+
+
+class TestBreakthroughSelection(unittest.TestCase):
+    """Tests for `Parameters.sql_query_BREAKTHROUGH_PATENTS` and `Model._select_breakthrough_patents`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.connection = make_database()
+        self.primary_info = param.sql_query_PATENT_PRIMARY_INFO.format('Y02E', 2000, 2010)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.connection.close()
+
+    def select_in_python(self, percentage_top_patents):
+        model = Model(CustomEngineForPATSTAT(None), ['Y02E'], 2000, 2010, percentage_top_patents)
+        model.TABLE_PRIMARY_INFO = read_sql(self.primary_info, self.connection)
+        model._select_breakthrough_patents()
+        return model.patent_ids
+
+    def select_in_sql(self, percentage_top_patents):
+        query = param.sql_query_BREAKTHROUGH_PATENTS.format(self.primary_info, float(percentage_top_patents))
+        return read_sql(query, self.connection)
+
+    def test_000_same_selection(self):
+        """Same breakthrough patents selected by the database and by the Model"""
+        for percentage_top_patents in [0.07, 0.1, 0.25, 1]:
+            selected = self.select_in_sql(percentage_top_patents)
+            self.assertEqual(sorted(selected[param.VAR_APPLN_ID].tolist()),
+                             sorted(self.select_in_python(percentage_top_patents)))
+            self.assertFalse(selected[param.VAR_DOCDC_FAMILY_ID].duplicated().any())
+
+    def test_001_rounding_up(self):
+        """The number of patents of a year is rounded up as math.ceil (7% of 100 patents -> 8 patents)"""
+        selected = self.select_in_sql(0.07)
+        primary_info = read_sql(self.primary_info, self.connection)
+        families = primary_info[primary_info[param.VAR_EARLIEST_FILING_YEAR] == 2010][param.VAR_DOCDC_FAMILY_ID]
+        self.assertEqual(families.nunique(), 100)
+        self.assertEqual((selected[param.VAR_EARLIEST_FILING_YEAR] == 2010).sum(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
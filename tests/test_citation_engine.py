@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""Tests for the CitationEngine of the `models` package."""
+
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from CitationEngine import CitationEngine
+
+
+def make_citations(nb_selected = 30, nb_others = 20, nb_citations = 250, seed = 0):
+    """Random family citations: the selected families are 1000...1000+nb_selected-1, the others follow"""
+    random = np.random.RandomState(seed)
+    families = np.arange(1000, 1000 + nb_selected + nb_others)
+    citing = random.choice(families, nb_citations)
+    cited = random.choice(families, nb_citations)
+    keep = citing != cited
+    citations = pd.DataFrame({'citing': citing[keep], 'cited': cited[keep]}).drop_duplicates()
+    return families[:nb_selected].tolist(), citations
+
+
+def make_tables(selected, citations):
+    """TABLE_ALL_PATENTS_INFO (backward citations of the selected families) and TABLE_FORWARD_CITES
+    (selected family, citing family, cited family)"""
+    backward = citations[citations['citing'].isin(selected)]
+    table_all = pd.DataFrame({param.VAR_DOCDC_FAMILY_ID: backward['citing'].values,
+                              param.VAR_CITED_DOCDB_FAM_ID: backward['cited'].values})
+    forward = citations[citations['cited'].isin(selected)]
+    table_fwd = pd.DataFrame({'a': forward['cited'].values, 'b': forward['citing'].values,
+                              'c': forward['cited'].values})
+    return table_all, table_fwd
+
+
+def fitted_engine(selected, citations):
+    engine = CitationEngine(selected)
+    engine.fit(*make_tables(selected, citations))
+    return engine
+
+
+def pairs(edges, directed = True):
+    """Set of the links of an edge array (counts ignored)"""
+    if directed:
+        return {(int(s), int(t)) for s, t, _ in np.asarray(edges).tolist()}
+    return {frozenset((int(s), int(t))) for s, t, _ in np.asarray(edges).tolist()}
+
+
+class BaselineLoops:
+    """Links computed as in the original loops of Model (one patent by family)"""
+
+    def __init__(self, selected, citations):
+        self.selected = selected
+        self.position = {family: i for i, family in enumerate(selected)}
+        self.cited = {family: set(citations.loc[citations['citing'] == family, 'cited']) for family in selected}
+        self.citing = {family: set(citations.loc[citations['cited'] == family, 'citing']) for family in selected}
+
+    def direct_citations(self):
+        return {(self.position[x], self.position[y]) for x in self.selected for y in self.selected
+                if y in self.cited[x]}
+
+    def cc(self):
+        links = set()
+        for x in self.selected:
+            cited = sorted(f for f in self.cited[x] if f in self.position)
+            links |= {frozenset((self.position[a], self.position[b])) for i, a in enumerate(cited) for b in cited[i+1:]}
+        return links
+
+    def bc(self):
+        return {frozenset((self.position[x], self.position[y])) for i, x in enumerate(self.selected)
+                for y in self.selected[i+1:] if self.citing[x] & self.citing[y]}
+
+    def lc(self):
+        return {(self.position[a], self.position[b]) for a in self.selected for c in self.cited[a] if c in self.position
+                for b in self.cited[c] if b in self.position}
+
+
+class TestCitationEngine(unittest.TestCase):
+    """Tests for `CitationEngine`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.selected, self.citations = make_citations()
+        self.engine = fitted_engine(self.selected, self.citations)
+        self.baseline = BaselineLoops(self.selected, self.citations)
+
+    def test_000_direct_citations_match_baseline(self):
+        """Direct citations as in the original loops"""
+        self.assertEqual(pairs(self.engine.compute_direct_citations()), self.baseline.direct_citations())
+
+    def test_001_cc_matches_baseline(self):
+        """Co-citations as in the original loops"""
+        self.assertEqual(pairs(self.engine.compute_cc(), directed = False), self.baseline.cc())
+
+    def test_002_bc_matches_baseline(self):
+        """Bibliographic coupling as in the original loops"""
+        self.assertEqual(pairs(self.engine.compute_bc(), directed = False), self.baseline.bc())
+
+    def test_003_lc_matches_baseline(self):
+        """Longitudinal coupling as in the original loops"""
+        self.assertEqual(pairs(self.engine.compute_lc()), self.baseline.lc())
+
+    def test_004_direct_citation_categories(self):
+        """Origin and category of the direct citations only, deduplicated"""
+        categories = pd.DataFrame({param.VAR_DOCDC_FAMILY_ID: self.citations['citing'].values,
+                                   param.VAR_CITN_CITED_DOCDB_FAM_ID: self.citations['cited'].values,
+                                   param.VAR_CITN_ORIGIN: 'SEA',
+                                   param.VAR_CITN_CATEG: np.where(self.citations['citing'].values % 2, 'X', 'A')})
+        categories = pd.concat([categories, categories.head(10)], ignore_index = True)
+        categories.loc[len(categories)] = [np.nan, self.selected[0], 'APP', 'D']
+        links = self.engine.compute_direct_citation_categories(categories)
+        self.assertEqual({(s, t) for s, t in links[['source', 'target']].values.tolist()},
+                         self.baseline.direct_citations())
+        self.assertFalse(links.duplicated().any())
+        self.assertEqual(set(links[param.VAR_CITN_ORIGIN]), {'SEA'})
+        categ = {x: 'X' if x % 2 else 'A' for x in self.selected}
+        self.assertEqual(links[param.VAR_CITN_CATEG].tolist(),
+                         [categ[self.selected[s]] for s in links['source']])
+
+    def test_005_bc_strength(self):
+        """Shared citing families, Jaccard and Salton strengths"""
+        strength = self.engine.compute_bc_strength()
+        np.testing.assert_array_equal(strength[['source', 'target', 'shared']].values, self.engine.compute_bc())
+        for row in strength.itertuples():
+            a = self.baseline.citing[self.selected[row.source]]
+            b = self.baseline.citing[self.selected[row.target]]
+            self.assertEqual(row.shared, len(a & b))
+            self.assertAlmostEqual(row.jaccard, len(a & b) / len(a | b))
+            self.assertAlmostEqual(row.salton, len(a & b) / np.sqrt(len(a) * len(b)))
+
+    def test_006_cc_out_of_core_matches_in_memory(self):
+        """Out-of-core co-citations (several runs, heavy rows split) equal to compute_cc"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.engine.compute_cc_out_of_core(os.path.join(directory, 'CC.edges'), chunk_size = 3,
+                                                      max_pairs_in_memory = 16, tmp_dir = directory)
+            np.testing.assert_array_equal(np.asarray(CitationEngine.read_edge_file(path)), self.engine.compute_cc())
+
+    def test_007_lc_parallel_matches_in_memory(self):
+        """LC computed by a pool of processes equal to compute_lc"""
+        expected = fitted_engine(self.selected, self.citations).compute_lc()
+        np.testing.assert_array_equal(self.engine.compute_lc_parallel(nb_processes = 2, nb_partitions = 5), expected)
+
+    def test_008_update_matches_full_recompute(self):
+        """Couplings updated with new patents and citations equal to a new fit"""
+        old_selected, new_selected = self.selected[:20], self.selected[20:]
+        old_citations = self.citations.iloc[:len(self.citations) // 2]
+        engine = fitted_engine(old_selected, old_citations)
+        engine.compute_cc()
+        engine.compute_bc()
+        engine.compute_lc()
+        engine.update(*make_tables(self.selected, self.citations), new_patent_families = new_selected)
+
+        np.testing.assert_array_equal(engine.compute_direct_citations(), self.engine.compute_direct_citations())
+        np.testing.assert_array_equal(engine.compute_cc(), self.engine.compute_cc())
+        np.testing.assert_array_equal(engine.compute_bc(), self.engine.compute_bc())
+        np.testing.assert_array_equal(engine.compute_lc(), self.engine.compute_lc())
+
+    def test_009_update_out_of_core_and_parallel(self):
+        """The edge file of the out-of-core CC and the parallel LC are maintained by update"""
+        old_selected, new_selected = self.selected[:20], self.selected[20:]
+        engine = fitted_engine(old_selected, self.citations.iloc[:len(self.citations) // 2])
+        with tempfile.TemporaryDirectory() as directory:
+            path = engine.compute_cc_out_of_core(os.path.join(directory, 'CC.edges'), chunk_size = 3,
+                                                 max_pairs_in_memory = 16, tmp_dir = directory)
+            engine.compute_lc_parallel(nb_processes = 2)
+            engine.update(*make_tables(self.selected, self.citations), new_patent_families = new_selected)
+            np.testing.assert_array_equal(np.asarray(CitationEngine.read_edge_file(path)), self.engine.compute_cc())
+        np.testing.assert_array_equal(engine.compute_lc(), self.engine.compute_lc())
+
+    def test_010_snapshot_restricts_the_couplings(self):
+        """Snapshot: links of the full network between the patents filed until the year"""
+        years = np.arange(len(self.selected)) % 5 + 2000
+        self.engine.set_patent_years(years)
+        snapshot = self.engine.snapshot(2002)
+        kept = set(np.flatnonzero(years <= 2002).tolist())
+        for name, links in [('direct citations', self.engine.compute_direct_citations()),
+                            ('CC', self.engine.compute_cc()), ('BC', self.engine.compute_bc()),
+                            ('LC', self.engine.compute_lc())]:
+            expected = np.array([link for link in links.tolist() if link[0] in kept and link[1] in kept],
+                                dtype = 'int64').reshape(-1, 3)
+            np.testing.assert_array_equal(snapshot[name], expected)
+
+    def test_011_save_and_load(self):
+        """An engine saved and loaded gives the same links"""
+        self.engine.compute_cc()
+        with tempfile.TemporaryDirectory() as directory:
+            self.engine.save(os.path.join(directory, 'engine.npz'))
+            engine = CitationEngine.load(os.path.join(directory, 'engine.npz'))
+        np.testing.assert_array_equal(engine.compute_direct_citations(), self.engine.compute_direct_citations())
+        np.testing.assert_array_equal(engine.compute_cc(), self.engine.compute_cc())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""Tests for the couplings counted by the database of the `models` package."""
+
+
+import os
+import sys
+import sqlite3
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Parameters as param
+from CustomEngineForPatstat import CustomEngineForPATSTAT
+from Model import Model
+from PatentStore import PatentStore
+from test_breakthrough_selection import make_database, read_sql
+from test_citation_engine import make_citations, fitted_engine
+
+
+class SQLiteEngine(CustomEngineForPATSTAT):
+    """Engine running the queries on an SQLite database (the temporary tables are plain tables)"""
+
+    def __init__(self, connection, **kwargs):
+        super().__init__(None, **kwargs)
+        self.connection = connection
+
+    def read_sql_cached(self, query, temporary_tables = None, run_id = None):
+        temporary_tables = temporary_tables or {}
+        for name, (df, key_column) in temporary_tables.items():
+            df[[key_column]].to_sql(name, self.connection, index = False, if_exists = 'replace')
+        return read_sql(query.format(**{name: name for name in temporary_tables}), self.connection)
+
+    def _primary_info_query(self, technology_classes_list, start_date, end_date):
+        # SQLite does not accept the parenthesized queries of the UNION ALL (the tests use a single class)
+        return param.sql_query_PATENT_PRIMARY_INFO.format(technology_classes_list[0], start_date, end_date)
+
+
+def make_citation_database(citations):
+    """SQL database with the family citations in TLS228_DOCDB_FAM_CITN"""
+    connection = sqlite3.connect(':memory:', check_same_thread = False)
+    pd.DataFrame({'docdb_family_id': citations['citing'].values,
+                  'cited_docdb_family_id': citations['cited'].values}).to_sql('TLS228_DOCDB_FAM_CITN', connection,
+                                                                               index = False)
+    return connection
+
+
+def make_model(engine, selected, citations, coupling_scope):
+    """Model with one patent by selected family and its citation engine already fitted"""
+    model = Model(engine, ['Y02E'], 2000, 2010, 0.1, coupling_scope = coupling_scope)
+    model.patent_store = PatentStore(np.arange(len(selected)) + 1)
+    model.patent_store.load_table(pd.DataFrame({param.VAR_APPLN_ID: np.arange(len(selected)) + 1,
+                                                param.VAR_DOCDC_FAMILY_ID: selected}))
+    model.citation_engine = fitted_engine(selected, citations)
+    return model
+
+
+class TestCouplingCounts(unittest.TestCase):
+    """Tests for `Parameters.sql_queries_COUPLING_COUNTS` and the coupling_scope of `Model`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.selected, self.citations = make_citations()
+        self.connection = make_citation_database(self.citations)
+        self.engine = SQLiteEngine(self.connection, coupling_in_sql = True)
+        self.citation_engine = fitted_engine(self.selected, self.citations)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.connection.close()
+
+    def test_000_same_links_as_the_citation_engine(self):
+        """CC, BC and BC strengths from the SQL counts equal to the ones of the citation matrix"""
+        counts = self.engine._Run_Engine_couplings(self.selected)
+        self.assertEqual(set(counts), {'CC', 'BC', 'NB_CITING'})
+        np.testing.assert_array_equal(self.citation_engine.links_from_family_counts(counts['CC']),
+                                      self.citation_engine.compute_cc())
+        pd.testing.assert_frame_equal(
+            self.citation_engine.bc_strength_from_family_counts(counts['BC'], counts['NB_CITING']),
+            self.citation_engine.compute_bc_strength(), check_dtype = False)
+
+    def test_001_breakthrough_scope(self):
+        """Default scope: the counts of the families of the model"""
+        model = make_model(self.engine, self.selected, self.citations, 'breakthrough')
+        model._compute_indirect_patent_citations()
+        np.testing.assert_array_equal(model.CC, self.citation_engine.compute_cc())
+        np.testing.assert_array_equal(model.BC, self.citation_engine.compute_bc())
+        self.assertTrue(set(model.family_couplings['CC']['family_a']) <= set(self.selected))
+
+    def test_002_technology_classes_scope(self):
+        """Counts of all the families of the technology classes kept, CC counted over all these families"""
+        landscape = self.selected + list(range(1000 + len(self.selected), 1050))
+        model = make_model(self.engine, self.selected, self.citations, 'technology_classes')
+        model.landscape_family_ids = landscape
+        model._compute_indirect_patent_citations()
+
+        # Families cited by each family of the technology classes
+        cited = {family: set(self.citations.loc[self.citations['citing'] == family, 'cited']) for family in landscape}
+        expected = {}
+        for a in range(len(self.selected)):
+            for b in range(a + 1, len(self.selected)):
+                nb = sum(self.selected[a] in c and self.selected[b] in c for c in cited.values())
+                if nb:
+                    expected[(a, b)] = nb
+        self.assertEqual({(s, t): n for s, t, n in model.CC.tolist()}, expected)
+        self.assertNotEqual(len(model.CC), len(self.citation_engine.compute_cc()))
+        np.testing.assert_array_equal(model.BC, self.citation_engine.compute_bc())
+        pairs = model.family_couplings['CC'][['family_a', 'family_b']].values
+        self.assertTrue((~np.isin(pairs, self.selected)).any())
+
+    def test_003_families_of_the_technology_classes(self):
+        """Families of all the patents of step 1, whether the selection is done by the database or not"""
+        connection = make_database()
+        primary_info = read_sql(param.sql_query_PATENT_PRIMARY_INFO.format('Y02E', 2000, 2010), connection)
+        expected = sorted(primary_info[param.VAR_DOCDC_FAMILY_ID].unique().tolist())
+        for breakthrough_selection_in_sql in [False, True]:
+            engine = SQLiteEngine(connection, breakthrough_selection_in_sql = breakthrough_selection_in_sql)
+            model = Model(engine, ['Y02E'], 2000, 2010, 0.1, coupling_scope = 'technology_classes')
+            model._get_PASTAT_primary_data()
+            model._select_breakthrough_patents()
+            self.assertEqual(sorted(model.landscape_family_ids), expected)
+            self.assertLess(len(model.patent_ids), len(expected))
+        connection.close()
+        with self.assertRaises(ValueError):
+            Model(self.engine, ['Y02E'], 2000, 2010, 0.1, coupling_scope = 'all')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Tests for the retrieval of the EP full-text data in the `models` package."""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from EPFullTextIndex import EPFullTextIndex
+from retrieve_ep_full_text import retrieve_ep_full_text
+from EPFullTextStore import EPFullTextStore
+
+
+# Synthetic bucket files: bucket -> rows (publication number, kind, date, language, text type, text)
+# As in the EP full-text database, the files have no header: the first line is already a row
+ROWS = {'01': [('0100001', 'B1', '2010-01-06', 'en', 'CLAIM', '<claim id="c-en-0001"><claim-text>A blade.</claim-text></claim>'),
+               ('0100001', 'B1', '2010-01-06', 'de', 'CLAIM', '<claim id="c-de-0001"><claim-text>Ein Blatt.</claim-text></claim>'),
+               ('0100001', 'B1', '2010-01-06', 'en', 'DESCR', '<p id="p0001">A "wind" turbine.</p>'),
+               ('0100002', 'A1', '2011-03-02', 'fr', 'CLAIM', '<claim id="c-fr-0001"><claim-text>Une pale.</claim-text></claim>'),
+               ('0100003', 'B1', '2011-05-04', 'en', 'TITLE', 'Rotor')],
+        '02': [('0200005', 'B1', '2012-02-01', 'en', 'CLAIM', '<claim id="c-en-0001"><claim-text>A tower.</claim-text></claim>'),
+               ('0200001', 'B1', '2012-07-11', 'en', 'CLAIM', '<claim id="c-en-0001"><claim-text>A hub &amp; a nacelle.</claim-text></claim>')]}
+
+
+def expected_rows(numbers, text_types = None, languages = None):
+    """Rows of the synthetic files (columns of Parameters.EP_FULL_TEXT_COLUMNS)"""
+    rows = [('EP',) + row for bucket in ROWS.values() for row in bucket
+            if int(row[0]) in numbers
+            and (text_types is None or row[4] in text_types)
+            and (languages is None or row[3] in languages)]
+    df = pd.DataFrame(rows, columns = param.EP_FULL_TEXT_COLUMNS)
+    df['publication_number'] = df['publication_number'].astype('int64')
+    return sorted_rows(df)
+
+
+def sorted_rows(df):
+    df = df[param.EP_FULL_TEXT_COLUMNS].astype({col: str for col in param.EP_FULL_TEXT_COLUMNS if col != 'publication_number'})
+    return df.sort_values(param.EP_FULL_TEXT_COLUMNS).reset_index(drop = True)
+
+
+class TestEPFullText(unittest.TestCase):
+    """Tests for `EPFullTextIndex`, `retrieve_ep_full_text` and `EPFullTextStore`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.mkdtemp()
+        self.files = []
+        for bucket, rows in ROWS.items():
+            path = os.path.join(self.directory, 'EP{}.txt'.format(bucket))
+            with open(path, 'w', encoding = 'utf-8') as f:
+                for row in rows:
+                    f.write(param.EP_FULL_TEXT_SEP.join(('EP',) + row) + '\n')
+            self.files.append(path)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.directory)
+
+    def test_000_index_read(self):
+        """Rows read at their offsets in the files"""
+        index = EPFullTextIndex.build(os.path.join(self.directory, 'index'), files = self.files)
+        index = EPFullTextIndex.load(os.path.join(self.directory, 'index'))
+        self.assertEqual(len(index), sum(len(rows) for rows in ROWS.values()))
+        pd.testing.assert_frame_equal(sorted_rows(index.read(['0100001', '0200001', '0300000'])),
+                                      expected_rows({100001, 200001}))
+        pd.testing.assert_frame_equal(sorted_rows(index.read([100001, 100002], text_types = ['CLAIM'],
+                                                             languages = ['en', 'fr'])),
+                                      expected_rows({100001, 100002}, ['CLAIM'], ['en', 'fr']))
+
+    def test_001_retrieve_ep_full_text(self):
+        """Streaming filter over the buckets, in one process and in a pool"""
+        for nb_processes in [1, 2]:
+            df = retrieve_ep_full_text(['0100001', '0200005', 'EP123'], files = self.files, nb_processes = nb_processes)
+            pd.testing.assert_frame_equal(sorted_rows(df), expected_rows({100001, 200005}))
+        df = retrieve_ep_full_text([100001, 100002, 200001], files = self.files, text_types = ['CLAIM'],
+                                   languages = ['en'])
+        pd.testing.assert_frame_equal(sorted_rows(df), expected_rows({100001, 100002, 200001}, ['CLAIM'], ['en']))
+
+    def test_002_store_read(self):
+        """Rows read from the Parquet store with the filters pushed down"""
+        store = EPFullTextStore.convert(os.path.join(self.directory, 'store'), files = self.files, row_group_size = 2)
+        self.assertIn(('CLAIM', 'en'), store.partitions())
+        pd.testing.assert_frame_equal(sorted_rows(store.read(['0100001', '0200001'])),
+                                      expected_rows({100001, 200001}))
+        pd.testing.assert_frame_equal(sorted_rows(store.read([100001, 100002, 200005], text_types = ['CLAIM'],
+                                                             languages = ['en', 'fr'])),
+                                      expected_rows({100001, 100002, 200005}, ['CLAIM'], ['en', 'fr']))
+        self.assertEqual(len(store.read([300000])), 0)
+        self.assertEqual(list(store.read([200005], columns = ['publication_number', 'text'])),
+                         ['publication_number', 'text'])
+
+    def test_003_store_incomplete(self):
+        """A store without completion marker is not opened"""
+        EPFullTextStore.convert(os.path.join(self.directory, 'store'), files = self.files)
+        os.remove(os.path.join(self.directory, 'store', '_SUCCESS'))
+        self.assertFalse(EPFullTextStore.is_complete(os.path.join(self.directory, 'store')))
+        with self.assertRaises(ValueError):
+            EPFullTextStore(os.path.join(self.directory, 'store'))
+
+
+    def test_004_same_rows_for_all_readers(self):
+        """The index, the streaming filter and the store return the same rows, the first line of each file included"""
+        numbers = [100001, 100002, 100003, 200001, 200005]
+        index = EPFullTextIndex.build(os.path.join(self.directory, 'index'), files = self.files)
+        store = EPFullTextStore.convert(os.path.join(self.directory, 'store'), files = self.files)
+        expected = expected_rows(set(numbers))
+        self.assertEqual(len(expected), sum(len(rows) for rows in ROWS.values()))
+        for df in [index.read(numbers), retrieve_ep_full_text(numbers, files = self.files, nb_processes = 1),
+                   store.read(numbers)]:
+            pd.testing.assert_frame_equal(sorted_rows(df), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Tests for the batch claim extraction of the `models` package."""
+
+
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+from extract_claims import extract_claims, get_claims
+
+
+def parsing(text_xml):
+    """parsing() of get_most_frequent_word_full_database.ipynb"""
+    text_xml_modified = text_xml.replace('<b>', '')
+    text_xml_modified = text_xml_modified.replace('</b>', '')
+    text_xml_modified = "<data>" + text_xml_modified + '</data>'
+    root = ET.fromstring(text_xml_modified)
+    claims = root.findall("./claim/claim-text")
+    return [claim.text for claim in claims]
+
+
+DOCUMENTS = ['<claim id="c-en-0001" num="0001"><claim-text>A <b>wind</b> turbine comprising:'
+             '<claim-text>a blade;</claim-text><claim-text>a hub.</claim-text></claim-text></claim>'
+             '<claim id="c-en-0002" num="0002"><claim-text>The turbine of claim 1, wherein x &lt; 2 &amp; y.</claim-text></claim>',
+             '<claim id="c-en-0001" num="0001"><claim-text>Une pale éolienne.</claim-text>'
+             '<claim-text>Second text of the claim.</claim-text></claim>',
+             '<claim id="c-en-0001" num="0001"><claim-text><b>Bold</b> only</claim-text></claim>',
+             '<claim id="c-en-0001" num="0001"><claim-text><sub>2</sub>O</claim-text></claim>',
+             '']
+
+
+class TestExtractClaims(unittest.TestCase):
+    """Tests for `extract_claims`."""
+
+    def check(self, documents, batch_size):
+        arena, claim_offsets, doc_offsets = extract_claims(documents, batch_size = batch_size)
+        self.assertEqual(len(doc_offsets), len(documents) + 1)
+        for i, document in enumerate(documents):
+            expected = [claim or '' for claim in parsing(document)] if isinstance(document, str) else []
+            self.assertEqual(get_claims(arena, claim_offsets, doc_offsets, i), expected)
+
+    def test_000_same_claims_as_parsing(self):
+        """Same claims as parsing(), in one batch or several"""
+        for batch_size in [1, 2, 1000]:
+            self.check(DOCUMENTS, batch_size)
+
+    def test_001_invalid_documents(self):
+        """A document which is not well-formed gets no claims, the other documents of its batch are parsed"""
+        documents = DOCUMENTS[:2] + ['<claim><claim-text>not closed</claim>', float('nan')] + DOCUMENTS[2:]
+        arena, claim_offsets, doc_offsets = extract_claims(documents, batch_size = 1000)
+        self.assertEqual(get_claims(arena, claim_offsets, doc_offsets, 2), [])
+        self.assertEqual(get_claims(arena, claim_offsets, doc_offsets, 3), [])
+        self.check(documents[:2] + documents[4:], 1000)
+        self.assertEqual(get_claims(arena, claim_offsets, doc_offsets, 1), parsing(DOCUMENTS[1]))
+
+    def test_002_arena(self):
+        """The claims are stored one after the other in the arena"""
+        arena, claim_offsets, doc_offsets = extract_claims(DOCUMENTS)
+        claims = [claim or '' for document in DOCUMENTS for claim in parsing(document)]
+        self.assertEqual(arena, ''.join(claims))
+        self.assertEqual(claim_offsets.tolist()[-1], len(arena))
+        self.assertEqual(doc_offsets.tolist()[-1], len(claims))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""Tests for the interning table of the PATSTAT ids of the `models` package."""
+
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+from IdIndex import IdIndex
+
+
+class TestIdIndex(unittest.TestCase):
+    """Tests for `IdIndex`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.index = IdIndex([30, 10, 30, 20])
+
+    def test_000_intern(self):
+        """The ids are numbered in order of appearance, the known ids keep their index"""
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.intern([10, 40, 50, 40]).tolist(), [1, 3, 4, 3])
+        self.assertEqual(self.index.intern(np.array([20.0, 60.0])).tolist(), [2, 5])
+        self.assertEqual(self.index.ids([0, 1, 2, 3, 4, 5]).tolist(), [30, 10, 20, 40, 50, 60])
+        self.assertEqual(self.index.intern([]).dtype, np.dtype('int32'))
+
+    def test_001_lookup(self):
+        """Nothing added by lookup, -1 for the unknown and the missing ids"""
+        codes = self.index.lookup(pd.Series([20, 99, None, 30], dtype = 'Int64'))
+        self.assertEqual(codes.tolist(), [2, -1, -1, 0])
+        self.assertEqual(codes.dtype, np.dtype('int32'))
+        self.assertEqual(len(self.index), 3)
+        self.assertIn(10, self.index)
+        self.assertNotIn(99, self.index)
+
+    def test_002_missing_ids(self):
+        """Missing ids given to intern are not numbered"""
+        self.assertEqual(self.index.intern([np.nan, 10.0, None, 70]).tolist(), [-1, 1, -1, 3])
+        self.assertEqual(len(self.index), 4)
+
+    def test_003_unknown_indices(self):
+        """Translating an index which has not been given raises an IndexError"""
+        with self.assertRaises(IndexError):
+            self.index.ids([0, 3])
+        with self.assertRaises(IndexError):
+            self.index.ids([-1])
+        self.assertEqual(self.index.ids(np.array([], dtype = 'int32')).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""Tests for the compact types of the PATSTAT tables of the `models` package."""
+
+
+import io
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from normalize_dtypes import normalize_patstat_dtypes
+from read_sql_arrow import read_sql_arrow
+from test_read_sql_arrow import CopyEngine, make_csv
+
+
+class TestNormalizePatstatDtypes(unittest.TestCase):
+    """Tests for `normalize_patstat_dtypes`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.csv = make_csv()
+        self.df = normalize_patstat_dtypes(pd.read_csv(io.StringIO(self.csv)), verbose = False)
+
+    def test_000_types(self):
+        """Nullable integers, categoricals and dates, the other columns unchanged"""
+        self.assertEqual(str(self.df['appln_id'].dtype), 'Int32')
+        self.assertEqual(str(self.df['docdb_family_id.1'].dtype), 'Int32')
+        self.assertIsInstance(self.df['appln_auth'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(self.df['earliest_filing_date'].dtype))
+        self.assertEqual(self.df['weight'].dtype, np.dtype('float64'))
+
+    def test_001_date_sentinel(self):
+        """The unknown dates (9999-12-31) are NaT, whether the dates come as strings or already parsed"""
+        sentinel = (pd.read_csv(io.StringIO(self.csv), dtype = str)['earliest_filing_date'] == '9999-12-31').values
+        self.assertTrue(sentinel.any())
+        self.assertTrue(self.df['earliest_filing_date'][sentinel].isna().all())
+        self.assertFalse(self.df['earliest_filing_date'][~sentinel].isna().any())
+        parsed = pd.DataFrame({'earliest_filing_date': pd.to_datetime(pd.Series(['2001-02-03', '9999-12-31']))})
+        self.assertEqual(normalize_patstat_dtypes(parsed, verbose = False)['earliest_filing_date'].isna().tolist(),
+                         [False, True])
+
+    def test_002_same_values_as_read_sql_arrow(self):
+        """Same values as the typed Arrow reader on the same result"""
+        arrow = read_sql_arrow('SELECT 1', CopyEngine(self.csv), block_size = 4096)
+        self.assertEqual(list(arrow.columns), list(self.df.columns))
+        for col in ['appln_id', 'docdb_family_id', 'docdb_family_id.1']:
+            self.assertEqual(arrow[col].astype('Int64').tolist(), self.df[col].astype('Int64').tolist())
+        self.assertEqual(arrow['appln_auth'].astype(str).tolist(), self.df['appln_auth'].astype(str).tolist())
+        np.testing.assert_array_equal(arrow['weight'].values, self.df['weight'].values)
+        self.assertEqual(arrow['earliest_filing_date'].isna().tolist(), self.df['earliest_filing_date'].isna().tolist())
+        self.assertEqual(arrow['earliest_filing_date'].dt.strftime('%Y-%m-%d').dropna().tolist(),
+                         self.df['earliest_filing_date'].dt.strftime('%Y-%m-%d').dropna().tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
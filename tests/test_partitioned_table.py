@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""Tests for the on-disk partitioned tables of the `models` package."""
+
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from PartitionedTable import PartitionedTable
+from PatentStore import PatentStore
+
+
+def make_batches():
+    """Three batches of a step-2 result (the second one without the column of the titles)"""
+    return [pd.DataFrame({param.VAR_APPLN_ID: [10, 10, 20],
+                          param.VAR_CPC_CLASS_SYMBOL: ['Y02E 10/72', 'F03D 1/06', 'Y02E 10/72'],
+                          'appln_title': ['Wind turbine', 'Wind turbine', 'Blade']}),
+            pd.DataFrame({param.VAR_APPLN_ID: [30, 10],
+                          param.VAR_CPC_CLASS_SYMBOL: ['F03D 1/06', 'Y02E 10/72']}),
+            pd.DataFrame({param.VAR_APPLN_ID: [40],
+                          param.VAR_CPC_CLASS_SYMBOL: ['F03D 1/06'],
+                          'appln_title': ['Rotor']})]
+
+
+class TestPartitionedTable(unittest.TestCase):
+    """Tests for `PartitionedTable`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.table = PartitionedTable(self.directory.name)
+        for batch in make_batches():
+            self.table.append(batch)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.directory.cleanup()
+
+    def test_000_append(self):
+        """One partition by batch, the columns and the rows of all the partitions"""
+        self.assertEqual(len(self.table.paths), 3)
+        self.assertEqual(len(self.table), 6)
+        self.assertEqual(self.table.columns, [param.VAR_APPLN_ID, param.VAR_CPC_CLASS_SYMBOL, 'appln_title'])
+        reopened = PartitionedTable(self.directory.name)
+        self.assertEqual(reopened.columns, self.table.columns)
+        self.assertEqual(len(reopened), 6)
+
+    def test_001_read(self):
+        """Columns missing in a partition filled with NaN, only the columns asked read"""
+        df = self.table.read()
+        self.assertEqual(df[param.VAR_APPLN_ID].tolist(), [10, 10, 20, 30, 10, 40])
+        self.assertEqual(df['appln_title'].isna().tolist(), [False, False, False, True, True, False])
+        partitions = list(self.table.partitions(columns = ['appln_title']))
+        self.assertEqual([list(partition.columns) for partition in partitions], [['appln_title']] * 3)
+        self.assertEqual(len(partitions[1]), 2)
+        empty = PartitionedTable(os.path.join(self.directory.name, 'empty')).read(columns = ['a'])
+        self.assertEqual((list(empty.columns), len(empty)), (['a'], 0))
+
+    def test_002_transform(self):
+        """Each partition replaced by the result of the function"""
+        self.table.transform(lambda df: df.assign(nb = np.arange(len(df))))
+        self.assertIn('nb', self.table.columns)
+        self.assertEqual(self.table.read()['nb'].tolist(), [0, 1, 2, 0, 1, 0])
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith('.tmp')], [])
+
+    def test_003_patent_store(self):
+        """Same store whether the table is loaded partition by partition or at once"""
+        by_partition = PatentStore([10, 20, 30, 40, 50])
+        by_partition.load_table(self.table.partitions())
+        at_once = PatentStore([10, 20, 30, 40, 50])
+        at_once.load_table(self.table.read())
+        for name in [param.VAR_CPC_CLASS_SYMBOL, 'appln_title']:
+            self.assertEqual([by_partition.get(name, row) for row in range(5)],
+                             [at_once.get(name, row) for row in range(5)])
+        self.assertEqual(by_partition.get(param.VAR_CPC_CLASS_SYMBOL, 0), ['Y02E 10/72', 'F03D 1/06'])
+
+
+if __name__ == '__main__':
+    unittest.main()
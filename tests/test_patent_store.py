@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""Tests for the PatentStore and the Patent views of the `models` package."""
+
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+import Parameters as param
+from PatentStore import PatentStore
+from Patent import Patent
+from benchmark_assign_data_to_patent_obj import make_tables, make_model
+
+
+def make_table():
+    """TABLE_ALL_PATENTS_INFO of three patents (the patent 30 has no title, 40 is not in the table)"""
+    return pd.DataFrame({param.VAR_APPLN_ID: [10, 10, 20, 20, 30, 30],
+                         param.VAR_DOCDC_FAMILY_ID: [1, 1, 2, 2, 3, np.nan],
+                         param.VAR_APPLN_FILLING_YEAR: pd.array([2001, 2001, 2002, None, None, None], dtype = 'Int32'),
+                         'appln_title': ['Wind turbine', np.nan, 'Blade', 'Blade', np.nan, np.nan],
+                         param.VAR_CPC_CLASS_SYMBOL: ['Y02E 10/72', 'F03D 1/06', 'Y02E 10/72', np.nan,
+                                                      'F03D 1/06', np.nan]})
+
+
+class TestPatentStore(unittest.TestCase):
+    """Tests for `PatentStore`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.store = PatentStore([10, 20, 30, 40])
+        self.store.load_table(make_table())
+
+    def test_000_scalar_string_column(self):
+        """A column of strings with one value by patent is a categorical scalar column"""
+        self.assertIn('appln_title', self.store.scalar_columns)
+        self.assertIsInstance(self.store.scalar_columns['appln_title'][0], pd.Categorical)
+        self.assertEqual([self.store.get('appln_title', row) for row in range(4)], ['Wind turbine', 'Blade', [], []])
+        self.assertEqual(self.store.column('appln_title', fill_value = None).tolist(), ['Wind turbine', 'Blade', None, None])
+
+    def test_001_string_dtypes(self):
+        """Strings given as object, as the string dtype or as a categorical are stored the same way"""
+        for dtype in [object, 'string', 'str', 'category']:
+            table = make_table()
+            table['appln_title'] = table['appln_title'].astype(dtype)
+            store = PatentStore([10, 20, 30, 40])
+            store.load_table(table)
+            self.assertEqual([store.get('appln_title', row) for row in range(4)], ['Wind turbine', 'Blade', [], []])
+            self.assertEqual(store.get(param.VAR_CPC_CLASS_SYMBOL, 0), ['Y02E 10/72', 'F03D 1/06'])
+
+    def test_002_numbers(self):
+        """Numbers given back as Python objects, nullable integers stored as NumPy integers"""
+        self.assertEqual([self.store.get(param.VAR_DOCDC_FAMILY_ID, row) for row in range(4)], [1.0, 2.0, 3.0, []])
+        self.assertEqual(self.store.scalar_columns[param.VAR_APPLN_FILLING_YEAR][0].dtype, np.dtype('int32'))
+        self.assertEqual(self.store.get(param.VAR_APPLN_FILLING_YEAR, 1), 2002)
+        self.assertEqual(self.store.get(param.VAR_APPLN_FILLING_YEAR, 2), [])
+
+    def test_003_multi_valued_columns(self):
+        """Several values by patent in CSR format, a single value given as a scalar"""
+        offsets, values = self.store.multi_column(param.VAR_CPC_CLASS_SYMBOL)
+        self.assertEqual(offsets.tolist(), [0, 2, 3, 4, 4])
+        self.assertEqual([self.store.get(param.VAR_CPC_CLASS_SYMBOL, row) for row in range(4)],
+                         [['Y02E 10/72', 'F03D 1/06'], 'Y02E 10/72', 'F03D 1/06', []])
+        self.store.load_multi_valued('citing', keys = [1, 1, 3, 5, 1], values = [7, 8, 9, 9, 7])
+        self.assertEqual([self.store.get('citing', row) for row in range(4)], [[7, 8], [], [9], []])
+
+    def test_004_set_and_views(self):
+        """Attributes set through the Patent views"""
+        patents = self.store.patents()
+        self.assertEqual(patents[1].patent_attributes['appln_title'], 'Blade')
+        patents[1].patent_attributes['appln_title'] = 'Rotor blade'
+        patents[3].patent_text = 'text'
+        self.assertEqual(self.store.get('appln_title', 1), 'Rotor blade')
+        self.assertEqual(patents[3].patent_text, 'text')
+        self.assertEqual(patents[0].patent_text, '')
+        self.assertEqual(Patent(50).patent_attributes[param.VAR_APPLN_ID], 50)
+        self.assertEqual(self.store.rows([30, 99]).tolist(), [2, -1])
+
+    def test_005_model_with_scalar_strings(self):
+        """Single-pass assignment of a table with a scalar string column (same attributes as per patent)"""
+        df_all, df_fwd = make_tables(100)
+        df_all['appln_title'] = 'Title ' + df_all[param.VAR_APPLN_ID].astype(str)
+        model = make_model(df_all, df_fwd, single_pass_assignment = True)
+        model._assign_data_to_patent_obj()
+        reference = make_model(df_all, df_fwd, single_pass_assignment = False)
+        reference._assign_data_to_patent_obj()
+        self.assertIn('appln_title', model.patent_store.scalar_columns)
+        for a, b in zip(reference.patent_list, model.patent_list):
+            self.assertEqual(dict(a.patent_attributes), dict(b.patent_attributes))
+
+    def test_006_over_time(self):
+        """Measures over time written through the Patent views are kept in the store"""
+        patents = self.store.patents()
+        self.store.set_over_time('centrality', 0, [0.1, 0.2, 0.3, 0.4])
+        patents[1].centrality_over_time[0] = 0.5
+        patents[1].centrality_over_time[1] = 0.6
+        patents[2].community_over_time[1] = 'community 7'
+        self.assertEqual(dict(patents[1].centrality_over_time), {0: 0.5, 1: 0.6})
+        self.assertEqual(dict(patents[0].centrality_over_time), {0: 0.1})
+        self.assertEqual(dict(patents[2].community_over_time), {1: 'community 7'})
+        self.assertEqual(dict(patents[0].community_over_time), {})
+        patents[0].centrality_over_time[0] = 'n/a'
+        self.assertEqual(patents[0].centrality_over_time[0], 'n/a')
+        self.assertEqual(patents[3].centrality_over_time[0], 0.4)
+        del patents[3].centrality_over_time[0]
+        self.assertNotIn(0, patents[3].centrality_over_time)
+        patents[1].betweeness_over_time = {2: 1.5}
+        patents[1].centrality_over_time = {2: 0.7}
+        self.assertEqual(dict(patents[1].betweeness_over_time), {2: 1.5})
+        self.assertEqual(dict(patents[1].centrality_over_time), {2: 0.7})
+        with self.assertRaises(KeyError):
+            patents[2].centrality_over_time[2]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""Tests for the local cache of the PATSTAT query results of the `models` package."""
+
+
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+from QueryCache import QueryCache
+
+
+QUERY = 'SELECT appln_id, appln_title FROM {patent_ids} JOIN tls202_appln_title USING (appln_id)'
+
+
+def make_result(nb_rows = 100):
+    return pd.DataFrame({'appln_id': range(nb_rows), 'appln_title': ['Wind turbine'] * nb_rows})
+
+
+class TestQueryCache(unittest.TestCase):
+    """Tests for `QueryCache`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = QueryCache(self.directory.name, patstat_edition = '2021_autumn')
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.directory.cleanup()
+
+    def test_000_key(self):
+        """The key depends on the edition, the query and the content of the temporary tables, not on the order of the ids"""
+        tables = {'patent_ids': (pd.DataFrame({'appln_id': [3, 1, 2]}), 'appln_id')}
+        key = self.cache.key(QUERY, tables)
+        same_ids = {'patent_ids': (pd.DataFrame({'appln_id': [1, 2, 3, 2, None]}), 'appln_id')}
+        self.assertEqual(self.cache.key(QUERY, same_ids), key)
+        other_ids = {'patent_ids': (pd.DataFrame({'appln_id': [1, 2, 4]}), 'appln_id')}
+        self.assertNotEqual(self.cache.key(QUERY, other_ids), key)
+        other_table = {'family_ids': (pd.DataFrame({'appln_id': [1, 2, 3]}), 'appln_id')}
+        self.assertNotEqual(self.cache.key(QUERY, other_table), key)
+        self.assertNotEqual(self.cache.key(QUERY + ' WHERE appln_id > 1', tables), key)
+        other_edition = QueryCache(self.directory.name, patstat_edition = '2022_spring')
+        self.assertNotEqual(other_edition.key(QUERY, tables), key)
+
+    def test_001_get_and_put(self):
+        """A result stored is given back, a missing one is None"""
+        key = self.cache.key(QUERY)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, make_result())
+        pd.testing.assert_frame_equal(self.cache.get(key), make_result())
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith('.tmp')], [])
+
+    def test_002_eviction(self):
+        """The least recently used entries are removed when the cache is too large"""
+        keys = [self.cache.key(QUERY, {'patent_ids': (pd.DataFrame({'appln_id': [i]}), 'appln_id')})
+                for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, make_result())
+            os.utime(self.cache._path(key), (1000 + i, 1000 + i))
+        size = os.path.getsize(self.cache._path(keys[0]))
+
+        # The first entry is used again: the second one is then the least recently used
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.cache.max_size = 3 * size
+        key = self.cache.key(QUERY)
+        self.cache.put(key, make_result())
+        self.assertIsNone(self.cache.get(keys[1]))
+        for kept in [keys[0], keys[2], key]:
+            self.assertIsNotNone(self.cache.get(kept))
+        self.assertLessEqual(self.cache.size(), self.cache.max_size)
+
+    def test_003_invalidate(self):
+        """Removing an entry or all the entries"""
+        keys = [self.cache.key(QUERY), self.cache.key(QUERY + ' LIMIT 1')]
+        for key in keys:
+            self.cache.put(key, make_result())
+        self.cache.invalidate(keys[0])
+        self.assertIsNone(self.cache.get(keys[0]))
+        self.assertIsNotNone(self.cache.get(keys[1]))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
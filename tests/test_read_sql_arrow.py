@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""Tests for the typed Arrow reader of the `models` package."""
+
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+from read_sql_arrow import read_sql_arrow
+
+
+class CopyConnection:
+    """Raw connection whose COPY ... TO STDOUT writes a given CSV (the calls used by the readers)"""
+
+    def __init__(self, csv):
+        self.csv = csv
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, file):
+        self.queries.append(sql)
+        file.write(self.csv.encode('utf-8'))
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class CopyEngine:
+    """Engine giving a CopyConnection as raw connection"""
+
+    def __init__(self, csv):
+        self.connection = CopyConnection(csv)
+
+    def raw_connection(self):
+        return self.connection
+
+
+def make_csv(nb_rows = 2000):
+    """Result of a step-2 query as written by COPY (the types of some columns change after the first rows)"""
+    lines = ['appln_id,docdb_family_id,docdb_family_id,appln_auth,appln_nr,appln_title,weight,earliest_filing_date']
+    for i in range(nb_rows):
+        late = i >= nb_rows - 10
+        lines.append(','.join([str(i + 1),
+                               str(100 + i // 2),
+                               '' if i % 7 == 0 else str(200 + i),
+                               'EP' if i % 2 else 'US',
+                               '12A' if late else str(1000000 + i), # digits first, then a letter
+                               '"Wind, turbine ' + str(i) + '"' if late else '', # empty first, then text
+                               '0.5' if i % 3 else '',
+                               '9999-12-31' if i % 5 == 0 else '2001-02-{:02d}'.format(i % 28 + 1)]))
+    return '\n'.join(lines) + '\n'
+
+
+class TestReadSqlArrow(unittest.TestCase):
+    """Tests for `read_sql_arrow`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.csv = make_csv()
+        self.engine = CopyEngine(self.csv)
+
+    def read(self, **kwargs):
+        return read_sql_arrow('SELECT 1', self.engine, block_size = 4096, **kwargs)
+
+    def test_000_types(self):
+        """Known PATSTAT columns typed, the other ones read as strings whatever the first blocks contain"""
+        df = self.read()
+        self.assertEqual(list(df.columns), ['appln_id', 'docdb_family_id', 'docdb_family_id.1', 'appln_auth',
+                                            'appln_nr', 'appln_title', 'weight', 'earliest_filing_date'])
+        self.assertEqual(str(df['appln_id'].dtype), 'Int64')
+        self.assertEqual(str(df['docdb_family_id.1'].dtype), 'Int64')
+        self.assertIsInstance(df['appln_auth'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['earliest_filing_date'].dtype))
+        self.assertEqual(df['weight'].dtype, np.dtype('float64'))
+        self.assertEqual(df['appln_nr'].iloc[-1], '12A')
+        self.assertEqual(df['appln_nr'].iloc[0], '1000000')
+        self.assertEqual(df['appln_title'].iloc[-1], 'Wind, turbine 1999')
+        self.assertTrue(df['appln_title'].iloc[:100].isna().all())
+
+    def test_001_same_values_as_read_csv(self):
+        """Same values as pandas.read_csv, the unknown dates (9999-12-31) as NaT"""
+        df = self.read()
+        expected = pd.read_csv(io.StringIO(self.csv), dtype = str)
+        self.assertEqual(len(df), len(expected))
+        self.assertEqual(df['appln_id'].tolist(), expected['appln_id'].astype(int).tolist())
+        self.assertEqual(df['docdb_family_id.1'].isna().tolist(), expected['docdb_family_id.1'].isna().tolist())
+        self.assertEqual(df['appln_auth'].astype(str).tolist(), expected['appln_auth'].tolist())
+        self.assertEqual(df['appln_nr'].tolist(), expected['appln_nr'].tolist())
+        np.testing.assert_array_equal(df['weight'].values, expected['weight'].astype(float).values)
+        sentinel = (expected['earliest_filing_date'] == '9999-12-31').values
+        self.assertTrue(df['earliest_filing_date'][sentinel].isna().all())
+        self.assertEqual(df['earliest_filing_date'][~sentinel].dt.strftime('%Y-%m-%d').tolist(),
+                         expected['earliest_filing_date'][~sentinel].tolist())
+
+    def test_002_connections(self):
+        """The connection opened by the reader is closed, a connection given is left open"""
+        self.read()
+        self.assertTrue(self.engine.connection.closed)
+        self.assertIn('COPY (SELECT 1) TO STDOUT WITH CSV HEADER', self.engine.connection.queries)
+        connection = CopyConnection(self.csv)
+        read_sql_arrow('SELECT 1', None, connection = connection)
+        self.assertFalse(connection.closed)
+
+    def test_003_parquet(self):
+        """The batches written in a Parquet file when a path is given"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'result.parquet')
+            df = self.read(parquet_path = path)
+            self.assertEqual(len(pd.read_parquet(path)), len(df))
+
+    def test_004_empty_result(self):
+        """A result without rows keeps the names of the columns"""
+        df = read_sql_arrow('SELECT 1', CopyEngine('appln_id,appln_nr\n'))
+        self.assertEqual(list(df.columns), ['appln_id', 'appln_nr'])
+        self.assertEqual(len(df), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()